@@ -0,0 +1,36 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Filters to query the facts gathered by the module pensando_facts.
+#
+#     usage:
+#
+#       - assert:
+#           that:
+#             - pensando | joelwking.pensando.rules_for_port('tcp', 23) | length == 0
+#
+#       - debug:
+#           msg: '{{ item }} {{ pensando | joelwking.pensando.rules_for_port(item) | map(attribute="index") | list }}'
+#         loop: '{{ proto_ports | joelwking.pensando.port_keys }}'
+#
+from ansible_collections.joelwking.pensando.plugins.module_utils.facts import port_keys, rules_for_port
+
+
+class FilterModule(object):
+    """
+        PSM facts filters
+    """
+    def filters(self):
+        return {
+            'port_keys': port_keys,
+            'rules_for_port': rules_for_port
+        }
@@ -0,0 +1,41 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Filters to convert policy from a Tetration ADM run to PSM rules and App proto-ports in a single pass,
+#     rather than building lists with set_fact in a loop.
+#
+#     usage:
+#
+#       - set_fact:
+#           proto_ports: '{{ api.adm | joelwking.pensando.adm_proto_ports(confidence=0.90) }}'
+#
+#       - network_security_policy:
+#           state: present
+#           operation: append
+#           policy_name: DEMO
+#           rules: '{{ api.ansible_facts.adm.raw | joelwking.pensando.adm_rules }}'
+#
+#     adm_rules skips ICMP and permits every policy, as the sample playbooks did, use
+#     adm_rules(include_icmp=True, map_actions=True) to send ICMP without ports and map DROP to deny
+#
+from ansible_collections.joelwking.pensando.plugins.module_utils.tetration import adm_proto_ports, adm_rules
+
+
+class FilterModule(object):
+    """
+        Tetration ADM filters
+    """
+    def filters(self):
+        return {
+            'adm_proto_ports': adm_proto_ports,
+            'adm_rules': adm_rules
+        }
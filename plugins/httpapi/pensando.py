@@ -0,0 +1,140 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+DOCUMENTATION = '''
+---
+httpapi: pensando
+
+short_description: HttpApi plugin for the Pensando Policy and Service Manager (PSM)
+
+version_added: "2.9"
+
+description:
+    - This plugin provides a persistent connection to the PSM. The login API is called once per play (per host),
+    - the session cookie 'sid' is saved and sent with each request issued by the modules of this collection.
+    - When the PSM returns a 401, the session has expired; the plugin logs in again and re-issues the request.
+
+options:
+    api_version:
+        description:
+            - API version used to build the login URL
+        default: 'v1'
+        vars:
+            - name: ansible_httpapi_pensando_api_version
+
+    tenant:
+        description:
+            - Name of the tenant specified at login
+        default: 'default'
+        vars:
+            - name: ansible_httpapi_pensando_tenant
+
+author:
+    - Joel W. King (@joelwking)
+'''
+
+EXAMPLES = '''
+
+  # Inventory
+  [psm]
+  psm.example.net
+
+  [psm:vars]
+  ansible_connection=ansible.netcommon.httpapi
+  ansible_network_os=joelwking.pensando.pensando
+  ansible_httpapi_use_ssl=yes
+  ansible_httpapi_validate_certs=no
+  ansible_user=admin
+  ansible_password='{{ password }}'
+
+  # Tasks, 'hostname' and 'password' are omitted, the modules use the persistent connection
+  - name: Query all apps
+    app:
+      state: query
+
+'''
+#
+#  System imports
+#
+import json
+#
+#  Ansible core import
+#
+from ansible.module_utils._text import to_text
+from ansible.module_utils.connection import ConnectionError
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+from ansible.plugins.httpapi import HttpApiBase
+
+BASE_HEADERS = {'Content-Type': 'application/json'}
+
+
+class HttpApi(HttpApiBase):
+    """
+        Persistent connection to the PSM, the module_utils Pensando class sends all API calls through send_request
+    """
+    def login(self, username, password):
+        """
+            Authenticate with the PSM, the 'sid' cookie is extracted from the response by update_auth
+            and is included in the header of every subsequent request on this connection.
+        """
+        path = '/{}/login'.format(self.get_option('api_version'))
+        payload = json.dumps(dict(username=username, password=password, tenant=self.get_option('tenant')))
+
+        try:
+            response, response_data = self.connection.send(path, payload, method='POST', headers=BASE_HEADERS)
+        except HTTPError as e:
+            raise ConnectionError('Login failed: {}:{}'.format(e.code, to_text(e.read())))
+
+        if not self.connection._auth:
+            raise ConnectionError('Login failed: no session cookie (sid) returned by the PSM')
+
+    def logout(self):
+        """
+            The session cookie expires on the PSM, discard our copy
+        """
+        self.connection._auth = None
+
+    def update_auth(self, response, response_text):
+        """
+            The Set-Cookie header contains the cookie name 'sid', value, expiry time and other info,
+            only the name and value are sent with the subsequent requests.
+        """
+        for cookie in response.info().get_all('Set-Cookie') or []:
+            name_value = cookie.split(';')[0].strip()
+            if name_value.startswith('sid='):
+                return {'Cookie': name_value}
+
+        return None
+
+    def handle_httperror(self, exc):
+        """
+            A 401 indicates the session cookie is no longer valid, login again and retry the request.
+            All other status codes are returned to the module, which handles 404, 409, 429, etc.
+        """
+        if exc.code == 401 and self.connection._auth and not exc.url.endswith('/login'):
+            self.connection._auth = None
+            self.login(self.connection.get_option('remote_user'), self.connection.get_option('password'))
+            return True
+
+        if exc.code == 401 and exc.url.endswith('/login'):
+            return False
+
+        return exc
+
+    def send_request(self, data, path, method='GET', headers=None):
+        """
+            Issue the request, returning the status code, response headers and response body.
+            The values must be serializable, they are returned to the module over the persistent connection socket.
+        """
+        response, response_data = self.connection.send(path, data, method=method, headers=dict(BASE_HEADERS, **(headers or {})))
+
+        return response.getcode(), dict(response.info()), to_text(response_data.getvalue())
@@ -0,0 +1,128 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+DOCUMENTATION = '''
+---
+lookup: adm
+
+short_description: Read PSM rules or App proto-ports from a Tetration ADM policy export
+
+version_added: "2.9"
+
+description:
+    - Reads the policy file written by the sample playbooks (e.g. playbooks/files/PolicyPubApp.json) incrementally.
+    - The policy entries are converted, de-duplicated and compacted as they are read, the file is never loaded whole,
+    - unlike lookup('file') which returns the entire export as a string.
+    - Both sections return a list, use query() (or lookup() with wantlist=True), lookup() returns a single
+    - proto-ports entry as a dictionary, e.g. when the policy only has tcp ports.
+
+options:
+    _terms:
+        description:
+            - Path of the ADM policy export
+        required: true
+
+    section:
+        description:
+            - Use 'rules' to return a PSM rule for each of the default policies
+            - Use 'proto_ports' to return the compacted proto-ports of the adm.policy entries, for an App
+        default: 'rules'
+
+    confidence:
+        description:
+            - Only policy entries at or above this confidence are selected
+        default: 0.0
+
+    policies:
+        description:
+            - With section 'rules', use 'default_policies' or 'absolute_policies'
+        default: 'default_policies'
+
+    from_ip_addresses:
+        description:
+            - With section 'rules', the from-ip-addresses of each rule
+        default: ['0.0.0.0/0']
+
+    to_ip_addresses:
+        description:
+            - With section 'rules', the to-ip-addresses of each rule
+        default: ['0.0.0.0/0']
+
+    include_icmp:
+        description:
+            - With section 'rules', include the ICMP entries (without ports), by default they are skipped
+        default: false
+
+    map_actions:
+        description:
+            - With section 'rules', map the action of each policy, ALLOW to permit and DROP to deny
+            - By default every rule is a permit
+        default: false
+
+author:
+    - Joel W. King (@joelwking)
+'''
+
+EXAMPLES = '''
+
+- name: Read the App proto-ports from disk
+  set_fact:
+    proto_ports: "{{ query('joelwking.pensando.adm', playbook_dir + '/files/PolicyPubApp.json', section='proto_ports', confidence=0.90) }}"
+
+- name: Read the rules from disk
+  set_fact:
+    rules: "{{ query('joelwking.pensando.adm', playbook_dir + '/files/PolicyPubApp.json') }}"
+
+'''
+#
+#  Ansible core import
+#
+from ansible.errors import AnsibleError
+from ansible.plugins.lookup import LookupBase
+#
+# Collection import
+#
+from ansible_collections.joelwking.pensando.plugins.module_utils.tetration import stream_proto_ports, stream_rules
+
+
+class LookupModule(LookupBase):
+    """
+        Stream the ADM policy export
+    """
+    def run(self, terms, variables=None, **kwargs):
+
+        section = kwargs.get('section', 'rules')
+        confidence = float(kwargs.get('confidence', 0.0))
+        result = []
+
+        for term in terms:
+            path = self.find_file_in_search_path(variables, 'files', term)
+            if not path:
+                raise AnsibleError('Unable to find the ADM policy file {}'.format(term))
+
+            with open(path, 'rb') as fp:
+                try:
+                    if section == 'proto_ports':
+                        result.extend(stream_proto_ports(fp, confidence=confidence))
+                    elif section == 'rules':
+                        result.extend(stream_rules(fp, confidence=confidence,
+                                                   from_ip_addresses=kwargs.get('from_ip_addresses'),
+                                                   to_ip_addresses=kwargs.get('to_ip_addresses'),
+                                                   policies=kwargs.get('policies', 'default_policies'),
+                                                   include_icmp=kwargs.get('include_icmp', False),
+                                                   map_actions=kwargs.get('map_actions', False)))
+                    else:
+                        raise AnsibleError('Unknown section {}, must be "rules" or "proto_ports"'.format(section))
+                except ValueError as e:
+                    raise AnsibleError('Unable to read the ADM policy file {}: {}'.format(path, e))
+
+        return result
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+DOCUMENTATION = '''
+---
+lookup: mirror
+
+short_description: Read PSM policies or apps from the local mirror
+
+version_added: "2.9"
+
+description:
+    - Reads the file saved by the Mirror class (plugins/module_utils/mirror.py), which follows the watch API of the
+    - PSM and keeps a local copy of the networksecuritypolicies and apps. No request is sent to the PSM.
+
+options:
+    _terms:
+        description:
+            - Path of the mirror file
+        required: true
+
+    kind:
+        description:
+            - Use 'apps' or 'networksecuritypolicies'
+        default: 'apps'
+
+    name:
+        description:
+            - Return only the object of this name, nothing is returned if it does not exist
+        required: false
+
+    max_age:
+        description:
+            - Fail if the kind was last known to be current more than this many seconds ago, 0 does not check the age
+            - The heartbeat of a kind is saved when it is listed, and every save_interval seconds while its watch
+            - is connected, it is not updated while the watch is failing
+        default: 0
+
+author:
+    - Joel W. King (@joelwking)
+'''
+
+EXAMPLES = '''
+
+- name: Read the apps from the mirror
+  set_fact:
+    apps: "{{ query('joelwking.pensando.mirror', '/var/tmp/psm_mirror.json') }}"
+
+- name: Read one policy from the mirror, which must be less than a minute old
+  set_fact:
+    policy: "{{ lookup('joelwking.pensando.mirror', '/var/tmp/psm_mirror.json', kind='networksecuritypolicies', name='quarantine', max_age=60) }}"
+
+'''
+#
+#  System imports
+#
+import time
+#
+#  Ansible core import
+#
+from ansible.errors import AnsibleError
+from ansible.plugins.lookup import LookupBase
+#
+# Collection import
+#
+from ansible_collections.joelwking.pensando.plugins.module_utils.mirror import read_mirror
+
+
+class LookupModule(LookupBase):
+    """
+        Read the objects of the mirror
+    """
+    def run(self, terms, variables=None, **kwargs):
+
+        kind = kwargs.get('kind', 'apps')
+        max_age = float(kwargs.get('max_age', 0))
+        result = []
+
+        for term in terms:
+            mirror = read_mirror(term)
+            if mirror is None:
+                raise AnsibleError('Unable to read the mirror {}'.format(term))
+            if kind not in mirror.get('objects', {}):
+                raise AnsibleError('The mirror {} does not include {}'.format(term, kind))
+            if max_age and time.time() - (mirror['heartbeat'].get(kind) or 0) > max_age:
+                raise AnsibleError('The {} of the mirror {} were last current more than {} seconds ago'.format(kind, term, max_age))
+
+            objects = mirror['objects'][kind]
+            if kwargs.get('name'):
+                result.extend([objects[kwargs['name']]] if kwargs['name'] in objects else [])
+            else:
+                result.extend(objects[name] for name in sorted(objects))
+
+        return result
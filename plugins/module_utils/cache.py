@@ -0,0 +1,96 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+
+class ReadCache(object):
+    """
+        Objects read from the PSM keyed by host and object path, e.g. '/configs/security/v1/apps/WEB'.
+        Each entry holds the body of the object and its version, the ETag returned by the PSM or meta.resource-version.
+        The version is sent as If-None-Match, when the PSM returns 304 Not Modified the cached body is used.
+
+        Entries are held in memory for the life of the client. When directory is specified, they are also
+        saved as files in the directory so subsequent runs of the module reuse them.
+    """
+    def __init__(self, directory=None, host=None):
+        self.directory = directory
+        self.host = host or ''
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.stats = dict(hits=0, misses=0, stored=0)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, path):
+        return hashlib.sha256('{}{}'.format(self.host, path).encode('utf-8')).hexdigest()
+
+    def filename(self, path):
+        return os.path.join(self.directory, '{}.json'.format(self.key(path)))
+
+    def get(self, path):
+        """
+            Return the entry, a dictionary of 'version' and 'text', or None
+        """
+        key = self.key(path)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None and self.directory:
+            try:
+                with open(self.filename(path)) as cached:
+                    entry = json.load(cached)
+            except (IOError, OSError, ValueError):
+                entry = None
+            if entry is not None:
+                with self.lock:
+                    self.entries[key] = entry
+        return entry
+
+    def put(self, path, text, version):
+        """
+            Save the body of the object and its version, an object without a version can not be validated and is not saved
+        """
+        if version is None:
+            return
+        entry = dict(version=version, text=text)
+        with self.lock:
+            self.entries[self.key(path)] = entry
+            self.stats['stored'] += 1
+        if self.directory:
+            handle, name = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(handle, 'w') as cached:
+                json.dump(entry, cached)
+            os.rename(name, self.filename(path))      # atomic, concurrent readers see the old or new entry
+
+    def invalidate(self, path):
+        """
+            Remove the entry, e.g. the object was deleted or the version is stale
+        """
+        with self.lock:
+            self.entries.pop(self.key(path), None)
+        if self.directory:
+            try:
+                os.remove(self.filename(path))
+            except OSError:
+                pass
+
+    def record(self, hit):
+        with self.lock:
+            self.stats['hits' if hit else 'misses'] += 1
+
+    def statistics(self):
+        with self.lock:
+            return dict(self.stats)
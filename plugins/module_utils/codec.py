@@ -0,0 +1,86 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Serialization of the request and response bodies. orjson is used when it is installed on the
+#     managed node, otherwise the standard library json module with compact separators.
+#
+import json
+import gzip
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def dumps(payload):
+    """
+        Return the payload encoded as compact JSON (no whitespace), as UTF-8 bytes
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """
+        Return the object decoded from JSON, data is either bytes or text
+    """
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def compress(data, threshold):
+    """
+        Return the data gzip encoded if its length is at least threshold bytes, otherwise None.
+        A threshold of zero disables compression.
+    """
+    if not threshold or len(data) < threshold:
+        return None
+    return gzip.compress(data, compresslevel=6)
+
+
+class Response(object):
+    """
+        Response of the PSM with the attributes of a Requests object used by the modules. The body is kept as
+        received (content, bytes) or as text, it is decoded when first accessed and the parsed JSON is cached,
+        so calling json() more than once does not parse a large policy again.
+    """
+    def __init__(self, status_code, headers, text=None, content=None, cookies=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.cookies = cookies or {}
+        self.ok = 200 <= status_code < 400
+        self._text = text
+        self._content = content
+        self._json = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = (self._content or b'').decode('utf-8', 'replace')
+        return self._text
+
+    @property
+    def content(self):
+        if self._content is None:
+            self._content = (self._text or '').encode('utf-8')
+        return self._content
+
+    def json(self):
+        if self._json is None:
+            self._json = loads(self._content if self._content is not None else self._text)
+        return self._json
@@ -0,0 +1,165 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Facts of the PSM security objects, each subset is listed concurrently, then indexed so playbooks look up
+#     an app, the rules which reference an app, or the rules which allow a protocol and port, by key rather
+#     than searching the lists with Jinja loops. rules_by_port only has the ports as specified by the rules,
+#     use rules_for_port (the filter joelwking.pensando.rules_for_port) to find the rules which allow a port.
+#
+#     A rule is referenced in the indexes by the name of its policy, its index in the rules of the policy and
+#     the rule itself, e.g. {"policy": "default", "index": 3, "rule": {...}}
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+SUBSETS = ('networksecuritypolicies', 'apps', 'securitygroups', 'ipcollections', 'firewallprofiles')
+DEFAULT_SUBSETS = ('networksecuritypolicies', 'apps')
+
+
+def by_name(items):
+    """
+        Return the objects keyed by meta.name
+    """
+    return dict(((item.get('meta') or {}).get('name'), item) for item in items)
+
+
+def port_entries(proto_ports):
+    """
+        Yield (protocol, low, high) for each port interval of a list of proto-ports, low and high are None when
+        no ports are specified, i.e. all ports of the protocol. Ports which cannot be parsed are yielded as the
+        string specified, with high None.
+    """
+    for entry in proto_ports or []:
+        protocol = str(entry.get('protocol') or 'any').lower()
+        if entry.get('ports') in (None, '', []):
+            yield protocol, None, None
+            continue
+        intervals, invalid = Rules.parse_ports(entry['ports'])
+        for low, high in intervals:
+            yield protocol, low, high
+        for value in invalid:
+            yield protocol, value, None
+
+
+def port_key(protocol, low, high):
+    if low is None:
+        return protocol
+    if high is None or high == low:
+        return '{}/{}'.format(protocol, low)
+    return '{}/{}-{}'.format(protocol, low, high)
+
+
+def port_keys(proto_ports):
+    """
+        Return the keys of the rules_by_port index for a list of proto-ports, one for each port or range, e.g.
+        'tcp/80,443' is 'tcp/80' and 'tcp/443', 'tcp/8000-8080' is kept as a range, and the protocol alone,
+        e.g. 'icmp', when no ports are specified
+    """
+    return [port_key(*entry) for entry in port_entries(proto_ports)]
+
+
+def add(index, key, reference):
+    """
+        Append the rule reference to the list of the key, a rule is listed once for each key
+    """
+    references = index.setdefault(key, [])
+    if not references or references[-1] is not reference:
+        references.append(reference)
+
+
+def index_rules(policies, apps):
+    """
+        Return the rules_by_app, rules_by_port and port_intervals indexes of the rules of the policies. The ports of
+        a rule are its proto-ports and those of the apps it references. rules_by_port is keyed by the ports as
+        specified, see port_keys, a rule which specifies neither apps nor proto-ports is listed under 'any'.
+        port_intervals is, for each protocol, the list of [low, high, policy, index] sorted by low, rules_for_port
+        uses it to find the rules which allow a port within a range. Each policy and rule is read once.
+    """
+    rules_by_app = {}
+    rules_by_port = {}
+    intervals = {}
+    app_entries = dict((name, list(port_entries((app.get('spec') or {}).get('proto-ports')))) for name, app in apps.items())
+
+    for name in sorted(policies):
+        for index, rule in enumerate((policies[name].get('spec') or {}).get('rules') or []):
+            reference = dict(policy=name, index=index, rule=rule)
+            entries = list(port_entries(rule.get('proto-ports')))
+            for app in rule.get('apps') or []:
+                add(rules_by_app, app, reference)
+                entries.extend(app_entries.get(app, []))
+            if not rule.get('apps') and not rule.get('proto-ports'):
+                entries.append(('any', None, None))
+            for protocol, low, high in entries:
+                add(rules_by_port, port_key(protocol, low, high), reference)
+                if isinstance(low, int):
+                    intervals.setdefault(protocol, set()).add((low, high, name, index))
+
+    port_intervals = dict((protocol, [list(item) for item in sorted(values)]) for protocol, values in intervals.items())
+    return rules_by_app, rules_by_port, port_intervals
+
+
+def rules_for_port(facts, protocol, ports=None):
+    """
+        Return the rules which allow the protocol and port, or every port of a range, e.g. ('tcp', 23), ('tcp', '137-138')
+        or a key of rules_by_port, 'tcp/23'. Rules which allow all ports of the protocol, or any protocol, are included.
+        Without ports, the rules which allow all ports of the protocol are returned. Each rule is a dictionary
+        of the policy name, the index of the rule and the rule, ordered by policy and index.
+    """
+    protocol = str(protocol).lower()
+    if ports is None and '/' in protocol:
+        protocol, ports = protocol.split('/', 1)
+
+    found = {}
+    for key in (protocol, 'any'):
+        for reference in facts.get('rules_by_port', {}).get(key, []):
+            found[(reference['policy'], reference['index'])] = reference
+
+    if ports not in (None, ''):
+        requested, invalid = Rules.parse_ports(ports)
+        if invalid or len(requested) != 1:
+            raise ValueError('Specify one port or range, not {}'.format(ports))
+        low, high = requested[0]
+        policies = facts.get('networksecuritypolicies', {})
+        for start, end, name, index in facts.get('port_intervals', {}).get(protocol, []):
+            if start > low:                                    # sorted by start, no later interval contains low
+                break
+            if end >= high and (name, index) not in found:
+                found[(name, index)] = dict(policy=name, index=index, rule=policies[name]['spec']['rules'][index])
+
+    return [found[key] for key in sorted(found)]
+
+
+def gather_facts(psm, subsets=DEFAULT_SUBSETS, page_size=0, max_workers=None):
+    """
+        List each subset concurrently, one thread for each subset up to max_workers, the pages of a subset are
+        requested in turn. Return the failing requests object (or None) and the facts: the objects of each
+        subset by name, and when the policies are gathered, the rules_by_app, rules_by_port and port_intervals indexes.
+    """
+    def collect(subset):
+        items = []
+        for page, objects in psm.list_pages('/configs/security/{}/' + subset, page_size=page_size):
+            if not page.ok:
+                return page, items
+            items.extend(objects)
+        return None, items
+
+    work = [(collect, subset) for subset in subsets]
+    results = psm.run_concurrently(work, max_workers or len(work))
+
+    facts = {}
+    for subset, (failed, items) in zip(subsets, results):
+        if failed is not None:
+            return failed, facts
+        facts[subset] = by_name(items)
+
+    if 'networksecuritypolicies' in facts:
+        facts['rules_by_app'], facts['rules_by_port'], facts['port_intervals'] = index_rules(facts['networksecuritypolicies'], facts.get('apps') or {})
+    return None, facts
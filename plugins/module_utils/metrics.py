@@ -0,0 +1,97 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+import re
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+OBJECT_NAME = re.compile(r'/(networksecuritypolicies|apps)/[^/?]+')
+
+
+def path_template(path):
+    """
+        Return the path with the object name replaced, so requests for different objects are aggregated,
+        e.g. '/configs/security/{}/apps/WEB' returns '/configs/security/{}/apps/{name}'
+    """
+    return OBJECT_NAME.sub(r'/\1/{name}', path.split('?')[0])
+
+
+class Metrics(object):
+    """
+        Timing of each request issued to the PSM (verb, path template, status, elapsed seconds, bytes sent
+        and received, retries and seconds spent waiting), and of local phases such as encoding the payload.
+        Optionally each request is appended to a JSON lines trace file for offline profiling.
+
+        The object is thread safe, concurrent requests share the same metrics.
+    """
+    def __init__(self, trace=None):
+        self.trace = trace
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.phases = {}
+
+    def record(self, verb, path, status, elapsed, sent=0, received=0, retries=0, sleep_time=0.0, host=None):
+        """
+            Record one call to the PSM, including its retries
+        """
+        key = '{} {}'.format(verb, path_template(path))
+        with self.lock:
+            item = self.requests.setdefault(key, dict(count=0, status={}, elapsed=0.0, max_elapsed=0.0, sent=0, received=0,
+                                                      retries=0, sleep_time=0.0))
+            item['count'] += 1
+            item['status'][str(status)] = item['status'].get(str(status), 0) + 1
+            item['elapsed'] += elapsed
+            item['max_elapsed'] = max(item['max_elapsed'], elapsed)
+            item['sent'] += sent
+            item['received'] += received
+            item['retries'] += retries
+            item['sleep_time'] += sleep_time
+
+            if self.trace:
+                line = dict(time=round(time.time(), 6), host=host, verb=verb, path=path, status=status, elapsed=round(elapsed, 6),
+                            sent=sent, received=received, retries=retries, sleep_time=round(sleep_time, 6))
+                with open(self.trace, 'a') as trace:
+                    trace.write(json.dumps(line) + '\n')
+
+    @contextmanager
+    def timer(self, phase):
+        """
+            Context manager which adds the elapsed time of the block to the named phase, e.g. 'encode'
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self.lock:
+                self.phases[phase] = self.phases.get(phase, 0.0) + elapsed
+
+    def summary(self):
+        """
+            Return the metrics aggregated by verb and path template, and the totals
+        """
+        with self.lock:
+            requests = {}
+            for key, item in self.requests.items():
+                requests[key] = dict(item, status=dict(item['status']), elapsed=round(item['elapsed'], 6),
+                                     max_elapsed=round(item['max_elapsed'], 6), mean_elapsed=round(item['elapsed'] / item['count'], 6),
+                                     sleep_time=round(item['sleep_time'], 6))
+            totals = dict(count=0, elapsed=0.0, sent=0, received=0, retries=0, sleep_time=0.0)
+            for item in self.requests.values():
+                for name in totals:
+                    totals[name] += item[name]
+            totals['elapsed'] = round(totals['elapsed'], 6)
+            totals['sleep_time'] = round(totals['sleep_time'], 6)
+            phases = dict((name, round(value, 6)) for name, value in self.phases.items())
+        return dict(requests=requests, phases=phases, totals=totals)
@@ -0,0 +1,301 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Local mirror of the PSM security objects, kept up to date by the watch API rather than polling.
+#
+#     usage:
+#
+#         psm = Pensando(hostname='psm.example.net', username='admin', password=password, api_version='v1')
+#         psm.login()
+#         mirror = Mirror(psm, '/var/tmp/psm_mirror.json').start()
+#         ...
+#         mirror.stop()
+#
+#     Modules, scripts and the lookup plugin 'joelwking.pensando.mirror' read the file with read_mirror(path).
+#     The heartbeat, the time each kind was last known to be current, is saved in <path>.heartbeat, the lookup
+#     plugin checks its age.
+#
+import os
+import json
+import time
+import tempfile
+import threading
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
+
+KINDS = ('networksecuritypolicies', 'apps')
+
+
+def watch_events(line):
+    """
+        Return the events of a line of the watch stream, raise TransportError if the line is not a watch result
+    """
+    body = json.loads(line)
+    if not isinstance(body, dict) or not isinstance(body.get('result') or {}, dict):
+        raise Transport.TransportError('Unexpected watch result {}'.format(line[:80]))
+    return (body.get('result') or {}).get('events') or []
+
+
+def heartbeat_path(path):
+    return path + '.heartbeat'
+
+
+def read_mirror(path):
+    """
+        Return the mirror saved in the file, a dictionary of 'versions' (the last resource-version seen for each
+        kind), 'objects' (for each kind, the objects by name), 'time' (when it was saved) and 'heartbeat' (for each
+        kind, when it was last listed or its watch was last seen connected), or None
+    """
+    try:
+        with open(path) as fp:
+            mirror = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return None
+    try:
+        with open(heartbeat_path(path)) as fp:
+            mirror['heartbeat'] = json.load(fp)
+    except (IOError, OSError, ValueError):
+        mirror['heartbeat'] = {}
+    return mirror
+
+
+def write_file(path, data):
+    """
+        Replace the file atomically, readers see the old or the new content
+    """
+    handle, name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    with os.fdopen(handle, 'w') as fp:
+        fp.write(data)
+    os.rename(name, path)
+
+
+class Mirror(object):
+    """
+        The networksecuritypolicies and apps of the PSM, listed once and then updated incrementally from the
+        events of the watch API, one thread for each kind. The mirror is saved to a file every save_interval
+        seconds when it has changed, so readers do not query the PSM.
+
+        After a disconnect or a read timeout, the watch is resumed from the last resource-version seen, so
+        no events are lost. If the PSM no longer has the events after that version (410), the kind is listed again.
+        When the session expires (401), the client logs in again and the watch is resumed.
+
+        The heartbeat of a kind is updated when it is listed, and every save_interval seconds while its watch is
+        connected, so readers can tell a current mirror from one whose watch is failing.
+    """
+    def __init__(self, client, path, kinds=KINDS, save_interval=1.0, tenant='default'):
+        self.client = client
+        self.path = path
+        self.kinds = kinds
+        self.save_interval = save_interval
+        self.tenant = tenant
+        #
+        self.objects = dict((kind, {}) for kind in kinds)
+        self.versions = dict((kind, None) for kind in kinds)
+        self.heartbeat = dict((kind, None) for kind in kinds)
+        self.connected = set()
+        self.stats = dict(events=0, resyncs=0, reconnects=0, logins=0)
+        self.lock = threading.Lock()
+        self.login_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.streams = {}
+        self.threads = []
+        self.saved = 0.0
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+            Start from the mirror saved by a previous run, the watch resumes from the versions saved
+        """
+        saved = read_mirror(self.path)
+        if not saved:
+            return
+        for kind in self.kinds:
+            if kind in (saved.get('objects') or {}):
+                self.objects[kind] = saved['objects'][kind]
+                self.versions[kind] = (saved.get('versions') or {}).get(kind)
+                self.heartbeat[kind] = saved['heartbeat'].get(kind)
+
+    def save(self, force=False):
+        """
+            Write the mirror to the file, replacing it atomically so readers see the old or the new mirror.
+            Return True if the file was written.
+        """
+        with self.lock:
+            if not self.dirty or (not force and time.time() - self.saved < self.save_interval):
+                return False
+            data = json.dumps(dict(versions=self.versions, objects=self.objects, time=time.time()))
+            self.dirty = False
+            self.saved = time.time()
+
+        write_file(self.path, data)
+        return True
+
+    def beat(self, kinds):
+        """
+            Record that the kinds are current, and save the heartbeat
+        """
+        with self.lock:
+            for kind in kinds:
+                self.heartbeat[kind] = time.time()
+            data = json.dumps(self.heartbeat)
+        write_file(heartbeat_path(self.path), data)
+
+    def login(self, cookie):
+        """
+            Login again after a 401, unless another thread already has since the cookie was sent
+        """
+        with self.login_lock:
+            if self.client.cookie != cookie:
+                return
+            response = self.client.login(tenant=self.tenant)
+            if not response.ok:
+                raise Transport.TransportError('login {}:{}'.format(response.status_code, response.text))
+            with self.lock:
+                self.stats['logins'] += 1
+
+    def resync(self, kind):
+        """
+            List all objects of the kind, replacing those in the mirror. Return the requests object.
+        """
+        response = self.client.rate_limit('GET', '/configs/security/{}/' + kind)
+        if not response.ok:
+            return response
+
+        body = response.json()
+        with self.lock:
+            self.objects[kind] = dict((item['meta']['name'], item) for item in body.get('items') or [])
+            self.versions[kind] = (body.get('list-meta') or {}).get('resource-version')
+            self.stats['resyncs'] += 1
+            self.dirty = True
+        self.save(force=True)
+        self.beat([kind])
+        return response
+
+    def sync(self):
+        """
+            List each kind once, for scripts which only need a current copy
+        """
+        return [self.resync(kind) for kind in self.kinds]
+
+    def apply(self, kind, event):
+        """
+            Apply a watch event, 'Created', 'Updated' or 'Deleted', to the mirror
+        """
+        item = event.get('object') or {}
+        meta = item.get('meta') or {}
+        with self.lock:
+            if event.get('type') == 'Deleted':
+                self.objects[kind].pop(meta.get('name'), None)
+            else:
+                self.objects[kind][meta.get('name')] = item
+            self.versions[kind] = meta.get('resource-version') or self.versions[kind]
+            self.stats['events'] += 1
+            self.dirty = True
+
+    def follow(self, kind):
+        """
+            List the kind if it has not been seen, then apply the events of the watch until stopped.
+            After a 401 the client logs in once, a second 401 without a successful watch in between is an error.
+            The watch is opened again after a backoff when it fails, or when the PSM closes it, the backoff
+            increases until an event is received.
+        """
+        attempt = 0
+        authenticated = False
+        while not self.stopping.is_set():
+            try:
+                cookie = self.client.cookie
+                response = self.resync(kind) if self.versions[kind] is None else None
+                if response is None or response.ok:
+                    response = self.client.watch(kind, resource_version=self.versions[kind])
+                    self.streams[kind] = response
+                    if not response.ok:                               # the error is read and kept, then the connection released
+                        response.text
+                        response.close()
+
+                if response.status_code == Transport.codes.UNAUTHORIZED and not authenticated:   # the session expired
+                    self.login(cookie)
+                    authenticated = True
+                    continue
+                if response.status_code == Transport.codes.GONE:      # events after our version are no longer retained
+                    self.versions[kind] = None
+                    continue
+                if not response.ok:
+                    raise Transport.TransportError('{} {}:{}'.format(kind, response.status_code, response.text))
+
+                authenticated = False
+                with self.lock:
+                    self.connected.add(kind)
+                self.beat([kind])
+                for line in response.iter_lines(chunk_size=None):          # each event as it arrives
+                    if self.stopping.is_set():
+                        break
+                    if not line:
+                        continue
+                    for event in watch_events(line):
+                        self.apply(kind, event)
+                    attempt = 0
+                raise Transport.TransportError('{} watch closed'.format(kind))
+            except (Transport.TransportError, IOError, json.JSONDecodeError):  # IOError, the Requests stream raises its own errors
+                if self.stopping.is_set():
+                    break
+                self.stopping.wait(self.client.limiter.backoff(attempt))
+                attempt += 1
+            finally:
+                with self.lock:
+                    self.connected.discard(kind)
+                self.save(force=True)
+            with self.lock:
+                self.stats['reconnects'] += 1
+
+    def saver(self):
+        """
+            Save the mirror every save_interval seconds when it has changed, and the heartbeat of the kinds
+            whose watch is connected
+        """
+        while not self.stopping.wait(self.save_interval):
+            self.save()
+            with self.lock:
+                connected = list(self.connected)
+            if connected:
+                self.beat(connected)
+
+    def start(self):
+        """
+            Follow each kind in a thread, and save the changes in another, returns self
+        """
+        for name, target, args in [('mirror-{}'.format(kind), self.follow, (kind,)) for kind in self.kinds] + [('mirror-save', self.saver, ())]:
+            thread = threading.Thread(target=target, args=args, name=name)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """
+            Stop following, close the watch streams and save the mirror
+        """
+        self.stopping.set()
+        for stream in list(self.streams.values()):
+            stream.close()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.save(force=True)
+
+    def get(self, kind, name=None):
+        """
+            Return the object of the kind by name, or all objects of the kind by name
+        """
+        with self.lock:
+            if name is None:
+                return dict(self.objects[kind])
+            return self.objects[kind].get(name)
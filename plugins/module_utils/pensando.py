@@ -10,11 +10,25 @@
 #         max-line-length = 160
 #         ignore = E402
 #
-import time
+import re
 import json
-import requests
-import requests.packages.urllib3
-requests.packages.urllib3.disable_warnings()
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.connection import Connection, ConnectionError as AnsibleConnectionError
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+import ansible_collections.joelwking.pensando.plugins.module_utils.cache as Cache
+import ansible_collections.joelwking.pensando.plugins.module_utils.codec as Codec
+import ansible_collections.joelwking.pensando.plugins.module_utils.metrics as Metrics
+import ansible_collections.joelwking.pensando.plugins.module_utils.ratelimit as Ratelimit
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+import ansible_collections.joelwking.pensando.plugins.module_utils.snapshot as Snapshot
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
+import ansible_collections.joelwking.pensando.plugins.module_utils.validate as Validate
+
+
+IDEMPOTENT = ('GET', 'HEAD', 'PUT', 'DELETE')     # may be sent again after a server or connection error
 
 
 class ConnectionError(object):
@@ -32,21 +46,103 @@ class Pensando(object):
         Class to manage the connection with the Pensando Policy and Service Manager (PSM)
         In documentation, you may see this referred to by the codename 'Venice'
     """
-    def __init__(self, api_version=None, password=None, username=None, hostname=None, rate_limit_retry=4):
+    def __init__(self, api_version=None, password=None, username=None, hostname=None, rate_limit_retry=4,
+                 pool_connections=1, pool_maxsize=10, timeout=(10, 60), connection=None, limiter=None,
+                 retry_status=(500, 502, 503, 504), scheme='https', metrics=None, cache=None, gzip_threshold=0, buffer=None,
+                 snapshots=None, transport='http'):
         """
              Initialize the attributes of the class
+             If connection is specified, it is an httpapi persistent connection which is already authenticated,
+             all requests are sent using the connection rather than the transport.
+             transport is the name of the transport, 'http' (standard library) or 'requests', or a transport object.
+             If buffer is specified, the writes (POST, PUT and DELETE) of objects are staged in the PSM staging
+             buffer of that name, they are applied when the buffer is committed, see commit_buffer.
+             If snapshots (a Snapshot.SnapshotStore) is specified, each version of a policy read or pushed is saved.
         """
+        self.session = {}                          # cookie and gzip_threshold, shared by copies of this object, see AsyncPensando
+        self.connection = connection
         self.rate_limit_retry = rate_limit_retry   # Number of attempts to issue the command before assuming the 429 is persistent
+        self.timeout = timeout                     # (connect, read) timeout in seconds, passed to each request
+        self.limiter = limiter or Ratelimit.RateLimiter()  # Token bucket shared by all requests from this client
+        self.retry_status = retry_status           # Server errors which are retried, along with 429 and connection errors
+        self.gzip_threshold = gzip_threshold       # Request bodies of at least this many bytes are gzip encoded, 0 disables
+        self.metrics = metrics or Metrics.Metrics()  # Timing of each request, optionally written to a trace file
+        self.cache = cache or Cache.ReadCache(host=hostname)  # Objects read from the PSM, validated by resource-version
+        self.buffer = buffer                       # Name of the staging buffer in which writes are staged, None writes directly
+        self.snapshots = snapshots                 # Store of the versions of the policies read and pushed, or None
 
         self.api_version = api_version
+        self.scheme = scheme                       # The PSM API is https, http is used by tests/mock_psm.py
         self.hostname = hostname
         self.username = username
         self.password = password
         #
         self.changed = False
+        self.diff = {}
+        self.aggregation = {}
+        self.shadowed = []
+        self.snapshot_id = None
         self.cookie = None
         self.headers = {'content-type': 'application/json'}
         self.verify = False
+        self.transport = self.create_transport(transport, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    @property
+    def cookie(self):
+        return self.session.get('cookie')
+
+    @cookie.setter
+    def cookie(self, value):
+        self.session['cookie'] = value
+
+    @property
+    def gzip_threshold(self):
+        return self.session.get('gzip_threshold')
+
+    @gzip_threshold.setter
+    def gzip_threshold(self, value):
+        self.session['gzip_threshold'] = value
+
+    def create_transport(self, transport, pool_connections=1, pool_maxsize=10):
+        """
+            All API calls are issued using a single transport, its connection pool keeps the TCP and TLS
+            connection to the PSM open (keep-alive) and reuses it for subsequent requests, rather than a new handshake
+            for every GET, POST, PUT or DELETE.
+
+            The default transport, 'http', only uses the standard library, so each module starts without importing
+            Requests. pool_connections is the number of hosts to cache connection pools for ('requests' only),
+            pool_maxsize the number of connections saved in each pool. Retries are handled by rate_limit.
+        """
+        if not isinstance(transport, str):
+            return transport
+        return Transport.create_transport(transport, pool_connections=pool_connections, pool_maxsize=pool_maxsize, verify=self.verify)
+
+    def close(self):
+        """
+            Release the connections held by the transport pool
+        """
+        self.transport.close()
+
+    def results(self):
+        """
+            Return statistics of the requests issued by this client, included in the module output
+        """
+        return dict(rate_limit=self.limiter.statistics(), metrics=self.metrics.summary(), cache=self.cache.statistics())
+
+    def encode(self, payload):
+        """
+            Return the payload encoded as compact JSON, the time spent is recorded in the 'encode' phase of the metrics
+        """
+        with self.metrics.timer('encode'):
+            return Codec.dumps(payload)
+
+    def received(self, response):
+        """
+            Return the number of bytes in the body of the response
+        """
+        if isinstance(response, ConnectionError):
+            return 0
+        return len(response.content)
 
     def login(self, tenant='default'):
         """
@@ -59,13 +155,18 @@ class Pensando(object):
             the cookie in the header in all subsequent requests to Venice.
         """
 
+        if self.connection:
+            return Codec.Response(200, {}, '{}')   # The httpapi plugin has logged in and refreshes the cookie on 401
+
         payload = json.dumps(dict(username=self.username, password=self.password, tenant=tenant))
 
+        start = time.time()
         try:
-            r = requests.request('POST', 'https://{}/{}/login'.format(self.hostname, self.api_version), headers=self.headers, data=payload, verify=self.verify)
-        except requests.ConnectionError as e:
-            return ConnectionError(text='Timeout in Login: {}'.format(e))
-
+            r = self.transport.request('POST', '{}://{}/{}/login'.format(self.scheme, self.hostname, self.api_version), headers=self.headers, data=payload,
+                                       timeout=self.timeout)
+        except Transport.TransportError as e:
+            r = ConnectionError(text='Timeout in Login: {}'.format(e))
+        self.metrics.record('POST', '/{}/login', r.status_code, time.time() - start, sent=len(payload), received=self.received(r), host=self.hostname)
         if r.ok:
             self.cookie = dict(sid=r.cookies.get('sid'))
 
@@ -74,24 +175,224 @@ class Pensando(object):
     def rate_limit(self, verb, url, **kwargs):
         """
             Policy from ADM runs can be large, provide logic to handle rate limit errors
-            As this method handles all API calls, it also provides a single point to swap out 'requests'.
+            As this method handles all API calls, it also provides a single point to swap out the transport.
+            Requests are issued from the pooled transport, so the connection to the PSM is reused between calls.
+
+            Each request first waits for a token from the shared rate limiter. A 429 is retried, up to rate_limit_retry
+            attempts, waiting the value of Retry-After (seconds or an HTTP-date) if provided, otherwise an exponential
+            backoff with jitter. A server error (5xx) or a connection error is only retried for the idempotent verbs,
+            the PSM may have created the object of a POST before the error, sending it again could fail or duplicate it.
+
+            A body of at least gzip_threshold bytes is sent gzip encoded, if the PSM rejects the encoding (415),
+            compression is disabled for this client and the body is sent again uncompressed.
+            The response is returned as a Codec.Response, the body is parsed once when json() is first called.
+
+            When a staging buffer is specified, writes of objects are sent to the buffer, see staged.
+
+            The elapsed time, bytes sent and received, retries and time spent waiting are recorded in self.metrics
         """
-        url = 'https://{}' + url
-        url = url.format(self.hostname, self.api_version)
+        url = self.staged(verb, url)
+        template = url
+        if self.connection:
+            url = url.format(self.api_version)
+            errors = (AnsibleConnectionError,)
+        else:
+            url = self.scheme + '://{}' + url
+            url = url.format(self.hostname, self.api_version)
+            errors = (Transport.TransportError,)
+
+        data = kwargs.pop('data', None)
+        headers = kwargs.pop('headers', None) or {}
+        compressed = None if self.connection or data is None else Codec.compress(data, self.gzip_threshold)
+
+        def send():
+            if self.connection:
+                return self.send_request(verb, url, data=data, headers=headers, **kwargs)
+            if compressed is None:
+                return self.transport.request(verb, url, data=data, headers=headers, cookies=self.cookie, timeout=self.timeout)
+            return self.transport.request(verb, url, data=compressed, headers=dict(headers, **{'Content-Encoding': 'gzip'}),
+                                          cookies=self.cookie, timeout=self.timeout)
 
-        for _ in range(self.rate_limit_retry):
+        start = time.time()
+        sleep_time = 0.0
+        for attempt in range(self.rate_limit_retry):
+            sleep_time += self.limiter.acquire()
 
             try:
-                r = requests.request(verb, url, verify=self.verify, cookies=self.cookie, **kwargs)
-            except requests.ConnectionError as e:
-                return ConnectionError(text='Timeout in rate_limit: {}'.format(e))
+                r = send()
+            except errors as e:
+                self.limiter.record('connection_errors')
+                r = ConnectionError(text='Timeout in rate_limit: {}'.format(e))
+                if verb.upper() not in IDEMPOTENT:
+                    break
+                if attempt + 1 < self.rate_limit_retry:
+                    sleep_time += self.limiter.sleep(self.limiter.backoff(attempt))
+                continue
 
-            if r.status_code == requests.codes.TOO_MANY_REQUESTS:
-                time.sleep(int(r.headers.get("Retry-After", 1)))    # TODO, verify
+            if r.status_code == Transport.codes.UNSUPPORTED_MEDIA_TYPE and compressed is not None:
+                self.gzip_threshold = compressed = None
+                continue
+            elif r.status_code == Transport.codes.TOO_MANY_REQUESTS:
+                self.limiter.throttled()
+            elif r.status_code in self.retry_status:
+                self.limiter.record('server_errors')
+                if verb.upper() not in IDEMPOTENT:
+                    break
             else:
-                return r
+                self.limiter.success()
+                break
+
+            if attempt + 1 < self.rate_limit_retry:
+                retry_after = Ratelimit.parse_retry_after(r.headers.get('Retry-After'))
+                sleep_time += self.limiter.sleep(self.limiter.backoff(attempt, retry_after=retry_after))
+
+        sent = len(data or '') if compressed is None else len(compressed)
+        self.metrics.record(verb, template, r.status_code, time.time() - start, sent=sent, received=self.received(r),
+                            retries=attempt, sleep_time=sleep_time, host=self.hostname)
+        return r
+
+    def staged(self, verb, url):
+        """
+            Return the URL of the request in the staging buffer, '/staging/<buffer>/configs/...', for a write (POST, PUT
+            or DELETE) of an object when a buffer is specified. Reads, and requests of the staging API, are not staged.
+        """
+        if not self.buffer or verb not in ('POST', 'PUT', 'DELETE'):
+            return url
+        if not url.startswith('/configs/') or url.startswith('/configs/staging/'):
+            return url
+        return '/staging/{}{}'.format(self.buffer, url)
+
+    def buffer_url(self, buffer_name, tenant='default', action=None):
+        """
+            Return the URL of a staging buffer, or of an action on the buffer, 'commit' or 'clear'
+        """
+        url = '/configs/staging/{}/tenant/{}/buffers'.format('{}', tenant)
+        if buffer_name:
+            url = '{}/{}'.format(url, buffer_name)
+        if action:
+            url = '{}/{}'.format(url, action)
+        return url
+
+    def create_buffer(self, buffer_name, tenant='default'):
+        """
+            Create a staging buffer, the PSM returns 409 if the buffer exists, which is not an error.
+            Writes of Apps and NetworkSecurityPolicies issued by a client with this buffer are staged until committed.
+        """
+        payload = {"kind": "Buffer",
+                   "api-version": self.api_version,
+                   "meta": {"name": buffer_name,
+                            "tenant": tenant
+                           },
+                   "spec": {}
+                  }
+
+        buffer = self.rate_limit('POST', self.buffer_url(None, tenant=tenant), data=self.encode(payload))
+        self.changed = buffer.ok
+        return buffer
+
+    def query_buffer(self, buffer_name, tenant='default'):
+        """
+            Query the staging buffer, the response lists the staged writes and the result of their validation
+        """
+        return self.rate_limit('GET', self.buffer_url(buffer_name, tenant=tenant))
+
+    def commit_buffer(self, buffer_name, tenant='default'):
+        """
+            Commit the staging buffer, the PSM validates all staged writes and applies them as a single transaction,
+            either every write is applied or none. A commit which fails validation returns a status of 'FAILED' and
+            the reason, in that case a 412 is returned with the body of the response.
+        """
+        payload = {"kind": "CommitAction",
+                   "api-version": self.api_version,
+                   "meta": {"name": buffer_name,
+                            "tenant": tenant
+                           },
+                   "spec": {}
+                  }
+
+        commit = self.rate_limit('POST', self.buffer_url(buffer_name, tenant=tenant, action='commit'), data=self.encode(payload))
+        if commit.ok and (commit.json().get('status') or {}).get('status') == 'FAILED':
+            return Codec.Response(Transport.codes.PRECONDITION_FAILED, commit.headers, commit.text)
+
+        self.changed = commit.ok
+        return commit
+
+    def delete_buffer(self, buffer_name, tenant='default'):
+        """
+            Delete the staging buffer, writes which have not been committed are discarded
+        """
+        buffer = self.rate_limit('DELETE', self.buffer_url(buffer_name, tenant=tenant))
+        self.changed = buffer.ok
+        return buffer
+
+    def watch(self, kind, resource_version=None):
+        """
+            Watch a collection, e.g. 'apps', returning the streamed response, each line of the body is a JSON object
+            of the events {"result": {"events": [{"type": "Created", "object": {...}}]}} which occurred after
+            resource_version. The PSM returns 410 when the version is older than the events it retains.
+
+            The response is not read, iterate over response.iter_lines() and close it when done. The read timeout
+            applies to the interval between events. Watch is not available over the httpapi persistent connection.
+        """
+        url = '{}://{}/configs/security/{}/watch/{}'.format(self.scheme, self.hostname, self.api_version, kind)
+        if resource_version:
+            url += '?' + urlencode({'resource-version': resource_version})
+
+        self.limiter.acquire()
+        start = time.time()
+        r = self.transport.request('GET', url, stream=True, cookies=self.cookie, timeout=self.timeout)
+        self.metrics.record('GET', '/configs/security/{}/watch/' + kind, r.status_code, time.time() - start, host=self.hostname)
+        return r
+
+    def send_request(self, verb, path, data=None, **kwargs):
+        """
+            Issue the request using the httpapi persistent connection, returning an object like a Requests response
+        """
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')           # sent over the persistent connection socket as text
+        status_code, headers, text = self.connection.send_request(data, path=path, method=verb, headers=kwargs.get('headers'))
+        return Codec.Response(status_code, headers, text)
+
+    def cached_get(self, url):
+        """
+            GET an object, sending the version of the cached copy (if any) in If-None-Match. When the PSM returns
+            304 Not Modified, the cached body is returned as a 200 response, so the object is not downloaded again.
+            The cache is updated with the object returned, an object which is not found is removed from the cache.
+        """
+        path = url.format(self.api_version)
+        entry = self.cache.get(path)
+        headers = {'If-None-Match': entry['version']} if entry else {}
+
+        r = self.rate_limit('GET', url, headers=headers)
+
+        if r.status_code == Transport.codes.NOT_MODIFIED and entry:
+            self.cache.record(hit=True)
+            return Codec.Response(Transport.codes.OK, r.headers, entry['text'])
+
+        self.cache.record(hit=False)
+        if r.status_code == Transport.codes.OK:
+            self.cache_response(path, r)
+        elif r.status_code == Transport.codes.NOT_FOUND:
+            self.cache.invalidate(path)
         return r
 
+    def cache_response(self, path, response):
+        """
+            Save the object of the response in the read cache, with the ETag returned by the PSM or its resource-version
+        """
+        version = response.headers.get('ETag') or (response.json().get('meta') or {}).get('resource-version')
+        self.cache.put(path, response.text, version)
+
+    def cache_write(self, path, response):
+        """
+            Save the object of a successful POST or PUT in the read cache. The response of a staged write is not
+            the committed object, it is not saved and the cached copy is removed.
+        """
+        if self.buffer:
+            self.cache.invalidate(path)
+        else:
+            self.cache_response(path, response)
+
     def query_policy(self, policy_name=None):
         """
             Query the network security policy, returning the policy object
@@ -103,9 +404,41 @@ class Pensando(object):
 
         if policy_name:
             url = '/configs/security/{}/networksecuritypolicies{}'.format('{}', '/' + policy_name)
+            return self.cached_get(url)
 
         return self.rate_limit('GET', url)
 
+    def list_pages(self, url, label_selector=None, field_selector=None, page_size=0):
+        """
+            Query a collection, e.g. '/configs/security/{}/apps', yielding the response and the list of items of
+            each page, so the caller can process a page before the next one is requested.
+
+            The selectors are passed to the PSM, e.g. label_selector 'zone=dmz', field_selector 'meta.name=WEB'.
+            With a page_size, each request specifies 'max-results' and 'from' (the index of the first item, starting
+            at 1), pages are requested until a page has fewer items than page_size. A failed request ends the iteration.
+        """
+        options = {}
+        if label_selector:
+            options['label-selector'] = label_selector
+        if field_selector:
+            options['field-selector'] = field_selector
+
+        start = 1
+        while True:
+            if page_size:
+                options.update({'max-results': page_size, 'from': start})
+            query = '?' + urlencode(sorted(options.items())) if options else ''
+            page = self.rate_limit('GET', url + query)
+            if not page.ok:
+                yield page, []
+                return
+
+            items = page.json().get('items') or []
+            yield page, items
+            if not page_size or len(items) < page_size:
+                return
+            start += page_size
+
     def manage_policy(self, params):
         """
             Logic to apply or update an existing policy
@@ -115,6 +448,23 @@ class Pensando(object):
                        412  when issuing a POST and a policy by a different name exists "exceeds max allowed polices 1"
 
             Note: the URL does not need to specify the policy name when POST, but must when PUT
+
+            When aggregate_addresses is specified, the address lists of each rule are collapsed into the minimal
+            set of covering prefixes and rules which become identical are dropped, the counts are saved in self.aggregation
+            When compact_ports is specified, the proto-ports of each rule are compacted, see remove_dups.
+            When prune_shadowed is specified, rules covered by an earlier rule are removed and saved in self.shadowed
+            When the policy exists, the rules are compared with the existing rules, the PUT is skipped
+            if the policy is unchanged. The added, removed and reordered rules are saved in self.diff
+
+            When the policy is in the read cache, it is known to exist, the POST is skipped and the policy is read
+            with a conditional GET. The PUT includes the resource-version of the policy which was read, if another
+            client updated the policy in the meantime the PSM rejects the PUT, the policy is read again and the
+            rules re-applied, up to rate_limit_retry attempts, so concurrent appends are not lost.
+
+            When a snapshot store is specified, the policy read and the policy pushed are saved, see restore_policy.
+
+            When a staging buffer is specified, the policy is always read first, a staged POST of an existing policy
+            would only fail when the buffer is committed. The POST or PUT is then staged in the buffer.
         """
 
         url = '/configs/security/{}/networksecuritypolicies'
@@ -130,35 +480,159 @@ class Pensando(object):
                             }
                   }
 
-        policy = self.rate_limit('POST', url, data=json.dumps(payload))
+        with self.metrics.timer('rules'):
+            if params.get('aggregate_addresses') and params.get('rules'):
+                payload['spec']['rules'], self.aggregation = Rules.aggregate_rules(payload['spec']['rules'])
 
-        if policy.status_code == requests.codes.OK:                            # POST worked policy doesn't exist
-            self.changed = True
-            return policy
+            if params.get('compact_ports') and params.get('rules'):
+                payload['spec']['rules'] = Rules.compact_rules(payload['spec']['rules'])
+
+            if params.get('prune_shadowed') and params.get('rules'):
+                payload['spec']['rules'], self.shadowed = Rules.prune_shadowed(payload['spec']['rules'])
+
+        path = '/configs/security/{}/networksecuritypolicies/{}'.format(self.api_version, params.get('policy_name'))
+        policy = None
+
+        if self.buffer or self.cache.get(path):                                # known to exist, read it rather than POST
+            policy = self.query_policy(policy_name=params.get('policy_name'))
+            if policy.status_code == Transport.codes.NOT_FOUND:
+                policy = None
+
+        if policy is None:
+            policy = self.rate_limit('POST', url, data=self.encode(payload))
+
+            if policy.status_code == Transport.codes.OK:                        # POST worked policy doesn't exist
+                self.cache_write(path, policy)
+                self.save_snapshot(policy, 'pushed')
+                self.diff = Rules.diff_rules([], payload['spec']['rules'] or [])
+                self.changed = True
+                return policy
+
+            if policy.status_code != Transport.codes.CONFLICT:
+                return policy
+            policy = self.query_policy(policy_name=params.get('policy_name'))  # 409 already exists! query the existing policy
+
+        rules = payload['spec']['rules']
+        for attempt in range(self.rate_limit_retry):
+            if policy.status_code != Transport.codes.OK:
+                return policy
 
-        if policy.status_code == requests.codes.CONFLICT:                      # 409 already exists!
-            policy = self.query_policy(policy_name=params.get('policy_name'))  # query to return existing policy
+            existing = policy.json()
+            self.save_snapshot(policy, 'seen')
+            proposed = dict(payload, spec=dict(payload['spec'], rules=rules))
+            with self.metrics.timer('rules'):
+                proposed = self.policy_payload(params, proposed, policy)
+                self.diff = Rules.diff_rules(existing['spec'].get('rules') or [], proposed['spec']['rules'] or [])
 
-            if policy.status_code == requests.codes.OK:
-                payload = self.policy_payload(params, payload, policy)
-                self_link = policy.json()['meta']['self-link']                 # pull the resource from self-link
-                policy = self.rate_limit('PUT', self_link, data=json.dumps(payload))
+            if not self.diff['changed'] and existing['spec'].get('attach-tenant') == proposed['spec']['attach-tenant']:
+                self.changed = False                                           # identical, skip the PUT
+                return policy
 
-                if policy.status_code == requests.codes.OK:
-                    self.changed = True
+            proposed['meta'] = dict(proposed['meta'], **{'resource-version': existing['meta'].get('resource-version')})
+            self_link = existing['meta']['self-link']                          # pull the resource from self-link
+            policy = self.rate_limit('PUT', self_link, data=self.encode(proposed))
+
+            if policy.status_code == Transport.codes.OK:
+                self.cache_write(path, policy)
+                self.save_snapshot(policy, 'pushed')
+                self.changed = True
+                return policy
+
+            if policy.status_code not in (Transport.codes.CONFLICT, Transport.codes.PRECONDITION_FAILED) or attempt + 1 == self.rate_limit_retry:
+                return policy                                                  # the 409 of the last attempt, the rules were not applied
+            self.cache.invalidate(path)                                        # updated by another client, read it again
+            policy = self.query_policy(policy_name=params.get('policy_name'))
 
         return policy
 
+    def save_snapshot(self, policy, source):
+        """
+            Save the policy of the response in the snapshot store, if any. A staged policy is not saved, it is
+            not applied until the buffer is committed.
+        """
+        if self.snapshots is None or (self.buffer and source == 'pushed'):
+            return
+        self.snapshot_id = self.snapshots.save(policy.json(), source=source)
+
+    def restore_policy(self, params):
+        """
+            Replace the rules of the policy with those of the snapshot params['snapshot'], an id or an index
+            e.g. '-2', with a single PUT. If the policy no longer exists, it is created with a single POST.
+            The rules restored are compared with the existing rules, the PUT is skipped if they are identical.
+
+            Return the requests object, a 404 if the snapshot does not exist.
+        """
+        name = params.get('policy_name')
+        snapshot = self.snapshots.load(name, params.get('snapshot')) if self.snapshots else None
+        if snapshot is None:
+            return Codec.Response(Transport.codes.NOT_FOUND, {}, json.dumps(dict(message=['snapshot {} of {} not found'.format(params.get('snapshot'), name)])))
+
+        payload = {"kind": "NetworkSecurityPolicy",
+                   "api-version": params.get('api_version'),
+                   "meta": {"name": name,
+                            "tenant": params.get('tenant'),
+                            "namespace": params.get('namespace')
+                           },
+                   "spec": {"attach-tenant": snapshot['attach_tenant'],
+                            "rules": snapshot['rules']
+                            }
+                  }
+
+        policy = self.query_policy(policy_name=name)
+        if policy.status_code == Transport.codes.NOT_FOUND:
+            policy = self.rate_limit('POST', '/configs/security/{}/networksecuritypolicies', data=self.encode(payload))
+            self.diff = Rules.diff_rules([], snapshot['rules'])
+            self.changed = policy.ok
+            if policy.ok:
+                self.save_snapshot(policy, 'pushed')
+            return policy
+        if not policy.ok:
+            return policy
+
+        existing = policy.json()
+        self.save_snapshot(policy, 'seen')
+        self.diff = Rules.diff_rules(existing['spec'].get('rules') or [], snapshot['rules'])
+        if not self.diff['changed'] and existing['spec'].get('attach-tenant') == snapshot['attach_tenant']:
+            self.changed = False
+            return policy
+
+        payload['meta']['resource-version'] = existing['meta'].get('resource-version')
+        policy = self.rate_limit('PUT', existing['meta']['self-link'], data=self.encode(payload))
+        if policy.ok:
+            self.cache_write('/configs/security/{}/networksecuritypolicies/{}'.format(self.api_version, name), policy)
+            self.save_snapshot(policy, 'pushed')
+        self.changed = policy.ok
+        return policy
+
+    def analyze_policy(self, params):
+        """
+            Return the rules which are never matched because they are covered by an earlier rule.
+            Analyze the rules provided by the user, or if none are provided, the rules of the existing policy.
+            Returns the requests object of the query (or None) and the list of shadowed rules.
+        """
+        if params.get('rules'):
+            return None, Rules.shadowed_rules(params.get('rules'))
+
+        policy = self.query_policy(policy_name=params.get('policy_name'))
+        if not policy.ok:
+            return policy, []
+
+        return policy, Rules.shadowed_rules(policy.json()['spec'].get('rules') or [])
+
     def policy_payload(self, params, payload, policy):
         """
             Either replace or append the policy, if replace, we have already set the data provided by the user
-            Use the existing rules and append the rules provided by the user
+            Use the existing rules and append the rules provided by the user, duplicate rules are dropped and
+            rules which only differ by proto-ports are merged, so re-running an append does not grow the policy.
         """
         if params.get('operation') == 'append':
 
-            rules = policy.json()['spec']['rules']
-            rules.extend(payload['spec']['rules'])
-            payload['spec']['rules'] = rules
+            rules = policy.json()['spec'].get('rules') or []
+            payload['spec']['rules'] = Rules.merge_rules(rules, payload['spec']['rules'] or [])
+            if params.get('compact_ports'):
+                payload['spec']['rules'] = Rules.compact_rules(payload['spec']['rules'])
+            if params.get('prune_shadowed'):
+                payload['spec']['rules'], self.shadowed = Rules.prune_shadowed(payload['spec']['rules'])
 
         return payload
 
@@ -171,13 +645,42 @@ class Pensando(object):
             This is a similar approach to the method used to update ACLs on Cisco routers, create a new ACL, then
             refrence the new ACL on the interface.
 
-            We check for an existing app name and payload, but at this point allow the API to fail.
+            We do not query for an existing app name, the POST fails with RC=409 ["already exists in cache"].
+            An app which fails validation (e.g. neither 'alg' nor 'proto_ports') is not sent, a 400 is returned
+            with the list of errors. When a staging buffer is specified, the app is queried first and a 409 is returned
+            if it exists, as a staged POST of an existing app would only fail when the buffer is committed.
 
             Return the Requests object which contains the details of the app.
         """
 
         url = '/configs/security/{}/apps'
 
+        payload = self.app_payload(params)
+
+        errors = Validate.validate_app(payload['spec'])
+        if errors:
+            self.changed = False
+            return Codec.Response(Transport.codes.BAD_REQUEST, {}, json.dumps(dict(message=errors)))
+
+        if self.buffer and self.existing_app(params.get('app_name')):   # a staged POST only fails when committed
+            self.changed = False
+            return Codec.Response(Transport.codes.CONFLICT, {}, json.dumps(dict(message=['already exists in cache'])))
+
+        app = self.rate_limit('POST', url, data=self.encode(payload))
+
+        if app.status_code == Transport.codes.BAD_REQUEST:                # payload is incorrect
+            self.changed = False
+        elif app.status_code == Transport.codes.CONFLICT:                 # already exists!
+            self.changed = False
+        else:
+            self.changed = True
+
+        return app
+
+    def app_payload(self, params):
+        """
+            Return the payload to create an App
+        """
         payload = {"kind": "App",
                    "api-version": params.get('api_version'),
                    "meta": {"name": params.get('app_name'),
@@ -192,22 +695,190 @@ class Pensando(object):
         if params.get('proto_ports'):
             payload['spec']['proto-ports'] = self.remove_dups(params.get('proto_ports'))
 
-        if len(payload['spec']) == 0:  # Verify the user specified 'alg' or 'proto_ports', (both is also acceptable)
-            pass                       # Allow POST to fail, with RC=400 ["app doesn't have at least one of ProtoPorts and ALG"]
+        return payload
 
-        if self.existing_app(params.get('app_name')):
-            pass                       # Allow POST to fail, with RC=409 ["already exists in cache"]
+    def list_apps(self):
+        """
+            Query all apps in one call, returning the requests object and a dictionary of the apps by name
+        """
+        apps = self.rate_limit('GET', '/configs/security/{}/apps')
+        if not apps.ok:
+            return apps, {}
 
-        app = self.rate_limit('POST', url, data=json.dumps(payload))
+        return apps, dict((app['meta']['name'], app) for app in apps.json().get('items') or [])
 
-        if app.status_code == requests.codes.bad_request:                # payload is incorrect
-            self.changed = False
-        if app.status_code == requests.codes.conflict:                   # already exists!
-            self.changed = False
-        else:
-            self.changed = True
+    def bulk_apps(self, params):
+        """
+            Create (state 'present') or delete (state 'absent') the apps listed in params['apps'], each item is
+            either an app name or a dictionary of 'app_name' (or 'name'), 'alg' and 'proto_ports'.
 
-        return app
+            The existing apps are queried once, only the apps which must be created or deleted are sent to the PSM.
+            The requests are issued concurrently by up to params['max_workers'] threads, all requests share the
+            rate limiter of this client. Existing apps are not updated, see manage_app.
+
+            Returns the requests object of the query and a list of results, one for each app.
+        """
+        query, existing = self.list_apps()
+        if not query.ok:
+            return query, []
+
+        def create(app):
+            payload = self.app_payload(dict(params, **app))
+            return self.rate_limit('POST', '/configs/security/{}/apps', data=self.encode(payload))
+
+        def delete(app):
+            return self.rate_limit('DELETE', '/configs/security/{}/apps/{}'.format('{}', app['app_name']))
+
+        results = []
+        work = []
+        for item in params.get('apps') or []:
+            app = dict(app_name=item) if not isinstance(item, dict) else dict(item)
+            app['app_name'] = app.get('app_name') or app.pop('name', None)
+            result = dict(app_name=app['app_name'], changed=False, status_code=None)
+            results.append(result)
+
+            if params.get('state') == 'absent':
+                if app['app_name'] in existing:
+                    work.append((result, delete, app))
+                else:
+                    result['status'] = 'absent'
+            else:
+                if app['app_name'] in existing:
+                    result['status'] = 'exists'
+                else:
+                    work.append((result, create, app))
+
+        responses = self.run_concurrently([(function, app) for result, function, app in work], params.get('max_workers'))
+        for (result, function, app), response in zip(work, responses):
+            result['status_code'] = response.status_code
+            if response.ok:
+                result['changed'] = True
+                result['status'] = 'deleted' if params.get('state') == 'absent' else 'created'
+            else:
+                result['status'] = 'failed'
+                result['msg'] = response.text
+
+        self.changed = any(result['changed'] for result in results)
+        return query, results
+
+    def app_hash(self, spec):
+        """
+            Return a hash of the content of an app spec, the alg and the compacted proto-ports
+        """
+        content = dict(alg=spec.get('alg'), ports=self.remove_dups(spec.get('proto-ports') or []))
+        return hashlib.sha1(repr(Rules.freeze(content)).encode('utf-8')).hexdigest()
+
+    def run_concurrently(self, work, max_workers):
+        """
+            Call function(argument) for each (function, argument) in work using a bounded thread pool,
+            return the responses in the order of work
+        """
+        with ThreadPoolExecutor(max_workers=max(1, max_workers or 1)) as executor:
+            return list(executor.map(lambda item: item[0](item[1]), work))
+
+    def reconcile_apps(self, params):
+        """
+            Make the apps on the PSM exactly match the list of app definitions in params['apps'], (see bulk_apps).
+            The apps and policies are listed in one call each, and the create, delete and replace sets are computed
+            by comparing a hash of the content of each app.
+
+            Apps cannot be updated (see manage_app), an app which changed is replaced: a new app is created named
+            <app_name>_<hash>, the rules which reference the old app are updated to reference the new app (one PUT
+            for each policy) and only then is the old app deleted. If the create fails, the old app is kept.
+            An existing app named <app_name>_<hash>, the first 8 hex digits of the hash, is treated as the app <app_name>.
+
+            Returns the requests object of the failing query, or None, and a list of results, one for each app.
+        """
+        query, existing = self.list_apps()
+        if not query.ok:
+            return query, []
+        policies = self.query_policy()
+        if not policies.ok:
+            return policies, []
+        policies = policies.json().get('items') or []
+
+        referenced = set(name for policy in policies for rule in policy['spec'].get('rules') or [] for name in rule.get('apps') or [])
+
+        desired = {}
+        for item in params.get('apps') or []:
+            app = dict(app_name=item) if not isinstance(item, dict) else dict(item)
+            app['app_name'] = app.get('app_name') or app.pop('name', None)
+            desired[app['app_name']] = self.app_payload(dict(params, **app))
+
+        current = {}                                      # logical app name -> name of the app on the PSM
+        for name in existing:
+            base, _, suffix = name.rpartition('_')
+            if name in desired:
+                current[name] = name
+            elif base in desired and re.match('^[0-9a-f]{8}$', suffix) and base not in current:
+                current[base] = name
+
+        results = dict((name, dict(app_name=name, changed=False, status='unchanged')) for name in desired)
+        creates, deletes, repoint = [], [], {}
+
+        for name, payload in desired.items():
+            if name not in current:
+                results[name]['status'] = 'created'
+                creates.append((name, payload))
+                continue
+            old = current[name]
+            digest = self.app_hash(payload['spec'])
+            if self.app_hash(existing[old]['spec']) == digest:
+                results[name]['app_name'] = old
+                continue
+            results[name]['status'] = 'replaced'
+            payload = json.loads(json.dumps(payload))
+            payload['meta']['name'] = '{}_{}'.format(name, digest[:8])
+            if old in referenced:
+                repoint[old] = payload['meta']['name']
+            deletes.append(old)
+            results[name]['app_name'] = payload['meta']['name']
+            creates.append((name, payload))
+
+        for name in existing:
+            if name not in current.values():
+                results[name] = dict(app_name=name, changed=False, status='deleted')
+                deletes.append(name)
+
+        def delete(name):
+            return self.rate_limit('DELETE', '/configs/security/{}/apps/{}'.format('{}', name))
+
+        def create(payload):
+            return self.rate_limit('POST', '/configs/security/{}/apps', data=self.encode(payload))
+
+        def record(name, response):
+            result = results[name]
+            result['status_code'] = response.status_code
+            if response.ok:
+                result['changed'] = True
+            else:
+                result.update(status='failed', msg=response.text)
+            return response.ok
+
+        max_workers = params.get('max_workers')
+        for (name, payload), response in zip(creates, self.run_concurrently([(create, payload) for name, payload in creates], max_workers)):
+            if not record(name, response) and name in current:
+                deletes.remove(current[name])            # keep the old app, the rules are not updated
+                repoint.pop(current[name], None)
+
+        for policy in policies:
+            rules = policy['spec'].get('rules') or []
+            if not any(repoint.get(app) for rule in rules for app in rule.get('apps') or []):
+                continue
+            for rule in rules:
+                if rule.get('apps'):
+                    rule['apps'] = [repoint.get(app, app) for app in rule['apps']]
+            response = self.rate_limit('PUT', policy['meta']['self-link'], data=self.encode(policy))
+            if not response.ok:
+                return response, list(results.values())
+
+        for name, response in zip(deletes, self.run_concurrently([(delete, name) for name in deletes], max_workers)):
+            key = name if name in results else [key for key in current if current[key] == name][0]
+            if results[key]['status'] == 'deleted' or not response.ok:
+                record(key, response)
+
+        self.changed = any(result['changed'] for result in results.values())
+        return None, list(results.values())
 
     def existing_app(self, app_name):
         """
@@ -215,7 +886,7 @@ class Pensando(object):
             Return the requests object or False if the app does not exist
         """
         url = '/configs/security/{}/apps/{}'.format('{}', app_name)
-        app = self.rate_limit('GET', url)
+        app = self.cached_get(url)
         if app.ok:
             return app
 
@@ -223,17 +894,189 @@ class Pensando(object):
 
     def remove_dups(self, policy):
         """
-            Policy from Tetration may have duplicate entries, eliminate the duplicate ports and protocols
+            Policy from Tetration may have duplicate and overlapping entries, e.g. tcp 80, tcp 80-90 and tcp 81,82
             Input: a list of dictionaries
-            Returns: unique list
+            Returns: the minimal list of proto-ports, one entry per protocol with overlapping and adjacent
+                     port ranges merged, sorted by protocol
         """
-        unique = set()
-        result = []
+        return Rules.compact_proto_ports(policy)
+
 
-        for row in policy:
-            unique.add(tuple(row.items()))
+def pensando_argument_spec():
+    """
+        Arguments common to the modules of this collection. When the play uses the httpapi connection
+        plugin, hostname, username and password are provided by the connection and are not required.
+    """
+    return dict(hostname=dict(required=False),
+                api_version=dict(required=False, default='v1'),
+                username=dict(required=False, default='admin'),
+                password=dict(required=False, no_log=True),
+                tenant=dict(required=False, default='default'),
+                namespace=dict(required=False, default='default'),
+                rate_limit_retry=dict(required=False, default=4, type='int'),
+                requests_per_second=dict(required=False, type='float'),
+                pool_maxsize=dict(required=False, default=10, type='int'),
+                connect_timeout=dict(required=False, default=10, type='int'),
+                read_timeout=dict(required=False, default=60, type='int'),
+                trace_file=dict(required=False, type='path'),
+                cache_dir=dict(required=False, type='path'),
+                gzip_threshold=dict(required=False, default=0, type='int'),
+                buffer=dict(required=False),
+                transport=dict(required=False, default='http', choices=['http', 'requests'])
+                )
+
+
+def project(item, fields=None):
+    """
+        Return only the fields of the object specified, each field is a dotted path, e.g. 'meta.name', optionally
+        followed by '|length' to return the number of elements, e.g. 'spec.rules|length'. The result is keyed by field.
+        Without fields, the object is returned unchanged.
+    """
+    if not fields:
+        return item
+
+    result = {}
+    for field in fields:
+        path, _, function = field.partition('|')
+        value = item
+        for key in path.split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        if function == 'length':
+            value = len(value or [])
+        result[field] = value
+    return result
+
+
+def query_collection(psm, url, params):
+    """
+        List the collection using the paging and selectors of the module parameters, each page is projected as
+        it is received, so only one page of complete objects is held in memory.
+        Return the failing requests object (or None) and the list of items.
+    """
+    items = []
+    for page, objects in psm.list_pages(url, label_selector=params.get('label_selector'), field_selector=params.get('field_selector'),
+                                        page_size=params.get('page_size')):
+        if not page.ok:
+            return page, items
+        items.extend(project(item, params.get('fields')) for item in objects)
+    return None, items
+
+
+def app_errors(params):
+    """
+        Return the errors of the apps to be created, either the apps listed in params['apps'] or the single app
+        of 'alg' and 'proto_ports'. Each app is validated before any request is sent to the PSM.
+    """
+    if not params.get('apps'):
+        return Validate.validate_app({'alg': params.get('alg'), 'proto-ports': params.get('proto_ports')})
 
-        for row in unique:
-            result.append(dict(row))
+    errors = []
+    for index, item in enumerate(params.get('apps')):
+        app = dict(params, **(item if isinstance(item, dict) else dict(app_name=item)))
+        errors.extend(Validate.validate_app({'alg': app.get('alg'), 'proto-ports': app.get('proto_ports')}, where='apps[{}]'.format(index)))
+    return errors
 
+
+def pensando_list_spec():
+    """
+        Arguments of state 'query' to page, select and project the collection
+    """
+    return dict(page_size=dict(required=False, default=0, type='int'),
+                label_selector=dict(required=False),
+                field_selector=dict(required=False),
+                fields=dict(required=False, type='list', default=[])
+                )
+
+
+def connection_host(connection):
+    """
+        Return the host of the httpapi persistent connection, used to key the read cache
+    """
+    if connection is None:
+        return None
+    try:
+        return connection.get_option('host')
+    except AnsibleConnectionError:
+        return None
+
+
+def pensando_kwargs(params, connection=None):
+    """
+        Return the arguments to create a Pensando object from the module parameters
+    """
+    return dict(hostname=params.get('hostname'),
+                username=params.get('username'),
+                password=params.get('password'),
+                api_version=params.get('api_version'),
+                metrics=Metrics.Metrics(trace=params.get('trace_file')),
+                gzip_threshold=params.get('gzip_threshold'),
+                buffer=params.get('buffer'),
+                cache=Cache.ReadCache(directory=params.get('cache_dir'), host=params.get('hostname') or connection_host(connection)),
+                snapshots=Snapshot.SnapshotStore(params.get('snapshot_dir'), host=params.get('hostname') or connection_host(connection))
+                if params.get('snapshot_dir') else None,
+                pool_maxsize=params.get('pool_maxsize'),
+                transport=params.get('transport') or 'http',
+                timeout=(params.get('connect_timeout'), params.get('read_timeout')),
+                connection=connection,
+                rate_limit_retry=params.get('rate_limit_retry'),
+                limiter=Ratelimit.RateLimiter(rate=params.get('requests_per_second'))
+                )
+
+
+def module_connection(module):
+    """
+        Return the httpapi persistent connection when the module is executed by the connection plugin
+        and a hostname is not specified, otherwise None
+    """
+    if module._socket_path and not module.params.get('hostname'):
+        return Connection(module._socket_path)
+    return None
+
+
+def pensando_client(module):
+    """
+        Return a logged in Pensando object. Use the persistent connection when the module is executed
+        by the httpapi connection plugin and a hostname is not specified, otherwise login to the PSM.
+    """
+    connection = module_connection(module)
+    if connection is None and not (module.params.get('hostname') and module.params.get('password')):
+        module.fail_json(msg='hostname and password are required unless using the httpapi connection plugin')
+
+    psm = Pensando(**pensando_kwargs(module.params, connection=connection))
+
+    login = psm.login(tenant=module.params.get('tenant'))
+    if not login.ok:
+        module.fail_json(msg='{}:{}'.format(login.status_code, login.text))
+
+    return psm
+
+
+def manage_policy_clusters(params):
+    """
+        Apply the policy to each PSM cluster in params['hostnames'] concurrently, each item is either a hostname
+        or a dictionary which overrides the module parameters for that cluster, e.g. hostname, username, password.
+        Each cluster has its own session and rate limiter, the elapsed time is that of the slowest cluster.
+
+        Returns a list of results, one for each cluster.
+    """
+    def push(endpoint):
+        cluster = dict(params, **(endpoint if isinstance(endpoint, dict) else dict(hostname=endpoint)))
+        result = dict(hostname=cluster.get('hostname'), changed=False, failed=True)
+        psm = Pensando(**pensando_kwargs(cluster))
+        try:
+            response = psm.login(tenant=cluster.get('tenant'))
+            if response.ok:
+                response = psm.manage_policy(cluster)
+                result.update(changed=psm.changed, rule_diff=psm.diff)
+            result.update(failed=not response.ok, status_code=response.status_code, **psm.results())
+            if not response.ok:
+                result['msg'] = '{}:{}'.format(response.status_code, response.text)
+        except Exception as e:
+            result['msg'] = 'Exception: {}'.format(e)
+        finally:
+            psm.close()
         return result
+
+    hostnames = params.get('hostnames') or []
+    with ThreadPoolExecutor(max_workers=max(1, len(hostnames))) as executor:
+        return list(executor.map(push, hostnames))
@@ -0,0 +1,115 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage:
+#
+#         async def main():
+#             psm = AsyncPensando(hostname='psm.example.net', username='admin', password=password, api_version='v1')
+#             await psm.login()
+#             apps = await asyncio.gather(*[psm.existing_app(name) for name in names])
+#             psm.close()
+#
+import copy
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+
+
+class AsyncPensando(object):
+    """
+        Asyncio counterpart of the Pensando class, for scripts which issue many requests at once, e.g. querying
+        hundreds of apps. The methods are coroutines with the same names and arguments as the Pensando class.
+
+        Requests are issued by a Pensando object using its pooled transport, in a thread pool of max_concurrency
+        threads, and at most max_concurrency requests are outstanding. All requests share the session (the cookie
+        and whether bodies are gzip encoded), connection pool and rate limiter of the Pensando object.
+
+        Each call has its own result attributes (changed, diff, aggregation, shadowed and snapshot_id), they are
+        saved in calls, one dictionary for each call in the order the calls complete. changed is True when any
+        call changed the PSM.
+    """
+    RESULTS = dict(changed=False, diff={}, aggregation={}, shadowed=[], snapshot_id=None)
+
+    def __init__(self, max_concurrency=10, client=None, **kwargs):
+        """
+            Either provide a Pensando object (client) or the arguments to create one
+        """
+        kwargs.setdefault('pool_maxsize', max_concurrency)
+        self.client = client or Pensando.Pensando(**kwargs)
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self.semaphore = None
+        self.lock = threading.Lock()
+        self.changed = False
+        self.calls = []
+
+    def __getattr__(self, name):
+        """
+            Attributes not defined here (e.g. hostname, cookie, limiter) are those of the Pensando object,
+            the result attributes of the Pensando object are not those of the calls, see calls
+        """
+        if name == 'client' or name in self.RESULTS:
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    async def run(self, method, *args, **kwargs):
+        """
+            Call the method of a copy of the Pensando object in the thread pool. The copy shares the transport,
+            session and rate limiter, a login or a gzip downgrade by one call applies to all. The copy has its own
+            result attributes so concurrent calls do not overwrite each other, they are saved in calls.
+        """
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        client = copy.copy(self.client)
+        for name, value in self.RESULTS.items():
+            setattr(client, name, copy.copy(value))
+
+        def call():
+            result = getattr(client, method)(*args, **kwargs)
+            with self.lock:
+                self.changed = self.changed or client.changed
+                self.calls.append(dict(((name, getattr(client, name)) for name in self.RESULTS), method=method))
+            return result
+
+        async with self.semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def login(self, tenant='default'):
+        """
+            Login, the cookie is saved in the Pensando object and used by all subsequent requests
+        """
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.client.login, tenant)
+
+    async def rate_limit(self, verb, url, **kwargs):
+        return await self.run('rate_limit', verb, url, **kwargs)
+
+    async def query_policy(self, policy_name=None):
+        return await self.run('query_policy', policy_name=policy_name)
+
+    async def manage_policy(self, params):
+        return await self.run('manage_policy', params)
+
+    async def manage_app(self, params):
+        return await self.run('manage_app', params)
+
+    async def existing_app(self, app_name):
+        return await self.run('existing_app', app_name)
+
+    def close(self):
+        """
+            Shutdown the thread pool and release the connections held by the transport pool
+        """
+        self.executor.shutdown(wait=True)
+        self.client.close()
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+import time
+import random
+import threading
+import datetime
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value, now=None):
+    """
+        The Retry-After header is either a number of seconds, or an HTTP-date, e.g. 'Wed, 21 Oct 2015 07:28:00 GMT'
+        Return the number of seconds to wait, or None if the value cannot be parsed
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+
+    try:
+        return max(0.0, float(int(value)))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None:
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return max(0.0, (date - now).total_seconds())
+
+
+class RateLimiter(object):
+    """
+        Token bucket shared by all requests issued by a client, tokens are added at 'rate' per second up to 'burst'.
+        The rate adapts using additive increase, multiplicative decrease (AIMD): it is reduced when the PSM
+        returns a 429 and slowly increased with each successful request, up to max_rate.
+
+        Without a rate, requests are not paced until the PSM returns the first 429, pacing then starts at
+        max_rate reduced by decrease and adapts. A rate of zero disables pacing, requests are only delayed
+        by the backoff after a 429.
+
+        The limiter is thread safe, concurrent requests share the same bucket and statistics.
+    """
+    def __init__(self, rate=None, burst=10, max_rate=50.0, min_rate=0.5, increase=0.1, decrease=0.5, backoff_base=0.5, backoff_max=30.0):
+        self.adaptive = rate is None               # start pacing after the first 429
+        self.rate = float(rate or 0.0)
+        self.burst = burst
+        self.max_rate = max(max_rate, self.rate)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        #
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.stats = dict(requests=0, retries=0, throttled=0, server_errors=0, connection_errors=0, sleep_time=0.0)
+
+    def acquire(self):
+        """
+            Wait until a token is available, then consume it, return the seconds waited
+        """
+        if not self.rate:
+            with self.lock:
+                self.stats['requests'] += 1
+            return 0.0
+
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1                       # reserve the token, a negative balance is the wait of this caller
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.stats['requests'] += 1
+
+        if wait:
+            self.sleep(wait)
+        return wait
+
+    def sleep(self, seconds):
+        """
+            Sleep, recording the time spent waiting, return the seconds
+        """
+        with self.lock:
+            self.stats['sleep_time'] += seconds
+        time.sleep(seconds)
+        return seconds
+
+    def record(self, name):
+        """
+            Increment the named counter, e.g. 'server_errors'
+        """
+        with self.lock:
+            self.stats[name] += 1
+
+    def success(self):
+        """
+            Additive increase of the rate after a successful request
+        """
+        if self.rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def throttled(self):
+        """
+            Multiplicative decrease of the rate after a 429, remaining tokens are discarded.
+            Without a rate, the first 429 starts pacing.
+        """
+        self.record('throttled')
+        with self.lock:
+            if not self.rate and self.adaptive:
+                self.rate = max(self.min_rate, self.max_rate * self.decrease)
+                self.tokens = 0.0
+                self.updated = time.time()
+            elif self.rate:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.tokens = min(self.tokens, 0.0)
+
+    def backoff(self, attempt, retry_after=None):
+        """
+            Return the seconds to wait before the next attempt, exponential backoff with full jitter,
+            or the value of Retry-After when the server provided one
+        """
+        self.record('retries')
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def statistics(self):
+        """
+            Return the statistics and current rate
+        """
+        with self.lock:
+            result = dict(self.stats)
+            result['sleep_time'] = round(result['sleep_time'], 3)
+            result['rate'] = round(self.rate, 3)
+        return result
@@ -0,0 +1,572 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+import bisect
+import json
+import ipaddress
+from collections import Counter
+
+
+def freeze(value):
+    """
+        Return an immutable, hashable copy of the value with empty values removed and lists sorted, the order
+        of addresses, apps and proto-ports within a rule is not significant. An ICMP entry with "ports": ""
+        is the same as an entry without ports. Dictionaries are returned as sorted tuples of (key, value).
+
+        Rules are hashed for every rule of large policies, scalar values are handled without recursion.
+    """
+    kind = type(value)
+
+    if kind is dict:
+        items = []
+        for key, item in value.items():
+            if item is None or item == '':
+                continue
+            if type(item) in (dict, list):
+                item = freeze(item)
+                if not item:
+                    continue
+            items.append((key, item))
+        items.sort()
+        return tuple(items)
+
+    if kind is list:
+        items = [freeze(item) if type(item) in (dict, list) else item for item in value]
+        try:
+            items.sort()
+        except TypeError:                        # mixed types in the list
+            items.sort(key=repr)
+        return tuple(items)
+
+    return value
+
+
+def canonical_rule(rule):
+    """
+        Return the rule in canonical form, two rules which are equivalent have the same canonical form.
+        The value is hashable and can be used as a dictionary key or set member.
+    """
+    return freeze(rule)
+
+
+def diff_rules(existing, proposed):
+    """
+        Compare the existing rules of a policy with the proposed rules.
+        Rules are first-match, so a change in the order of the rules is also a change.
+
+        Returns a dictionary of the rules added and removed (with their index in the respective list),
+        whether the common rules have been reordered, and if the proposed rules differ from the existing.
+    """
+    existing_keys = [canonical_rule(rule) for rule in existing]
+    proposed_keys = [canonical_rule(rule) for rule in proposed]
+
+    remaining = Counter(existing_keys)
+    added = []
+    for index, key in enumerate(proposed_keys):
+        if remaining[key] > 0:
+            remaining[key] -= 1
+        else:
+            added.append(dict(index=index, rule=proposed[index]))
+
+    remaining = Counter(proposed_keys)
+    removed = []
+    common = []
+    for index, key in enumerate(existing_keys):
+        if remaining[key] > 0:
+            remaining[key] -= 1
+            common.append(key)
+        else:
+            removed.append(dict(index=index, rule=existing[index]))
+
+    added_index = set(item['index'] for item in added)
+    reordered = common != [key for index, key in enumerate(proposed_keys) if index not in added_index]
+
+    return dict(added=added,
+                removed=removed,
+                reordered=reordered,
+                changed=bool(added or removed or reordered)
+                )
+
+
+def merge_key(key):
+    """
+        Rules which have the same action, from, to and apps (all values other than proto-ports) may be merged,
+        return the canonical form of the rule without proto-ports
+    """
+    return tuple(item for item in key if item[0] != 'proto-ports')
+
+
+def merge_rules(existing, rules):
+    """
+        Append the rules to the existing rules, building a hashed index of the existing rules in canonical form.
+
+        Exact duplicates of a rule are dropped. A rule which only differs from an earlier rule by its proto-ports
+        is merged into the earlier rule, combining the proto-ports lists. As the policy is first-match, the merge
+        is only done when no rule with a different action follows the earlier rule, moving the ports to the earlier
+        rule must not change which rule matches first.
+
+        Each rule is hashed once, the time is linear in the number of rules.
+        Returns a new list, the existing rules are not modified.
+    """
+    result = []
+    seen = set()                 # canonical form of every rule in result
+    targets = {}                 # merge key -> index in result of the rule proto-ports are merged into
+    ports = {}                   # index in result -> set of canonical proto-ports of that rule
+    last_action = {}             # action -> index in result of the last rule with that action
+
+    def add(rule, merge):
+        key = canonical_rule(rule)
+        if key in seen:
+            return
+        seen.add(key)
+        action = rule.get('action')
+        frozen = dict(key)
+
+        if merge and 'proto-ports' in frozen:
+            target = targets.get(merge_key(key))
+            if target is not None and all(index < target for other, index in last_action.items() if other != action):
+                merged = dict(result[target])
+                merged['proto-ports'] = list(merged['proto-ports'])
+                for entry in rule['proto-ports']:
+                    entry_key = freeze(entry)
+                    if entry_key not in ports[target]:
+                        ports[target].add(entry_key)
+                        merged['proto-ports'].append(entry)
+                result[target] = merged
+                return
+
+        index = len(result)
+        result.append(rule)
+        last_action[action] = index
+        if 'proto-ports' in frozen:
+            targets[merge_key(key)] = index
+            ports[index] = set(frozen['proto-ports'])
+
+    for rule in existing:
+        add(rule, merge=False)
+    for rule in rules:
+        add(rule, merge=True)
+
+    return result
+
+
+def parse_ports(ports):
+    """
+        Parse the ports of a proto-ports entry, a string of comma separated ports and ranges ("80,8000-8080"),
+        an integer or a list of either. Returns a list of (low, high) intervals and a list of the values
+        which could not be parsed (e.g. "21-20"), these are left for the PSM to report.
+    """
+    if isinstance(ports, (list, tuple)):
+        values = []
+        for item in ports:
+            values.extend(str(item).split(','))
+    else:
+        values = str(ports).split(',')
+
+    intervals = []
+    invalid = []
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        low, _, high = value.partition('-')
+        try:
+            low = int(low)
+            high = int(high) if high else low
+        except ValueError:
+            invalid.append(value)
+            continue
+        if low > high or low < 0 or high > 65535:
+            invalid.append(value)
+            continue
+        intervals.append((low, high))
+
+    return intervals, invalid
+
+
+def merge_intervals(intervals):
+    """
+        Merge overlapping and adjacent intervals, e.g. (80, 80), (80, 90), (91, 92) become (80, 92)
+    """
+    result = []
+    for low, high in sorted(intervals):
+        if result and low <= result[-1][1] + 1:
+            if high > result[-1][1]:
+                result[-1] = (result[-1][0], high)
+        else:
+            result.append((low, high))
+    return result
+
+
+def compact_proto_ports(proto_ports):
+    """
+        Return the minimal, deterministic proto-ports list. The ports of each protocol are parsed into intervals,
+        overlapping and adjacent ranges are merged and one entry is returned per protocol, sorted by protocol.
+        e.g. tcp 80, tcp 80-90 and tcp 81,82 become tcp 80-90
+
+        Entries without ports (e.g. icmp) are returned once, they allow every port of the protocol, so the ported
+        entries of that protocol are dropped, e.g. tcp and tcp 80 become tcp. Ports which cannot be parsed are returned unchanged
+        in a separate entry. Other keys in an entry are not expected, such entries are returned unchanged.
+    """
+    intervals = {}
+    invalid = {}
+    no_ports = set()
+    other = []
+    seen = set()
+
+    for entry in proto_ports:
+        if set(entry.keys()) - set(('protocol', 'ports')):
+            key = freeze(entry)
+            if key not in seen:
+                seen.add(key)
+                other.append(entry)
+            continue
+
+        protocol = str(entry.get('protocol', '')).lower()
+        ports = entry.get('ports')
+        if ports is None or ports == '' or ports == []:
+            no_ports.add(protocol)
+            continue
+
+        parsed, bad = parse_ports(ports)
+        intervals.setdefault(protocol, []).extend(parsed)
+        for value in bad:
+            invalid.setdefault(protocol, [])
+            if value not in invalid[protocol]:
+                invalid[protocol].append(value)
+
+    result = []
+    for protocol in sorted(no_ports | set(intervals) | set(invalid)):
+        if protocol in no_ports:
+            result.append(dict(protocol=protocol))
+            continue
+        if intervals.get(protocol):
+            ranges = ['{}'.format(low) if low == high else '{}-{}'.format(low, high) for low, high in merge_intervals(intervals[protocol])]
+            result.append(dict(protocol=protocol, ports=','.join(ranges)))
+        if protocol in invalid:
+            result.append(dict(protocol=protocol, ports=','.join(invalid[protocol])))
+
+    return result + other
+
+
+def compact_rules(rules):
+    """
+        Compact the proto-ports of each rule, returning a new list of rules
+    """
+    result = []
+    for rule in rules:
+        if rule.get('proto-ports'):
+            rule = dict(rule)
+            rule['proto-ports'] = compact_proto_ports(rule['proto-ports'])
+        result.append(rule)
+    return result
+
+
+def aggregate_addresses(addresses):
+    """
+        Collapse a list of addresses and prefixes into the minimal list of covering prefixes,
+        e.g. 192.0.2.0/32 through 192.0.2.255/32 become 192.0.2.0/24. IPv4 and IPv6 are collapsed separately.
+        Values which are not a valid address or prefix (e.g. a range, or host bits set) are returned unchanged.
+    """
+    networks = {4: [], 6: []}
+    other = []
+    for address in addresses:
+        try:
+            network = ipaddress.ip_network(u'{}'.format(address).strip())
+        except ValueError:
+            if address not in other:
+                other.append(address)
+            continue
+        networks[network.version].append(network)
+
+    result = []
+    for version in (4, 6):
+        result.extend(str(network) for network in ipaddress.collapse_addresses(networks[version]))
+
+    return result + other
+
+
+def aggregate_rules(rules):
+    """
+        Collapse the from-ip-addresses and to-ip-addresses of each rule, then drop the rules which
+        have become identical to an earlier rule.
+        Returns the new list of rules and the number of rules, addresses and bytes before and after.
+    """
+    keys = ('from-ip-addresses', 'to-ip-addresses')
+    result = []
+    seen = set()
+    stats = dict(rules_before=len(rules), addresses_before=0, bytes_before=len(json.dumps(rules)))
+
+    for rule in rules:
+        rule = dict(rule)
+        for key in keys:
+            if rule.get(key):
+                stats['addresses_before'] += len(rule[key])
+                rule[key] = aggregate_addresses(rule[key])
+        canonical = canonical_rule(rule)
+        if canonical in seen:
+            continue
+        seen.add(canonical)
+        result.append(rule)
+
+    stats.update(rules_after=len(result),
+                 addresses_after=sum(len(rule.get(key) or []) for rule in result for key in keys),
+                 bytes_after=len(json.dumps(result)))
+
+    return result, stats
+
+
+RULE_MATCH_KEYS = ('action', 'from-ip-addresses', 'to-ip-addresses', 'proto-ports', 'apps', 'description', 'name')
+
+
+def _match_set(rule):
+    """
+        Return the traffic matched by a rule as networks, port intervals and apps, or None if the rule
+        cannot be analyzed, e.g. it references workload groups or an address which is not a prefix.
+    """
+    if set(rule.keys()) - set(RULE_MATCH_KEYS) or not rule.get('from-ip-addresses') or not rule.get('to-ip-addresses'):
+        return None
+
+    try:
+        sources = [_prefix(address) for address in rule['from-ip-addresses']]
+        destinations = [_prefix(address) for address in rule['to-ip-addresses']]
+    except ValueError:
+        return None
+
+    intervals = {}
+    no_ports = set()
+    for entry in rule.get('proto-ports') or []:
+        protocol = str(entry.get('protocol', '')).lower()
+        if entry.get('ports') in (None, '', []):
+            no_ports.add(protocol)
+            continue
+        parsed, invalid = parse_ports(entry['ports'])
+        if invalid:
+            return None
+        intervals.setdefault(protocol, []).extend(parsed)
+
+    return dict(action=rule.get('action'),
+                sources=sources,
+                destinations=destinations,
+                intervals=dict((protocol, merge_intervals(values)) for protocol, values in intervals.items()),
+                no_ports=no_ports,
+                apps=set(rule.get('apps') or []),
+                kind='apps' if rule.get('apps') else 'ports' if rule.get('proto-ports') else 'any'
+                )
+
+
+def _prefix(address):
+    """
+        Return a prefix as a tuple of (version, prefix length, network address as an integer), the
+        prefix of a supernet and a subnet test are then integer operations
+    """
+    network = ipaddress.ip_network(u'{}'.format(address).strip())
+    return network.version, network.prefixlen, int(network.network_address)
+
+
+def _mask(version, length):
+    """
+        Return the integer netmask for the prefix length
+    """
+    bits = 32 if version == 4 else 128
+    return ((1 << length) - 1) << (bits - length)
+
+
+def _networks_covered(inner, outer):
+    """
+        Each network of inner is a subnet of a network in outer
+    """
+    for version, length, address in inner:
+        if not any(version == other[0] and length >= other[1] and address & _mask(version, other[1]) == other[2] for other in outer):
+            return False
+    return True
+
+
+def _intervals_covered(inner, outer):
+    """
+        Each interval of inner is within an interval of outer, outer is merged and sorted
+    """
+    for protocol, intervals in inner.items():
+        merged = outer.get(protocol)
+        if not merged:
+            return False
+        starts = [low for low, high in merged]
+        for low, high in intervals:
+            position = bisect.bisect_right(starts, low) - 1
+            if position < 0 or merged[position][1] < high:
+                return False
+    return True
+
+
+def _covers(outer, inner):
+    """
+        The traffic matched by the inner rule is a subset of the traffic matched by the outer rule
+    """
+    if outer['kind'] != inner['kind']:
+        return False
+    if inner['kind'] == 'apps' and not inner['apps'] <= outer['apps']:
+        return False
+    if inner['kind'] == 'ports':
+        if not inner['no_ports'] <= outer['no_ports'] or not _intervals_covered(inner['intervals'], outer['intervals']):
+            return False
+    return _networks_covered(inner['sources'], outer['sources']) and _networks_covered(inner['destinations'], outer['destinations'])
+
+
+PORTS = 1 << 16                 # size of the port space, the leaves of the port segment tree
+MAX_PAIRS = 64                  # rules with more source, destination pairs are indexed by source only
+
+
+def _port_segments(low, high):
+    """
+        Yield the nodes of the segment tree over the port space which together cover the ports low to high,
+        at most two for each level. Node 1 is the root, the children of node n are 2n and 2n + 1.
+    """
+    low, high = low + PORTS, high + PORTS + 1
+    while low < high:
+        if low & 1:
+            yield low
+            low += 1
+        if high & 1:
+            high -= 1
+            yield high
+        low >>= 1
+        high >>= 1
+
+
+def _port_path(port):
+    """
+        Yield the leaf of the port and each of its ancestors, the nodes which may hold an interval containing the port
+    """
+    node = port + PORTS
+    while node:
+        yield node
+        node >>= 1
+
+
+class _Selector(object):
+    """
+        Earlier rules of one address bucket, indexed by what they match, so a rule is only compared with the
+        rules which match at least one of its ports, apps or protocols. Rules with ports are saved in a segment
+        tree over the port space for each protocol, the rules whose intervals contain a port are found by
+        visiting the 17 nodes on the path of the port.
+    """
+    def __init__(self):
+        self.exact = {}
+        self.trees = {}
+
+    def add(self, index, match):
+        if match['kind'] == 'any':
+            self.exact.setdefault(('any',), []).append(index)
+        elif match['kind'] == 'apps':
+            for app in match['apps']:
+                self.exact.setdefault(('app', app), []).append(index)
+        else:
+            for protocol in match['no_ports']:
+                self.exact.setdefault(('no_ports', protocol), []).append(index)
+            for protocol, intervals in match['intervals'].items():
+                tree = self.trees.setdefault(protocol, {})
+                for low, high in intervals:
+                    for node in _port_segments(low, high):
+                        tree.setdefault(node, []).append(index)
+
+    def candidates(self, match):
+        """
+            Return the indexes of the rules which may cover the rule, each matches its first port, app or protocol
+        """
+        if match['kind'] == 'any':
+            return self.exact.get(('any',), [])
+        if match['kind'] == 'apps':
+            return self.exact.get(('app', min(match['apps'])), []) if match['apps'] else []
+        if match['intervals']:
+            protocol = min(match['intervals'])
+            tree = self.trees.get(protocol)
+            if not tree:
+                return []
+            result = []
+            for node in _port_path(match['intervals'][protocol][0][0]):
+                result.extend(tree.get(node, ()))
+            return result
+        if match['no_ports']:
+            return self.exact.get(('no_ports', min(match['no_ports'])), [])
+        return []
+
+
+def shadowed_rules(rules):
+    """
+        Policy is first-match, a rule is never matched when all of its traffic is matched by an earlier rule.
+        Return a list of the rules which are covered by an earlier rule, with the index of the covering rule.
+        The type is 'redundant' when both rules have the same action, 'shadowed' when the action differs.
+
+        Rather than comparing every pair of rules, earlier rules are indexed by each pair of their source and
+        destination prefixes (rules with more than MAX_PAIRS pairs by source prefix only), and within each
+        bucket by port, app or protocol, see _Selector. The candidate covering rules are found by looking up
+        the supernets of the first source and destination prefix of the rule, for each prefix length in the
+        index, and its first port. Only those candidates are compared.
+    """
+    by_pair = {}
+    by_source = {}
+    pair_lengths = set()
+    source_lengths = set()
+    match_sets = []
+    result = []
+
+    for index, rule in enumerate(rules):
+        match = _match_set(rule)
+        match_sets.append(match)
+        if match is None:
+            continue
+
+        (source_version, source_length, source), (destination_version, destination_length, destination) = match['sources'][0], match['destinations'][0]
+        candidates = set()
+        for key in pair_lengths:
+            if key[0] == source_version and key[2] == destination_version and key[1] <= source_length and key[3] <= destination_length:
+                selector = by_pair.get((key, source & _mask(source_version, key[1]), destination & _mask(destination_version, key[3])))
+                if selector:
+                    candidates.update(selector.candidates(match))
+        for key in source_lengths:
+            if key[0] == source_version and key[1] <= source_length:
+                selector = by_source.get((key, source & _mask(source_version, key[1])))
+                if selector:
+                    candidates.update(selector.candidates(match))
+
+        for candidate in sorted(candidates):
+            if _covers(match_sets[candidate], match):
+                result.append(dict(index=index,
+                                   rule=rule,
+                                   covered_by=candidate,
+                                   type='redundant' if match_sets[candidate]['action'] == match['action'] else 'shadowed'
+                                   ))
+                break
+        else:
+            if len(match['sources']) * len(match['destinations']) <= MAX_PAIRS:
+                for source_prefix in match['sources']:
+                    for destination_prefix in match['destinations']:
+                        key = (source_prefix[0], source_prefix[1], destination_prefix[0], destination_prefix[1])
+                        pair_lengths.add(key)
+                        by_pair.setdefault((key, source_prefix[2], destination_prefix[2]), _Selector()).add(index, match)
+            else:
+                for source_prefix in match['sources']:
+                    key = source_prefix[:2]
+                    source_lengths.add(key)
+                    by_source.setdefault((key, source_prefix[2]), _Selector()).add(index, match)
+
+    return result
+
+
+def prune_shadowed(rules):
+    """
+        Remove the rules which are never matched because they are covered by an earlier rule.
+        Returns the remaining rules and the list of rules removed, see shadowed_rules.
+    """
+    shadowed = shadowed_rules(rules)
+    removed = set(item['index'] for item in shadowed)
+    return [rule for index, rule in enumerate(rules) if index not in removed], shadowed
@@ -0,0 +1,195 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Content-addressed store of network security policy snapshots.
+#
+#     directory/
+#         blocks/<2 hex>/<sha256>.json               a block of consecutive rules, named by the hash of its content
+#         snapshots/<host>/<policy name>/<id>.json   a snapshot, the list of its blocks, e.g. id 1602950400000-3f2a9c1b7d4e
+#
+#     The rules are divided into blocks where the hash of a rule has its low bits zero (on average every BLOCK_RULES
+#     rules), so the boundaries depend on the rules, not their position. Inserting or removing a rule only changes
+#     the block which contains it, the other blocks are shared with the previous snapshots and stored once.
+#
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+BLOCK_RULES = 32
+
+
+def encode(value):
+    """
+        Return the value as canonical JSON bytes, the same value is always encoded the same
+    """
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def split_blocks(rules):
+    """
+        Divide the rules into blocks, a block ends after a rule whose hash is a multiple of BLOCK_RULES
+    """
+    blocks = []
+    block = []
+    for rule in rules:
+        block.append(rule)
+        if int(digest(encode(rule))[:8], 16) % BLOCK_RULES == 0:
+            blocks.append(block)
+            block = []
+    if block:
+        blocks.append(block)
+    return blocks
+
+
+class SnapshotStore(object):
+    """
+        Snapshots of network security policies, each version pushed or read by manage_policy is saved, unless it is
+        identical to the latest snapshot of the policy. A snapshot is identified by its id, or by its index in the
+        list of snapshots of the policy, e.g. '-1' is the latest and '-2' the one before.
+
+        The snapshots are kept for each PSM host, the blocks are shared by all hosts.
+    """
+    def __init__(self, directory, host=None):
+        self.directory = directory
+        self.host = host or 'default'
+        self.lock = threading.Lock()
+        for name in ('blocks', 'snapshots'):
+            if not os.path.isdir(os.path.join(directory, name)):
+                os.makedirs(os.path.join(directory, name))
+
+    def write(self, path, data):
+        """
+            Write the file atomically, concurrent readers see the complete file or no file
+        """
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        handle, name = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as fp:
+            fp.write(data)
+        os.rename(name, path)
+
+    def block_path(self, key):
+        return os.path.join(self.directory, 'blocks', key[:2], '{}.json'.format(key))
+
+    def policy_path(self, policy_name, snapshot_id=None):
+        path = os.path.join(self.directory, 'snapshots', self.host, policy_name)
+        return os.path.join(path, '{}.json'.format(snapshot_id)) if snapshot_id else path
+
+    def put_block(self, rules):
+        """
+            Save a block of rules, if not already saved, return its key
+        """
+        data = encode(rules)
+        key = digest(data)
+        if not os.path.exists(self.block_path(key)):
+            self.write(self.block_path(key), data)
+        return key
+
+    def save(self, policy, source='pushed'):
+        """
+            Save a snapshot of the policy, as returned by the PSM, source is 'pushed' or 'seen'.
+            Return the id of the snapshot, or of the latest snapshot when the policy is identical to it.
+        """
+        name = policy['meta']['name']
+        spec = policy.get('spec') or {}
+        with self.lock:
+            blocks = [self.put_block(block) for block in split_blocks(spec.get('rules') or [])]
+            content = digest(encode(dict(blocks=blocks, attach_tenant=spec.get('attach-tenant'))))
+
+            latest = self.list(name)[-1:]
+            if latest and latest[0]['digest'] == content:
+                return latest[0]['id']
+
+            stamp = int(time.time() * 1000)
+            if latest:                                 # ids are ordered by their time, two saves in one millisecond are not
+                stamp = max(stamp, int(latest[0]['id'].split('-')[0]) + 1)
+            manifest = dict(id='{:d}-{}'.format(stamp, content[:12]),
+                            policy=name,
+                            time=time.time(),
+                            source=source,
+                            digest=content,
+                            rules=len(spec.get('rules') or []),
+                            attach_tenant=spec.get('attach-tenant'),
+                            blocks=blocks,
+                            **{'resource-version': (policy['meta'] or {}).get('resource-version')})
+            self.write(self.policy_path(name, manifest['id']), encode(manifest))
+        return manifest['id']
+
+    def list(self, policy_name):
+        """
+            Return the snapshots of the policy, oldest first, without the list of blocks
+        """
+        try:
+            names = sorted(os.listdir(self.policy_path(policy_name)), key=lambda item: int(item.split('-')[0]))
+        except OSError:
+            return []
+
+        result = []
+        for item in names:
+            if not item.endswith('.json'):
+                continue
+            with open(os.path.join(self.policy_path(policy_name), item), 'rb') as fp:
+                manifest = json.loads(fp.read().decode('utf-8'))
+            manifest.pop('blocks', None)
+            result.append(manifest)
+        return result
+
+    def find(self, policy_name, snapshot):
+        """
+            Return the id of the snapshot, specified by id, a unique prefix of the id, or index e.g. '-1', or None
+        """
+        ids = [item['id'] for item in self.list(policy_name)]
+        try:
+            index = int(snapshot)
+            if -len(ids) <= index < len(ids):
+                return ids[index]
+        except ValueError:
+            pass
+        matches = [item for item in ids if item.startswith(str(snapshot))]
+        return matches[0] if len(matches) == 1 else None
+
+    def load(self, policy_name, snapshot):
+        """
+            Return the snapshot with its rules, or None if it does not exist
+        """
+        snapshot_id = self.find(policy_name, snapshot)
+        if snapshot_id is None:
+            return None
+        with open(self.policy_path(policy_name, snapshot_id), 'rb') as fp:
+            manifest = json.loads(fp.read().decode('utf-8'))
+
+        rules = []
+        for key in manifest.pop('blocks'):
+            with open(self.block_path(key), 'rb') as fp:
+                rules.extend(json.loads(fp.read().decode('utf-8')))
+        manifest['rules'] = rules
+        return manifest
+
+    def diff(self, policy_name, snapshot, compare_to='-1'):
+        """
+            Return the rules added and removed from snapshot to compare_to (see Rules.diff_rules), or None
+            if either snapshot does not exist
+        """
+        old, new = self.load(policy_name, snapshot), self.load(policy_name, compare_to)
+        if old is None or new is None:
+            return None
+        return dict(Rules.diff_rules(old['rules'], new['rules']), snapshot=old['id'], compare_to=new['id'],
+                    attach_tenant_changed=old['attach_tenant'] != new['attach_tenant'])
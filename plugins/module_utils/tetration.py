@@ -0,0 +1,318 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Convert policy from a Tetration ADM (Application Dependency Mapping) run to PSM rules and proto-ports.
+#     Each function makes a single pass over the ADM policy, the generators can be chained to avoid building
+#     intermediate lists.
+#
+import re
+import json
+import codecs
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+PROTOCOLS = {1: 'icmp', 6: 'tcp', 17: 'udp'}
+ACTIONS = {'ALLOW': 'permit', 'DROP': 'deny', 'DENY': 'deny'}
+ANY = ['0.0.0.0/0']
+
+
+def protocol_name(proto):
+    """
+        Tetration identifies the protocol by number in l4_params (6) and by name in adm.policy ('tcp')
+    """
+    if isinstance(proto, int):
+        return PROTOCOLS.get(proto, str(proto))
+    return str(proto).lower()
+
+
+def proto_port(protocol, low=None, high=None):
+    """
+        Return a proto-ports entry, ICMP cannot specify ports, the ports are stripped
+    """
+    if protocol == 'icmp' or low in (None, '', 'unspecified'):
+        return dict(protocol=protocol)
+    if high in (None, '', 'unspecified') or high == low:
+        return dict(protocol=protocol, ports='{}'.format(low))
+    return dict(protocol=protocol, ports='{}-{}'.format(low, high))
+
+
+def l4_proto_port(l4_param):
+    """
+        Convert an l4_params entry of default_policies, e.g. {'proto': 17, 'port': [137, 138], 'confidence': 0.95}
+    """
+    port = l4_param.get('port') or [None, None]
+    return proto_port(protocol_name(l4_param.get('proto')), port[0], port[-1])
+
+
+def policy_proto_port(entry):
+    """
+        Convert an entry of adm.policy, e.g. {'proto': 'udp', 'ports': {'from': 137, 'to': 138}, ...}
+    """
+    ports = entry.get('ports') or {}
+    if not isinstance(ports, dict):
+        return proto_port(protocol_name(entry.get('proto')), ports)
+    return proto_port(protocol_name(entry.get('proto')), ports.get('from'), ports.get('to'))
+
+
+def selected(item, confidence, action=None):
+    """
+        The item meets the confidence threshold and has the specified action. Approved or absolute policy
+        entries may not include a confidence, they are selected.
+    """
+    if action and item.get('action') != action:
+        return False
+    return item.get('confidence', 1.0) >= confidence
+
+
+def iter_policy_proto_ports(policy, confidence=0.0, action='ALLOW'):
+    """
+        Yield the proto-ports of the adm.policy entries which meet the confidence threshold and action
+    """
+    for entry in policy:
+        if selected(entry, confidence, action):
+            yield policy_proto_port(entry)
+
+
+def rule_action(policy, map_actions=False):
+    """
+        The sample playbooks permit every policy, with map_actions ALLOW is mapped to permit and DROP to deny
+    """
+    if not map_actions:
+        return 'permit'
+    return ACTIONS.get(policy.get('action'), str(policy.get('action')).lower())
+
+
+def iter_rules(policies, confidence=0.0, from_ip_addresses=None, to_ip_addresses=None, include_icmp=False, map_actions=False):
+    """
+        Yield a PSM rule for each default (or absolute) policy, the proto-ports of the rule are the l4_params
+        which meet the confidence threshold, compacted. As in the sample playbooks, ICMP l4_params are skipped
+        and every rule is a permit, unless include_icmp (ICMP is sent without ports) or map_actions is specified.
+    """
+    for policy in policies:
+        proto_ports = [l4_proto_port(l4_param) for l4_param in policy.get('l4_params') or [] if selected(l4_param, confidence)]
+        if not include_icmp:
+            proto_ports = [entry for entry in proto_ports if entry['protocol'] != 'icmp']
+        if not proto_ports:
+            continue
+        yield {'action': rule_action(policy, map_actions),
+               'from-ip-addresses': list(from_ip_addresses or ANY),
+               'to-ip-addresses': list(to_ip_addresses or ANY),
+               'proto-ports': Rules.compact_proto_ports(proto_ports)
+               }
+
+
+def adm_section(data, key):
+    """
+        Locate the key in the data returned by tetration_application, or in the 'adm' or 'raw' sections of it,
+        e.g. data['adm']['raw']['default_policies'] or data['ansible_facts']['adm']['policy']
+    """
+    for name in ('ansible_facts', 'adm', 'raw'):
+        if isinstance(data, dict) and key not in data and name in data:
+            data = data[name]
+    if isinstance(data, dict):
+        return data.get(key) or []
+    return data or []
+
+
+def adm_proto_ports(data, confidence=0.0, action='ALLOW'):
+    """
+        Return the compacted proto-ports of an ADM policy, for use as the 'proto_ports' of an App
+    """
+    return Rules.compact_proto_ports(iter_policy_proto_ports(adm_section(data, 'policy'), confidence=confidence, action=action))
+
+
+def adm_rules(data, confidence=0.0, from_ip_addresses=None, to_ip_addresses=None, policies='default_policies', include_icmp=False, map_actions=False):
+    """
+        Return the PSM rules for the default_policies (or absolute_policies) of an ADM run
+    """
+    return list(iter_rules(adm_section(data, policies), confidence=confidence, from_ip_addresses=from_ip_addresses, to_ip_addresses=to_ip_addresses,
+                           include_icmp=include_icmp, map_actions=map_actions))
+
+
+class JsonStream(object):
+    """
+        Incremental reader for a large JSON document, the elements of one array, located by a path of keys,
+        e.g. ['adm', 'policy'], are decoded and returned one at a time. Other values are skipped without
+        being decoded. Only the current element and one chunk of the file are held in memory.
+    """
+    WHITESPACE = ' \t\n\r'
+    NUMBER_TAIL = re.compile(r'[0-9+\-.eE]*\Z')                # the rest of the buffer may continue a number
+
+    def __init__(self, fp, chunk_size=65536):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()   # a character may be split between chunks
+
+    def fill(self):
+        """
+            Read the next chunk, discarding the part of the buffer already consumed
+        """
+        chunk = self.fp.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.utf8.decode(b'', final=True)                   # raises if the file ends within a character
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+            Return the next character which is not whitespace, without consuming it
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError('Unexpected end of JSON document')
+
+    def expect(self, characters):
+        """
+            Consume the next character, which must be one of characters
+        """
+        character = self.peek()
+        if character not in characters:
+            raise ValueError('Expecting one of {} at position {}, found {}'.format(characters, self.pos, character))
+        self.pos += 1
+        return character
+
+    def decode(self):
+        """
+            Decode the next value, reading more of the file until the value is complete. A number is only
+            complete when a delimiter follows it, e.g. '-2500' may continue as '-2500.0' in the next chunk.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.eof or not self.fill():
+                    raise
+                continue
+            if not self.eof and self.buffer[self.pos] not in '{["' and self.NUMBER_TAIL.match(self.buffer, end):
+                if self.fill():                            # the value may continue in the next chunk
+                    continue
+            self.pos = end
+            return value
+
+    def skip(self):
+        """
+            Skip the next value without decoding it, strings (and escapes in strings) are scanned to find the end
+        """
+        if self.peek() not in '{[':
+            self.decode()
+            return
+
+        depth = 0
+        in_string = False
+        while True:
+            if self.pos >= len(self.buffer) and not self.fill():
+                raise ValueError('Unexpected end of JSON document')
+            character = self.buffer[self.pos]
+            self.pos += 1
+            if in_string:
+                if character == '\\':
+                    if self.pos >= len(self.buffer) and not self.fill():
+                        raise ValueError('Unexpected end of JSON document')
+                    self.pos += 1
+                elif character == '"':
+                    in_string = False
+            elif character == '"':
+                in_string = True
+            elif character in '{[':
+                depth += 1
+            elif character in '}]':
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def items(self, path, current=()):
+        """
+            Yield the elements of the array located by path
+        """
+        character = self.peek()
+        path = list(path)
+
+        if character == '[' and list(current) == path:
+            self.pos += 1
+            if self.peek() == ']':
+                self.pos += 1
+                return
+            while True:
+                yield self.decode()
+                if self.expect(',]') == ']':
+                    return
+
+        if character != '{' or list(current) != path[:len(current)]:
+            self.skip()
+            return
+
+        self.pos += 1
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            child = tuple(current) + (key,)
+            if list(child) == path[:len(child)]:
+                for item in self.items(path, child):
+                    yield item
+            else:
+                self.skip()
+            if self.expect(',}') == '}':
+                return
+
+
+def iter_json_array(fp, path, chunk_size=65536):
+    """
+        Yield the elements of the array located by path in the JSON document read from the file object
+    """
+    return JsonStream(fp, chunk_size=chunk_size).items(path)
+
+
+def iter_unique(items):
+    """
+        Yield the items which have not been seen before, compared in canonical form
+    """
+    seen = set()
+    for item in items:
+        key = Rules.canonical_rule(item)
+        if key not in seen:
+            seen.add(key)
+            yield item
+
+
+def stream_rules(fp, confidence=0.0, from_ip_addresses=None, to_ip_addresses=None, policies='default_policies', include_icmp=False, map_actions=False):
+    """
+        Read the ADM export written by the sample playbooks, e.g. playbooks/files/PolicyPubApp.json, and yield
+        the unique PSM rules. The policies are converted as they are read, the export is never loaded whole.
+    """
+    policies = iter_json_array(fp, ['adm', 'raw', policies])
+    return iter_unique(iter_rules(policies, confidence=confidence, from_ip_addresses=from_ip_addresses, to_ip_addresses=to_ip_addresses,
+                                  include_icmp=include_icmp, map_actions=map_actions))
+
+
+def stream_proto_ports(fp, confidence=0.0, action='ALLOW'):
+    """
+        Read the ADM export and return the compacted proto-ports of the adm.policy entries. Only the port
+        intervals of each protocol are held in memory.
+    """
+    return Rules.compact_proto_ports(iter_policy_proto_ports(iter_json_array(fp, ['adm', 'policy']), confidence=confidence, action=action))
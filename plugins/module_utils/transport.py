@@ -0,0 +1,256 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Transports used by the Pensando class to issue HTTP requests to the PSM. Each module is a new Python
+#     process, so the default transport, 'http', only uses the standard library (http.client), which is
+#     already loaded by Ansible. The 'requests' transport imports the Requests library when it is created.
+#
+import io
+import ssl
+import gzip
+import socket
+import threading
+
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.http_cookies import SimpleCookie
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.codec as Codec
+
+
+class codes(object):
+    """
+        HTTP status codes used by the modules
+    """
+    OK = 200
+    NOT_MODIFIED = 304
+    BAD_REQUEST = 400
+    UNAUTHORIZED = 401
+    NOT_FOUND = 404
+    CONFLICT = 409
+    GONE = 410
+    PRECONDITION_FAILED = 412
+    UNSUPPORTED_MEDIA_TYPE = 415
+    TOO_MANY_REQUESTS = 429
+
+
+class TransportError(Exception):
+    """
+        The request could not be issued or the response not received, e.g. connection refused or a timeout
+    """
+    pass
+
+
+ERRORS = (IOError, OSError, socket.error, http_client.HTTPException)
+
+
+def response_cookies(headers):
+    """
+        Return the cookies set by the response (Set-Cookie), name and value only
+    """
+    cookies = {}
+    if hasattr(headers, 'get_all'):
+        values = headers.get_all('Set-Cookie') or []
+    else:                                              # Python 2
+        values = headers.getheaders('Set-Cookie')
+    for header in values:
+        cookie = SimpleCookie()
+        cookie.load(header)
+        cookies.update((name, morsel.value) for name, morsel in cookie.items())
+    return cookies
+
+
+class StreamResponse(object):
+    """
+        Response whose body is read as it is received, e.g. a watch, with the attributes of a Requests
+        response used by the Pensando class. The connection is not reused.
+    """
+    def __init__(self, connection, response):
+        self.connection = connection
+        self.response = response
+        self.status_code = response.status
+        self.headers = response.msg
+        self.ok = 200 <= self.status_code < 400
+        self._text = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            try:
+                self._text = self.response.read().decode('utf-8', 'replace')
+            except ERRORS as e:
+                raise TransportError(e)
+        return self._text
+
+    def iter_lines(self, chunk_size=None):
+        """
+            Yield each line of the body as it is received, without the line ending
+        """
+        try:
+            while True:
+                line = self.response.readline()
+                if not line:
+                    return
+                yield line.rstrip(b'\r\n')
+        except ERRORS as e:
+            raise TransportError(e)
+
+    def close(self):
+        """
+            Close the connection, a thread blocked reading the body returns
+        """
+        try:
+            if self.connection.sock:
+                self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except ERRORS:
+            pass
+        self.connection.close()
+
+
+class HTTPTransport(object):
+    """
+        Standard library transport. Keep-alive connections to each host are saved in a pool, up to
+        pool_maxsize for each host, and reused by subsequent requests. Responses are read completely,
+        gzip encoded responses are decoded. The certificate of the PSM is not verified unless verify is True.
+    """
+    def __init__(self, pool_maxsize=10, verify=False):
+        self.pool_maxsize = pool_maxsize
+        self.verify = verify
+        self.pool = {}
+        self.lock = threading.Lock()
+        self.context = None
+
+    def connect(self, scheme, netloc, timeout):
+        """
+            Return a new connection, connected with the connect timeout and then set to the read timeout
+        """
+        connect_timeout, read_timeout = timeout if isinstance(timeout, (list, tuple)) else (timeout, timeout)
+        if scheme == 'https':
+            if self.context is None:
+                self.context = ssl.create_default_context() if self.verify else ssl._create_unverified_context()
+            connection = http_client.HTTPSConnection(netloc, timeout=connect_timeout, context=self.context)
+        else:
+            connection = http_client.HTTPConnection(netloc, timeout=connect_timeout)
+        connection.connect()
+        connection.sock.settimeout(read_timeout)
+        return connection
+
+    def acquire(self, scheme, netloc, timeout):
+        """
+            Return an idle connection from the pool and True, or a new connection and False
+        """
+        with self.lock:
+            idle = self.pool.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        return self.connect(scheme, netloc, timeout), False
+
+    def release(self, scheme, netloc, connection):
+        with self.lock:
+            idle = self.pool.setdefault((scheme, netloc), [])
+            if len(idle) < self.pool_maxsize:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, verb, url, data=None, headers=None, cookies=None, timeout=(10, 60), stream=False):
+        """
+            Issue the request, return a Codec.Response, or with stream a StreamResponse.
+            A request which fails on a connection from the pool, which the PSM may have closed, is sent once
+            more on a new connection, unless it timed out. Raises TransportError.
+        """
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        if cookies:
+            headers['Cookie'] = '; '.join('{}={}'.format(name, value) for name, value in cookies.items() if value is not None)
+        if data is not None and not isinstance(data, bytes):
+            data = data.encode('utf-8')
+
+        for attempt in range(2):
+            connection = None
+            try:
+                connection, reused = self.acquire(parts.scheme, parts.netloc, timeout)
+                connection.request(verb, path, body=data, headers=headers)
+                response = connection.getresponse()
+                if stream:
+                    return StreamResponse(connection, response)
+                content = response.read()
+            except ERRORS as e:
+                if connection is not None:
+                    connection.close()
+                if connection is not None and reused and attempt == 0 and not isinstance(e, socket.timeout):
+                    continue
+                raise TransportError(e)
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(parts.scheme, parts.netloc, connection)
+            if content and (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+                content = gzip.GzipFile(fileobj=io.BytesIO(content)).read()
+            return Codec.Response(response.status, response.msg, content=content, cookies=response_cookies(response.msg))
+
+    def close(self):
+        """
+            Close the connections in the pool
+        """
+        with self.lock:
+            pool, self.pool = self.pool, {}
+        for idle in pool.values():
+            for connection in idle:
+                connection.close()
+
+
+class RequestsTransport(object):
+    """
+        Transport using a pooled Requests session, for environments which configure Requests, e.g. proxies
+        from the environment. Requests is imported when the transport is created.
+    """
+    def __init__(self, pool_connections=1, pool_maxsize=10, verify=False):
+        import requests
+        import requests.adapters
+        requests.packages.urllib3.disable_warnings()
+
+        self.requests = requests
+        self.verify = verify
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.verify = verify
+        self.session.headers.update({'Connection': 'keep-alive'})
+
+    def request(self, verb, url, data=None, headers=None, cookies=None, timeout=(10, 60), stream=False):
+        """
+            Issue the request, return a Codec.Response, or with stream the Requests response. Raises TransportError.
+        """
+        try:
+            r = self.session.request(verb, url, data=data, headers=headers, cookies=cookies, verify=self.verify, timeout=timeout, stream=stream)
+            if stream:
+                return r
+            return Codec.Response(r.status_code, r.headers, content=r.content, cookies=r.cookies.get_dict())
+        except self.requests.RequestException as e:
+            raise TransportError(e)
+
+    def close(self):
+        self.session.close()
+
+
+def create_transport(name='http', pool_connections=1, pool_maxsize=10, verify=False):
+    """
+        Return the transport, 'http' (standard library) or 'requests'
+    """
+    if name == 'requests':
+        return RequestsTransport(pool_connections=pool_connections, pool_maxsize=pool_maxsize, verify=verify)
+    return HTTPTransport(pool_maxsize=pool_maxsize, verify=verify)
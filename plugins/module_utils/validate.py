@@ -0,0 +1,151 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Validate the rules of a NetworkSecurityPolicy and the spec of an App before they are sent to the PSM.
+#     Each function checks every entry in one pass and returns a list of errors, each prefixed with the
+#     location of the value, e.g. "rules[3].proto-ports[0]: ports are not allowed for protocol icmp".
+#     An empty list means no errors were found, the PSM may still reject the object for other reasons.
+#
+import ipaddress
+
+from ansible.module_utils.six import string_types
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+ACTIONS = ('permit', 'deny', 'reject')
+PROTOCOLS = ('tcp', 'udp', 'icmp', 'any')
+PORT_PROTOCOLS = ('tcp', 'udp', '6', '17')           # protocols which have ports
+ALG_TYPES = ('icmp', 'dns', 'ftp', 'sunrpc', 'msrpc', 'tftp', 'rtsp')
+SOURCE_KEYS = ('from-ip-addresses', 'from-workload-groups', 'from-ipcollections')
+DESTINATION_KEYS = ('to-ip-addresses', 'to-workload-groups', 'to-ipcollections')
+
+
+def validate_address(address):
+    """
+        Return True if the address is 'any', an address, a prefix or a range of addresses, e.g. 192.0.2.1-192.0.2.9
+    """
+    value = u'{}'.format(address).strip()
+    if value == 'any':
+        return True
+    try:
+        if '-' in value:
+            low, high = [ipaddress.ip_address(item.strip()) for item in value.split('-', 1)]
+            return low.version == high.version and low <= high
+        ipaddress.ip_network(value)
+    except ValueError:
+        return False
+    return True
+
+
+def validate_proto_ports(proto_ports, where):
+    """
+        Return the errors in a list of proto-ports entries, each a dictionary of 'protocol' and optionally 'ports'
+    """
+    if not isinstance(proto_ports, list):
+        return ['{}: must be a list'.format(where)]
+
+    errors = []
+    for index, entry in enumerate(proto_ports):
+        location = '{}[{}]'.format(where, index)
+        if not isinstance(entry, dict):
+            errors.append('{}: must be a dictionary of protocol and ports'.format(location))
+            continue
+        if set(entry.keys()) - set(('protocol', 'ports')):
+            errors.append('{}: unexpected keys {}'.format(location, ', '.join(sorted(set(entry.keys()) - set(('protocol', 'ports'))))))
+
+        protocol = str(entry.get('protocol') or '').lower()
+        if not protocol:
+            errors.append('{}: protocol is required'.format(location))
+            continue
+        if protocol not in PROTOCOLS and not (protocol.isdigit() and 0 < int(protocol) < 256):
+            errors.append('{}: unknown protocol {}'.format(location, protocol))
+            continue
+
+        if entry.get('ports') in (None, '', []):
+            continue
+        if protocol not in PORT_PROTOCOLS:
+            errors.append('{}: ports are not allowed for protocol {}'.format(location, protocol))
+            continue
+        intervals, invalid = Rules.parse_ports(entry['ports'])
+        if invalid:
+            errors.append('{}: invalid ports {}'.format(location, ','.join(invalid)))
+
+    return errors
+
+
+def validate_addresses(addresses, where):
+    """
+        Return the errors in a list of addresses
+    """
+    if not isinstance(addresses, list):
+        return ['{}: must be a list'.format(where)]
+    return ['{}[{}]: invalid address {}'.format(where, index, address) for index, address in enumerate(addresses)
+            if not validate_address(address)]
+
+
+def validate_rules(rules):
+    """
+        Return the errors in the rules of a NetworkSecurityPolicy, every rule is checked
+    """
+    if rules is None:
+        return []
+    if not isinstance(rules, list):
+        return ['rules: must be a list']
+
+    errors = []
+    for index, rule in enumerate(rules):
+        where = 'rules[{}]'.format(index)
+        if not isinstance(rule, dict):
+            errors.append('{}: must be a dictionary'.format(where))
+            continue
+
+        if str(rule.get('action') or '').lower() not in ACTIONS:
+            errors.append('{}: action must be one of {}, not {}'.format(where, ', '.join(ACTIONS), rule.get('action')))
+
+        if not any(rule.get(key) for key in SOURCE_KEYS):
+            errors.append('{}: one of {} is required'.format(where, ', '.join(SOURCE_KEYS)))
+        if not any(rule.get(key) for key in DESTINATION_KEYS):
+            errors.append('{}: one of {} is required'.format(where, ', '.join(DESTINATION_KEYS)))
+
+        for key in ('from-ip-addresses', 'to-ip-addresses'):
+            if rule.get(key):
+                errors.extend(validate_addresses(rule[key], '{}.{}'.format(where, key)))
+
+        if rule.get('proto-ports'):
+            errors.extend(validate_proto_ports(rule['proto-ports'], '{}.proto-ports'.format(where)))
+
+        apps = rule.get('apps')
+        if apps and (not isinstance(apps, list) or not all(isinstance(app, string_types) and app for app in apps)):
+            errors.append('{}.apps: must be a list of app names'.format(where))
+
+    return errors
+
+
+def validate_app(spec, where='app'):
+    """
+        Return the errors in the spec of an App, at least one of 'alg' and 'proto-ports' must be specified
+    """
+    errors = []
+    if not spec.get('alg') and not spec.get('proto-ports'):
+        errors.append("{}: at least one of alg and proto_ports is required".format(where))
+
+    alg = spec.get('alg')
+    if alg:
+        if not isinstance(alg, dict):
+            errors.append('{}.alg: must be a dictionary'.format(where))
+        elif str(alg.get('type') or '').lower() not in ALG_TYPES:
+            errors.append('{}.alg: type must be one of {}, not {}'.format(where, ', '.join(ALG_TYPES), alg.get('type')))
+
+    if spec.get('proto-ports'):
+        errors.extend(validate_proto_ports(spec['proto-ports'], '{}.proto_ports'.format(where)))
+
+    return errors
@@ -47,13 +47,63 @@ options:
 
     proto_ports:
         description:
-            - List of protocol, port pairs
+            - List of protocol, port pairs. Overlapping and adjacent port ranges are merged, one entry is sent
+            - for each protocol
+            - With state 'present' or 'reconciled', each app is validated before any request is sent to the PSM, an app
+            - must specify 'alg' or 'proto_ports', ports are only allowed for tcp and udp. Every error is returned in 'errors'
         required: false
 
+    apps:
+        description:
+            - List of apps to add (state 'present') or remove (state 'absent') in one task, each item is either
+            - an app name, or a dictionary with the keys 'app_name', 'alg' and 'proto_ports'
+            - The existing apps are queried once, only the apps which must be added or removed are sent to the PSM
+            - When specified, 'app_name', 'alg' and 'proto_ports' are ignored
+        required: false
+
+    page_size:
+        description:
+            - For state 'query' of all apps, the number of apps requested in each call to the PSM, the
+            - pages are requested until all apps are returned. The default, 0, requests all apps in one call
+        required: false
+        default: 0
+
+    label_selector:
+        description:
+            - For state 'query', return only the apps whose labels match, e.g. 'env=prod,zone!=dmz'
+        required: false
+
+    field_selector:
+        description:
+            - For state 'query', return only the apps whose fields match, e.g. 'meta.name=WEB'
+        required: false
+
+    fields:
+        description:
+            - For state 'query', return only the fields listed for each app, e.g. 'meta.name'. Append '|length'
+            - to return the number of elements of a list, e.g. 'spec.proto-ports|length'
+        required: false
+
+    allow_empty:
+        description:
+            - With state 'reconciled', an empty or missing 'apps' deletes every app on the PSM, the module fails
+            - rather than deleting them unless allow_empty is true
+        required: false
+        default: false
+
+    max_workers:
+        description:
+            - Number of concurrent requests issued when 'apps' is specified, all requests share the rate limit
+        required: false
+        default: 4
+
     state:
         description:
             - Use 'present' or 'absent' to add or remove
             - Use 'query' for listing the current apps
+            - Use 'reconciled' to make the apps on the PSM exactly match 'apps', apps which are not listed are
+            - deleted. An app whose content changed is replaced, a new app named <app_name>_<hash> is created, the rules
+            - which reference the old app are updated to reference it and then the old app is deleted
         required: false
         default: 'present'
 
@@ -66,12 +116,15 @@ options:
     password:
         description:
             - Password used to authenticate with the PSM
-        required: true
+            - Not required when using the httpapi connection plugin
+        required: false
 
     hostname:
         description:
             - Hostname (or IP address) of the Pensando Policy and Service Manager (PSM)
-        required: true
+            - Omit when using the httpapi connection plugin 'joelwking.pensando.pensando', the play then
+            - reuses one authenticated session for all tasks
+        required: false
 
     api_version:
         description:
@@ -79,11 +132,108 @@ options:
         required: false
         default: 'v1'
 
+    rate_limit_retry:
+        description:
+            - Number of attempts to issue a request which returns a 429, a server error or a connection error
+            - Server and connection errors are only retried for GET, PUT and DELETE, a POST is only retried after a 429
+        required: false
+        default: 4
+
+    requests_per_second:
+        description:
+            - Initial rate of requests sent to the PSM, the rate is reduced when the PSM returns a 429 and increased
+            - after successful requests. By default, requests are not paced until the PSM returns a 429, pacing then
+            - starts at 25 requests per second. Specify 0 to disable pacing, requests are then only delayed after a 429
+        required: false
+
+    pool_maxsize:
+        description:
+            - Maximum number of keep-alive connections to the PSM saved in the connection pool
+        required: false
+        default: 10
+
+    connect_timeout:
+        description:
+            - Seconds to wait when establishing a connection to the PSM
+        required: false
+        default: 10
+
+    read_timeout:
+        description:
+            - Seconds to wait for the PSM to send a response
+        required: false
+        default: 60
+
+    trace_file:
+        description:
+            - Path of a file to which each request issued to the PSM is appended as a JSON line, with the
+            - verb, path, status, elapsed seconds, bytes sent and received, retries and seconds spent waiting
+        required: false
+
+    cache_dir:
+        description:
+            - Directory in which the objects read from the PSM are saved with their resource-version. Subsequent
+            - runs send the version in If-None-Match and reuse the saved object when it has not changed
+            - Without cache_dir, objects are only cached while the task runs
+        required: false
+
+    gzip_threshold:
+        description:
+            - Request bodies of at least this many bytes are sent gzip encoded (Content-Encoding gzip), e.g. 65536
+            - If the PSM rejects the encoding, the request is sent again uncompressed. The default, 0, disables compression
+        required: false
+        default: 0
+
+    transport:
+        description:
+            - Use 'http' to send requests with the Python standard library, or 'requests' to use the Requests library,
+            - e.g. to use the proxies configured in the environment. The default, 'http', does not import Requests
+        required: false
+        default: 'http'
+        choices: ['http', 'requests']
+
+    buffer:
+        description:
+            - Name of a PSM staging buffer, created by the module 'staging_buffer'. The objects created, updated and deleted
+            - are staged in the buffer rather than applied, they are applied in one transaction when the buffer is committed
+        required: false
+
 
 author:
     - Joel W. King (@joelwking)
 '''
 
+RETURN = '''
+apps:
+    description:
+        - When 'apps' is specified, a list of results for each app, the app name, whether the app changed, the status
+        - code, and the status, one of 'created', 'deleted', 'exists', 'absent', 'replaced', 'unchanged' or 'failed'
+    returned: when apps is specified
+    type: list
+
+rate_limit:
+    description:
+        - Statistics of the requests issued, the number of requests, retries, 429 responses (throttled), server
+        - and connection errors, seconds spent waiting (sleep_time) and the request rate when the module completed
+    returned: always
+    type: dict
+
+metrics:
+    description:
+        - Requests issued to the PSM aggregated by verb and path, the count, status codes, elapsed seconds (total,
+        - mean and max), bytes sent and received, retries and seconds spent waiting. Also the totals, and the seconds
+        - spent locally in each phase, 'encode' (JSON encoding of payloads) and 'rules' (rule processing)
+    returned: always
+    type: dict
+
+cache:
+    description:
+        - Statistics of the read cache, conditional reads answered from the cache (hits) or by downloading the
+        - object (misses), and the number of objects stored
+    returned: always
+    type: dict
+'''
+
 EXAMPLES = '''
 
 
@@ -101,6 +251,14 @@ EXAMPLES = '''
       app:
         state: query
 
+    - name: Query the names of the apps labeled 'env=prod', 100 apps per call
+      app:
+        state: query
+        page_size: 100
+        label_selector: env=prod
+        fields:
+          - meta.name
+
     - name: Delete app
       app:
         state: absent
@@ -121,12 +279,34 @@ EXAMPLES = '''
             - protocol: udp
               ports: "8000,8001,8002"
 
+    - name: Create apps in bulk
+      app:
+        state: present
+        max_workers: 8
+        apps:
+          - app_name: WEB
+            proto_ports:
+              - protocol: tcp
+                ports: "80,443"
+          - app_name: DNS
+            proto_ports:
+              - protocol: udp
+                ports: "53"
+
+    - name: Apps on the PSM match the list, other apps are deleted
+      app:
+        state: reconciled
+        apps: '{{ source_of_truth }}'
+
+    - name: Delete apps in bulk
+      app:
+        state: absent
+        apps:
+          - WEB
+          - DNS
+
 '''
 #
-#  System imports
-#
-import requests
-#
 #  Ansible core import
 #
 from ansible.module_utils.basic import AnsibleModule
@@ -134,70 +314,96 @@ from ansible.module_utils.basic import AnsibleModule
 # Collection import
 #
 import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
 
 
 def main():
     """
         Main logic
     """
-    module = AnsibleModule(
-        argument_spec=dict(
-            hostname=dict(required=True),
-            api_version=dict(required=False, default='v1'),
-            username=dict(required=True,),
-            password=dict(required=True, no_log=True),
+    argument_spec = Pensando.pensando_argument_spec()
+    argument_spec.update(dict(
             state=dict(required=False, default='present'),
-            tenant=dict(required=False, default='default'),
             alg=dict(required=False, type='dict', default={}),
             proto_ports=dict(required=False, type='list', default=[]),
             app_name=dict(required=False, default=''),
-            namespace=dict(required=False, default='default')
-            ),
-            add_file_common_args=True,
-            supports_check_mode=False
+            apps=dict(required=False, type='list', default=[]),
+            allow_empty=dict(required=False, default=False, type='bool'),
+            max_workers=dict(required=False, type='int', default=4)
+            ))
+    argument_spec.update(Pensando.pensando_list_spec())
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        add_file_common_args=True,
+        supports_check_mode=False
         )
 
-    psm = Pensando.Pensando(hostname=module.params.get('hostname'),
-                            username=module.params.get('username'),
-                            password=module.params.get('password'),
-                            api_version=module.params.get('api_version')
-                           )
+    if module.params.get('state') == 'reconciled' and not module.params.get('apps') and not module.params.get('allow_empty'):
+        module.fail_json(msg='apps is empty, reconciling would delete every app on the PSM, specify allow_empty to do so')
 
-    login = psm.login(tenant=module.params.get('tenant'))
-    if not login.ok:
-        module.fail_json(msg='{}:{}'.format(login.status_code, login.text))
+    if module.params.get('state') in ('present', 'reconciled'):
+        errors = Pensando.app_errors(module.params)
+        if errors:
+            module.fail_json(msg='{} errors in apps, nothing was sent to the PSM'.format(len(errors)), errors=errors)
+
+    psm = Pensando.pensando_client(module)
 
     if module.params.get('state') == 'query':
+        if not module.params.get('app_name') and any(module.params.get(key) for key in Pensando.pensando_list_spec()):
+            app, items = Pensando.query_collection(psm, '/configs/security/{}/apps', module.params)
+            if app is not None:
+                module.fail_json(msg='{}:{}'.format(app.status_code, app.text), **psm.results())
+            module.exit_json(changed=False, app=dict(items=items), **psm.results())
+
         url = '/configs/security/{}/apps'
         if module.params.get('app_name'):
             url = '/configs/security/{}/apps/{}'.format('{}', module.params.get('app_name'))
         app = psm.rate_limit('GET', url)
         if app.ok:
-            module.exit_json(changed=False, app=app.json())
-        elif app.status_code == requests.codes.NOT_FOUND:
-            module.exit_json(changed=False, app=dict(items=[]))
+            module.exit_json(changed=False, app=Pensando.project(app.json(), module.params.get('fields')), **psm.results())
+        elif app.status_code == Transport.codes.NOT_FOUND:
+            module.exit_json(changed=False, app=dict(items=[]), **psm.results())
         else:
-            module.fail_json(msg='{}:{}'.format(app.status_code, app.text))
+            module.fail_json(msg='{}:{}'.format(app.status_code, app.text), **psm.results())
+
+    elif module.params.get('state') == 'reconciled':
+        app, results = psm.reconcile_apps(module.params)
+        if app is not None:
+            module.fail_json(msg='{}:{}'.format(app.status_code, app.text), changed=psm.changed, apps=results, **psm.results())
+        failed = [result['app_name'] for result in results if result['status'] == 'failed']
+        if failed:
+            module.fail_json(msg='Failed: {}'.format(', '.join(failed)), changed=psm.changed, apps=results, **psm.results())
+        module.exit_json(changed=psm.changed, apps=results, **psm.results())
+
+    elif module.params.get('apps') and module.params.get('state') in ('present', 'absent'):
+        app, results = psm.bulk_apps(module.params)
+        if not app.ok:
+            module.fail_json(msg='{}:{}'.format(app.status_code, app.text), **psm.results())
+        failed = [result['app_name'] for result in results if result['status'] == 'failed']
+        if failed:
+            module.fail_json(msg='Failed: {}'.format(', '.join(failed)), changed=psm.changed, apps=results, **psm.results())
+        module.exit_json(changed=psm.changed, apps=results, **psm.results())
 
     elif module.params.get('state') == 'absent':
         url = '/configs/security/{}/apps/{}'.format('{}', module.params.get('app_name'))
         app = psm.rate_limit('DELETE', url)
-        if app.status_code == requests.codes.NOT_FOUND:
-            module.exit_json(changed=False, app=app.json())
+        if app.status_code == Transport.codes.NOT_FOUND:
+            module.exit_json(changed=False, app=app.json(), **psm.results())
         elif app.ok:
-            module.exit_json(changed=True, app=app.json())
+            module.exit_json(changed=True, app=app.json(), **psm.results())
 
     elif module.params.get('state') == 'present':
         app = psm.manage_app(module.params)
         if app.ok:
-            module.exit_json(changed=psm.changed, app=app.json())
+            module.exit_json(changed=psm.changed, app=app.json(), **psm.results())
         else:
-            module.fail_json(msg='{}:{}'.format(app.status_code, app.text))
+            module.fail_json(msg='{}:{}'.format(app.status_code, app.text), **psm.results())
 
     else:
-        module.fail_json(msg='Unknown state specified, must be "query", "absent", or "present"')
+        module.fail_json(msg='Unknown state specified, must be "query", "absent", "present" or "reconciled"', **psm.results())
 
-    module.fail_json(msg='Unexpected failure:{}:{}'.format(app.status_code, app.text))
+    module.fail_json(msg='Unexpected failure:{}:{}'.format(app.status_code, app.text), **psm.results())
 
 
 if __name__ == '__main__':
@@ -53,19 +53,85 @@ options:
     rules:
         description:
             - A list of dictionary objects which define the firewall rules to be applied to the PSM
+            - With state 'present', all rules are validated before any request is sent to the PSM, e.g. the action,
+            - addresses, protocols and ports. The module fails with every error, and the index of the rule, in 'errors'
         required: false
 
+    page_size:
+        description:
+            - For state 'query' of all policies, the number of policies requested in each call to the PSM, the
+            - pages are requested until all policies are returned. The default, 0, requests all policies in one call
+        required: false
+        default: 0
+
+    label_selector:
+        description:
+            - For state 'query', return only the policies whose labels match, e.g. 'env=prod,zone!=dmz'
+        required: false
+
+    field_selector:
+        description:
+            - For state 'query', return only the policies whose fields match, e.g. 'meta.name=WEB'
+        required: false
+
+    fields:
+        description:
+            - For state 'query', return only the fields listed for each policy, e.g. 'meta.name'. Append '|length'
+            - to return the number of elements of a list, e.g. 'spec.rules|length'
+        required: false
+
+    compact_ports:
+        description:
+            - Merge overlapping and adjacent port ranges in the 'proto-ports' of each rule, returning one entry
+            - per protocol, e.g. tcp 80, tcp 80-90 and tcp 81,82 are sent as tcp 80-90
+            - By default the rules are sent as specified
+        required: false
+        default: false
+
+    aggregate_addresses:
+        description:
+            - Collapse the 'from-ip-addresses' and 'to-ip-addresses' of each rule into the minimal set of covering
+            - prefixes, e.g. contiguous /32 addresses from an ADM run, and drop rules which then duplicate an earlier rule
+        required: false
+        default: false
+
+    prune_shadowed:
+        description:
+            - Remove rules which are never matched because all their traffic is matched by an earlier rule
+            - before the policy is sent to the PSM. The rules removed are returned in 'shadowed'
+        required: false
+        default: false
+
+    hostnames:
+        description:
+            - With state 'present', apply the policy to each of these PSM clusters concurrently, rather than 'hostname'
+            - Each item is a hostname, or a dictionary which overrides the module arguments for that cluster, e.g.
+            - hostname, username and password
+        required: false
+
+    max_failures:
+        description:
+            - With 'hostnames', the number of clusters which may fail before the module fails
+        required: false
+        default: 0
+
     state:
         description:
             - Use 'present' or 'absent' to add or remove
             - Use 'query' for listing the current policy
+            - Use 'analyze' to report the rules covered by an earlier rule (shadowed or redundant), the rules
+            - specified are analyzed, or when no rules are specified, the rules of the existing policy
+            - Use 'snapshots' to list the snapshots of the policy in snapshot_dir, and with 'snapshot', the rules
+            - which differ between 'snapshot' and 'compare_to'. The PSM is not queried
+            - Use 'restored' to replace the rules of the policy with those of 'snapshot', with a single PUT
         required: false
         default: 'present'
 
     operation:
         description:
           - Use 'replace' to replace all entries of an existing policy
-          - Use 'append' to append the provided rules to an existing policy
+          - Use 'append' to append the provided rules to an existing policy, rules which duplicate an existing
+          - rule are dropped, rules which only differ from an existing rule by 'proto-ports' are merged
         required: false
         default: 'replace'
 
@@ -78,12 +144,15 @@ options:
     password:
         description:
             - Password used to authenticate with the PSM
-        required: true
+            - Not required when using the httpapi connection plugin
+        required: false
 
     hostname:
         description:
             - Hostname (or IP address) of the Pensando Policy and Service Manager (PSM)
-        required: true
+            - Omit when using the httpapi connection plugin 'joelwking.pensando.pensando', the play then
+            - reuses one authenticated session for all tasks
+        required: false
 
     api_version:
         description:
@@ -91,11 +160,166 @@ options:
         required: false
         default: 'v1'
 
+    rate_limit_retry:
+        description:
+            - Number of attempts to issue a request which returns a 429, a server error or a connection error
+            - Server and connection errors are only retried for GET, PUT and DELETE, a POST is only retried after a 429
+        required: false
+        default: 4
+
+    requests_per_second:
+        description:
+            - Initial rate of requests sent to the PSM, the rate is reduced when the PSM returns a 429 and increased
+            - after successful requests. By default, requests are not paced until the PSM returns a 429, pacing then
+            - starts at 25 requests per second. Specify 0 to disable pacing, requests are then only delayed after a 429
+        required: false
+
+    pool_maxsize:
+        description:
+            - Maximum number of keep-alive connections to the PSM saved in the connection pool
+        required: false
+        default: 10
+
+    connect_timeout:
+        description:
+            - Seconds to wait when establishing a connection to the PSM
+        required: false
+        default: 10
+
+    read_timeout:
+        description:
+            - Seconds to wait for the PSM to send a response
+        required: false
+        default: 60
+
+    trace_file:
+        description:
+            - Path of a file to which each request issued to the PSM is appended as a JSON line, with the
+            - verb, path, status, elapsed seconds, bytes sent and received, retries and seconds spent waiting
+        required: false
+
+    cache_dir:
+        description:
+            - Directory in which the objects read from the PSM are saved with their resource-version. Subsequent
+            - runs send the version in If-None-Match and reuse the saved object when it has not changed
+            - Without cache_dir, objects are only cached while the task runs
+        required: false
+
+    gzip_threshold:
+        description:
+            - Request bodies of at least this many bytes are sent gzip encoded (Content-Encoding gzip), e.g. 65536
+            - If the PSM rejects the encoding, the request is sent again uncompressed. The default, 0, disables compression
+        required: false
+        default: 0
+
+    transport:
+        description:
+            - Use 'http' to send requests with the Python standard library, or 'requests' to use the Requests library,
+            - e.g. to use the proxies configured in the environment. The default, 'http', does not import Requests
+        required: false
+        default: 'http'
+        choices: ['http', 'requests']
+
+    snapshot_dir:
+        description:
+            - Directory of the snapshot store. Each version of the policy read or pushed by state 'present' or 'restored'
+            - is saved, unless identical to the latest snapshot. The rules are saved in blocks named by the hash of their
+            - content, so the rules which did not change are only stored once
+        required: false
+
+    snapshot:
+        description:
+            - With state 'snapshots' or 'restored', the id of a snapshot, a unique prefix of the id, or its index in
+            - the list of snapshots, e.g. '-1' is the latest and '-2' the one before
+        required: false
+
+    compare_to:
+        description:
+            - With state 'snapshots', the snapshot compared with 'snapshot'
+        required: false
+        default: '-1'
+
+    buffer:
+        description:
+            - Name of a PSM staging buffer, created by the module 'staging_buffer'. The objects created, updated and deleted
+            - are staged in the buffer rather than applied, they are applied in one transaction when the buffer is committed
+        required: false
+
 
 author:
     - Joel W. King (@joelwking)
 '''
 
+RETURN = '''
+rule_diff:
+    description:
+        - For state 'present', the rules added and removed (with the index of the rule), whether the
+        - existing rules were reordered, and if the policy changed. An unchanged policy is not updated.
+    returned: when state is 'present'
+    type: dict
+
+aggregation:
+    description:
+        - When aggregate_addresses is true, the number of rules, addresses and payload bytes before and after aggregation
+    returned: when state is 'present'
+    type: dict
+
+shadowed:
+    description:
+        - Rules covered by an earlier rule, with the index of the rule and of the covering rule. The type of
+        - each is 'redundant' if both rules have the same action, otherwise 'shadowed'
+    returned: when state is 'analyze', or 'present' with prune_shadowed
+    type: list
+
+snapshots:
+    description:
+        - The snapshots of the policy, oldest first, the id, time, source ('seen' or 'pushed'), number of rules,
+        - attach_tenant and resource-version of each
+    returned: when state is 'snapshots'
+    type: list
+
+snapshot_diff:
+    description:
+        - The rules added and removed from 'snapshot' to 'compare_to', as in rule_diff
+    returned: when state is 'snapshots' and snapshot is specified
+    type: dict
+
+snapshot_id:
+    description:
+        - The id of the latest snapshot saved of the policy
+    returned: when snapshot_dir is specified and state is 'present' or 'restored'
+    type: str
+
+clusters:
+    description:
+        - With 'hostnames', a list of results for each cluster, the hostname, whether the policy changed or the
+        - cluster failed, the status code, rule_diff, rate_limit statistics and metrics, and a message on failure
+    returned: when hostnames is specified
+    type: list
+
+rate_limit:
+    description:
+        - Statistics of the requests issued, the number of requests, retries, 429 responses (throttled), server
+        - and connection errors, seconds spent waiting (sleep_time) and the request rate when the module completed
+    returned: always
+    type: dict
+
+metrics:
+    description:
+        - Requests issued to the PSM aggregated by verb and path, the count, status codes, elapsed seconds (total,
+        - mean and max), bytes sent and received, retries and seconds spent waiting. Also the totals, and the seconds
+        - spent locally in each phase, 'encode' (JSON encoding of payloads) and 'rules' (rule processing)
+    returned: always
+    type: dict
+
+cache:
+    description:
+        - Statistics of the read cache, conditional reads answered from the cache (hits) or by downloading the
+        - object (misses), and the number of objects stored
+    returned: always
+    type: dict
+'''
+
 EXAMPLES = '''
 
 - network_security_policy:
@@ -117,6 +341,19 @@ EXAMPLES = '''
           to-ip-addresses:
             - 192.0.2.0/24
 
+- name: Apply the policy to the PSM cluster of each site
+  network_security_policy:
+      hostnames:
+        - psm.site1.example.net
+        - hostname: psm.site2.example.net
+          password: '{{ site2_password }}'
+      max_failures: 1
+      username: admin
+      password: '{{ password }}'
+      state: present
+      policy_name: quarantine
+      rules: '{{ quarantine }}'
+
 - name: Query Policy
   network_security_policy:
       hostname: psm.example.net
@@ -124,6 +361,36 @@ EXAMPLES = '''
       password: '{{ password }}'
       state: query
 
+- name: Query the name and number of rules of each policy, 50 policies per call
+  network_security_policy:
+      hostname: psm.example.net
+      username: admin
+      password: '{{ password }}'
+      state: query
+      page_size: 50
+      fields:
+        - meta.name
+        - spec.rules|length
+
+- name: Save a snapshot of each version of the policy before and after the push
+  network_security_policy:
+      hostname: psm.example.net
+      username: admin
+      password: '{{ password }}'
+      policy_name: quarantine
+      snapshot_dir: /var/tmp/psm_snapshots
+      rules: '{{ pseudo_acl }}'
+
+- name: Undo the push, restore the policy read before it
+  network_security_policy:
+      hostname: psm.example.net
+      username: admin
+      password: '{{ password }}'
+      state: restored
+      policy_name: quarantine
+      snapshot_dir: /var/tmp/psm_snapshots
+      snapshot: '-2'
+
 - name: Delete Policy
   network_security_policy:
       hostname: psm.example.net
@@ -135,10 +402,6 @@ EXAMPLES = '''
 
 '''
 #
-#  System imports
-#
-import requests
-#
 #  Ansible core import
 #
 from ansible.module_utils.basic import AnsibleModule
@@ -146,66 +409,114 @@ from ansible.module_utils.basic import AnsibleModule
 # Collection import
 #
 import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+import ansible_collections.joelwking.pensando.plugins.module_utils.snapshot as Snapshot
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
+import ansible_collections.joelwking.pensando.plugins.module_utils.validate as Validate
 
 
 def main():
     """
         Main logic
     """
-    module = AnsibleModule(
-        argument_spec=dict(
-            hostname=dict(required=True),
-            api_version=dict(required=False, default='v1'),
-            username=dict(required=True),
-            password=dict(required=True, no_log=True),
+    argument_spec = Pensando.pensando_argument_spec()
+    argument_spec.update(dict(
             state=dict(required=False, default='present'),
             operation=dict(required=False, default='replace'),
-            tenant=dict(required=False, default='default'),
             rules=dict(required=False, type='list'),
             attach_tenant=dict(required=False, default=True, type='bool'),
-            policy_name=dict(required=False, default=''),
-            namespace=dict(required=False, default='default')
-            ),
-            add_file_common_args=True,
-            supports_check_mode=False
-        )
+            compact_ports=dict(required=False, default=False, type='bool'),
+            aggregate_addresses=dict(required=False, default=False, type='bool'),
+            prune_shadowed=dict(required=False, default=False, type='bool'),
+            hostnames=dict(required=False, type='list', default=[]),
+            max_failures=dict(required=False, type='int', default=0),
+            snapshot_dir=dict(required=False, type='path'),
+            snapshot=dict(required=False),
+            compare_to=dict(required=False, default='-1'),
+            policy_name=dict(required=False, default='')
+            ))
+    argument_spec.update(Pensando.pensando_list_spec())
 
-    psm = Pensando.Pensando(hostname=module.params.get('hostname'),
-                            username=module.params.get('username'),
-                            password=module.params.get('password'),
-                            api_version=module.params.get('api_version')
-                           )
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        add_file_common_args=True,
+        supports_check_mode=False
+        )
 
-    login = psm.login(tenant=module.params.get('tenant'))
-    if not login.ok:
-        module.fail_json(msg='{}:{}'.format(login.status_code, login.text))
+    if module.params.get('state') == 'present':
+        errors = Validate.validate_rules(module.params.get('rules'))
+        if errors:
+            module.fail_json(msg='{} errors in rules, nothing was sent to the PSM'.format(len(errors)), errors=errors)
+
+    if module.params.get('hostnames') and module.params.get('state') == 'present':
+        clusters = Pensando.manage_policy_clusters(module.params)
+        changed = any(cluster['changed'] for cluster in clusters)
+        failed = [cluster['hostname'] for cluster in clusters if cluster['failed']]
+        if len(failed) > module.params.get('max_failures'):
+            module.fail_json(msg='Failed: {}'.format(', '.join(failed)), changed=changed, clusters=clusters)
+        module.exit_json(changed=changed, clusters=clusters)
+
+    if module.params.get('state') in ('snapshots', 'restored') and not (module.params.get('snapshot_dir') and module.params.get('policy_name')):
+        module.fail_json(msg='snapshot_dir and policy_name are required with state "{}"'.format(module.params.get('state')))
+
+    if module.params.get('state') == 'snapshots':
+        store = Snapshot.SnapshotStore(module.params.get('snapshot_dir'),
+                                       host=module.params.get('hostname') or Pensando.connection_host(Pensando.module_connection(module)))
+        result = dict(snapshots=store.list(module.params.get('policy_name')))
+        if module.params.get('snapshot'):
+            result['snapshot_diff'] = store.diff(module.params.get('policy_name'), module.params.get('snapshot'), module.params.get('compare_to'))
+            if result['snapshot_diff'] is None:
+                module.fail_json(msg='Snapshot {} or {} not found'.format(module.params.get('snapshot'), module.params.get('compare_to')), **result)
+        module.exit_json(changed=False, **result)
+
+    psm = Pensando.pensando_client(module)
 
     if module.params.get('state') == 'query':
+        if not module.params.get('policy_name') and any(module.params.get(key) for key in Pensando.pensando_list_spec()):
+            policy, items = Pensando.query_collection(psm, '/configs/security/{}/networksecuritypolicies', module.params)
+            if policy is not None:
+                module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text), **psm.results())
+            module.exit_json(changed=False, policy=dict(items=items), **psm.results())
+
         policy = psm.query_policy(policy_name=module.params.get('policy_name'))
         if policy.ok:
-            module.exit_json(changed=False, policy=policy.json())
+            module.exit_json(changed=False, policy=Pensando.project(policy.json(), module.params.get('fields')), **psm.results())
         else:
-            module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text))
+            module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text), **psm.results())
 
     elif module.params.get('state') == 'absent':
         url = '/configs/security/{}/networksecuritypolicies/{}'.format('{}', module.params.get('policy_name'))
         policy = psm.rate_limit('DELETE', url)
-        if policy.status_code == requests.codes.NOT_FOUND:
-            module.exit_json(changed=False, policy=policy.json())
+        if policy.status_code == Transport.codes.NOT_FOUND:
+            module.exit_json(changed=False, policy=policy.json(), **psm.results())
         elif policy.ok:
-            module.exit_json(changed=True, policy=policy.json())
+            module.exit_json(changed=True, policy=policy.json(), **psm.results())
 
     elif module.params.get('state') == 'present':
         policy = psm.manage_policy(module.params)
         if policy.ok:
-            module.exit_json(changed=psm.changed, policy=policy.json())
+            module.exit_json(changed=psm.changed, policy=policy.json(), rule_diff=psm.diff, aggregation=psm.aggregation,
+                             shadowed=psm.shadowed, snapshot_id=psm.snapshot_id, **psm.results())
+        else:
+            module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text), **psm.results())
+
+    elif module.params.get('state') == 'restored':
+        policy = psm.restore_policy(module.params)
+        if policy.ok:
+            module.exit_json(changed=psm.changed, policy=policy.json(), rule_diff=psm.diff, snapshot_id=psm.snapshot_id, **psm.results())
+        else:
+            module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text), **psm.results())
+
+    elif module.params.get('state') == 'analyze':
+        policy, shadowed = psm.analyze_policy(module.params)
+        if policy is None or policy.ok:
+            module.exit_json(changed=False, shadowed=shadowed, **psm.results())
         else:
-            module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text))
+            module.fail_json(msg='{}:{}'.format(policy.status_code, policy.text), **psm.results())
 
     else:
-        module.fail_json(msg='Unknown state specified, must be "query", "absent", or "present"')
+        module.fail_json(msg='Unknown state specified, must be "query", "absent", "present", "analyze", "snapshots" or "restored"', **psm.results())
 
-    module.fail_json(msg='Unexpected failure:{}:{}'.format(policy.status_code, policy.text))
+    module.fail_json(msg='Unexpected failure:{}:{}'.format(policy.status_code, policy.text), **psm.results())
 
 
 if __name__ == '__main__':
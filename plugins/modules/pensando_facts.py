@@ -0,0 +1,256 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+DOCUMENTATION = '''
+---
+module: pensando_facts
+
+short_description: Gather the PSM policies, apps and related security objects, with indexes for lookups
+
+version_added: "2.9"
+
+description:
+    - Lists each subset of security objects concurrently in one task, and returns them keyed by name in the fact
+    - 'pensando', together with indexes of the rules by app and by protocol and port. Playbooks look up an object
+    - or the rules which match, e.g. pensando.rules_by_port['tcp/443'], rather than searching the lists of
+    - 'state: query' with Jinja loops.
+
+options:
+    tenant:
+        description:
+            - Name of the tenant
+        required: false
+        default: 'default'
+
+    gather_subset:
+        description:
+            - The kinds of security objects listed, any of 'networksecuritypolicies', 'apps', 'securitygroups',
+            - 'ipcollections' and 'firewallprofiles'. The rule indexes are returned when 'networksecuritypolicies' is listed
+        required: false
+        default: ['networksecuritypolicies', 'apps']
+
+    page_size:
+        description:
+            - Number of objects requested in each call, pages are requested until all objects are returned
+            - The default, 0, requests all objects of a subset in one call
+        required: false
+        default: 0
+
+    max_workers:
+        description:
+            - Number of subsets listed concurrently, all requests share the rate limit and the connection pool
+            - The default, 0, lists all subsets at once
+        required: false
+        default: 0
+
+    username:
+        description:
+            - Username used to authenticate with the PSM
+        required: false
+        default: 'admin'
+
+    password:
+        description:
+            - Password used to authenticate with the PSM
+            - Not required when using the httpapi connection plugin
+        required: false
+
+    hostname:
+        description:
+            - Hostname (or IP address) of the Pensando Policy and Service Manager (PSM)
+            - Omit when using the httpapi connection plugin 'joelwking.pensando.pensando', the play then
+            - reuses one authenticated session for all tasks
+        required: false
+
+    api_version:
+        description:
+            - Optionally specify the API version
+        required: false
+        default: 'v1'
+
+    rate_limit_retry:
+        description:
+            - Number of attempts to issue a request which returns a 429, a server error or a connection error
+            - Server and connection errors are only retried for GET, PUT and DELETE, a POST is only retried after a 429
+        required: false
+        default: 4
+
+    requests_per_second:
+        description:
+            - Initial rate of requests sent to the PSM, the rate is reduced when the PSM returns a 429 and increased
+            - after successful requests. By default, requests are not paced until the PSM returns a 429, pacing then
+            - starts at 25 requests per second. Specify 0 to disable pacing, requests are then only delayed after a 429
+        required: false
+
+    pool_maxsize:
+        description:
+            - Maximum number of keep-alive connections to the PSM saved in the connection pool
+        required: false
+        default: 10
+
+    connect_timeout:
+        description:
+            - Seconds to wait when establishing a connection to the PSM
+        required: false
+        default: 10
+
+    read_timeout:
+        description:
+            - Seconds to wait for the PSM to send a response
+        required: false
+        default: 60
+
+    trace_file:
+        description:
+            - Path of a file to which each request issued to the PSM is appended as a JSON line, with the
+            - verb, path, status, elapsed seconds, bytes sent and received, retries and seconds spent waiting
+        required: false
+
+    cache_dir:
+        description:
+            - Directory in which the objects read from the PSM are saved with their resource-version. Subsequent
+            - runs send the version in If-None-Match and reuse the saved object when it has not changed
+            - Without cache_dir, objects are only cached while the task runs
+        required: false
+
+    gzip_threshold:
+        description:
+            - Request bodies of at least this many bytes are sent gzip encoded (Content-Encoding gzip), e.g. 65536
+            - If the PSM rejects the encoding, the request is sent again uncompressed. The default, 0, disables compression
+        required: false
+        default: 0
+
+    transport:
+        description:
+            - Use 'http' to send requests with the Python standard library, or 'requests' to use the Requests library,
+            - e.g. to use the proxies configured in the environment. The default, 'http', does not import Requests
+        required: false
+        default: 'http'
+        choices: ['http', 'requests']
+
+
+
+author:
+    - Joel W. King (@joelwking)
+'''
+
+RETURN = '''
+ansible_facts:
+    description:
+        - The fact 'pensando', for each subset gathered, a dictionary of the objects by name, e.g. pensando.apps['WEB']
+        - rules_by_app, the rules which reference each app, by app name, e.g. pensando.rules_by_app['WEB']
+        - rules_by_port, the rules by protocol and port, from their proto-ports and the proto-ports of the apps
+        - they reference. The key is 'tcp/443' for a port, 'tcp/8000-8080' for a range as specified, or the
+        - protocol alone, e.g. 'icmp'. Each rule is a dictionary of the policy name, the index of the rule and the rule
+        - Only exact keys match, a rule which allows tcp/1-1024 is not listed under 'tcp/443'. To find every rule
+        - which allows a port, use the filter joelwking.pensando.rules_for_port, which searches port_intervals
+        - port_intervals, for each protocol, the port ranges of the rules as [low, high, policy, index], sorted by low
+    returned: always
+    type: dict
+
+rate_limit:
+    description:
+        - Statistics of the requests issued, the number of requests, retries, 429 responses (throttled), server
+        - and connection errors, seconds spent waiting (sleep_time) and the request rate when the module completed
+    returned: always
+    type: dict
+
+metrics:
+    description:
+        - Requests issued to the PSM aggregated by verb and path, the count, status codes, elapsed seconds (total,
+        - mean and max), bytes sent and received, retries and seconds spent waiting. Also the totals, and the seconds
+        - spent locally in each phase, 'encode' (JSON encoding of payloads) and 'rules' (rule processing)
+    returned: always
+    type: dict
+'''
+
+EXAMPLES = '''
+
+  tasks:
+    - name: Gather the policies and apps
+      pensando_facts:
+        hostname: psm.example.net
+        username: admin
+        password: '{{ password }}'
+
+    - name: Rules which reference the app WEB
+      debug:
+        msg: '{{ pensando.rules_by_app["WEB"] | default([]) | map(attribute="index") | list }}'
+
+    - name: Create the app unless it exists
+      app:
+        hostname: psm.example.net
+        username: admin
+        password: '{{ password }}'
+        app_name: WEB
+        proto_ports: '{{ web_ports }}'
+      when: '"WEB" not in pensando.apps'
+
+    - name: Fail if a rule allows telnet, including rules with a range of ports, e.g. tcp/1-1024
+      assert:
+        that:
+          - pensando | joelwking.pensando.rules_for_port('tcp', 23) | length == 0
+
+    - name: Rules which allow each port of the app, one key for each port or range, e.g. 'tcp/443'
+      debug:
+        msg: '{{ item }} {{ pensando | joelwking.pensando.rules_for_port(item) | map(attribute="index") | list }}'
+      loop: '{{ web_ports | joelwking.pensando.port_keys }}'
+
+    - name: Gather the security groups and IP collections as well
+      pensando_facts:
+        gather_subset:
+          - networksecuritypolicies
+          - apps
+          - securitygroups
+          - ipcollections
+
+'''
+#
+#  Ansible core import
+#
+from ansible.module_utils.basic import AnsibleModule
+#
+# Collection import
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.facts as Facts
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+
+
+def main():
+    """
+        Main logic
+    """
+    argument_spec = Pensando.pensando_argument_spec()
+    argument_spec.update(dict(
+            gather_subset=dict(required=False, type='list', default=list(Facts.DEFAULT_SUBSETS), choices=list(Facts.SUBSETS)),
+            page_size=dict(required=False, default=0, type='int'),
+            max_workers=dict(required=False, default=0, type='int')
+            ))
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        add_file_common_args=True,
+        supports_check_mode=True
+        )
+
+    psm = Pensando.pensando_client(module)
+
+    failed, facts = Facts.gather_facts(psm, subsets=module.params.get('gather_subset'), page_size=module.params.get('page_size'),
+                                       max_workers=module.params.get('max_workers'))
+    if failed is not None:
+        module.fail_json(msg='{}:{}'.format(failed.status_code, failed.text), **psm.results())
+
+    module.exit_json(changed=False, ansible_facts=dict(pensando=facts), **psm.results())
+
+
+if __name__ == '__main__':
+    main()
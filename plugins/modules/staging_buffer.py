@@ -0,0 +1,258 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+DOCUMENTATION = '''
+---
+module: staging_buffer
+
+short_description: Create, query, commit or delete a PSM staging buffer
+
+version_added: "2.9"
+
+description:
+    - A staging buffer holds writes of Apps and NetworkSecurityPolicies which are not yet applied. The modules 'app'
+    - and 'network_security_policy' stage their writes in the buffer specified by their 'buffer' argument. When the
+    - buffer is committed, the PSM validates all staged writes and applies them as one transaction, so a large
+    - rollout is computed and distributed to the DSCs once, rather than after each object.
+
+options:
+    tenant:
+        description:
+            - Name of the tenant
+        required: false
+        default: 'default'
+
+    buffer_name:
+        description:
+            - Name of the staging buffer
+        required: true
+
+    state:
+        description:
+            - Use 'present' to create the buffer, an existing buffer is not changed
+            - Use 'query' to list the staged writes and the result of their validation
+            - Use 'committed' to commit the staged writes and then delete the buffer. If the commit fails,
+            - nothing is applied and the buffer is kept, so it can be queried
+            - Use 'absent' to delete the buffer, the staged writes are discarded
+        required: false
+        default: 'present'
+        choices: ['present', 'query', 'committed', 'absent']
+
+    username:
+        description:
+            - Username used to authenticate with the PSM
+        required: false
+        default: 'admin'
+
+    password:
+        description:
+            - Password used to authenticate with the PSM
+            - Not required when using the httpapi connection plugin
+        required: false
+
+    hostname:
+        description:
+            - Hostname (or IP address) of the Pensando Policy and Service Manager (PSM)
+            - Omit when using the httpapi connection plugin 'joelwking.pensando.pensando', the play then
+            - reuses one authenticated session for all tasks
+        required: false
+
+    api_version:
+        description:
+            - Optionally specify the API version
+        required: false
+        default: 'v1'
+
+    rate_limit_retry:
+        description:
+            - Number of attempts to issue a request which returns a 429, a server error or a connection error
+            - Server and connection errors are only retried for GET, PUT and DELETE, a POST is only retried after a 429
+        required: false
+        default: 4
+
+    requests_per_second:
+        description:
+            - Initial rate of requests sent to the PSM, the rate is reduced when the PSM returns a 429 and increased
+            - after successful requests. By default, requests are not paced until the PSM returns a 429, pacing then
+            - starts at 25 requests per second. Specify 0 to disable pacing, requests are then only delayed after a 429
+        required: false
+
+    pool_maxsize:
+        description:
+            - Maximum number of keep-alive connections to the PSM saved in the connection pool
+        required: false
+        default: 10
+
+    connect_timeout:
+        description:
+            - Seconds to wait when establishing a connection to the PSM
+        required: false
+        default: 10
+
+    read_timeout:
+        description:
+            - Seconds to wait for the PSM to send a response
+        required: false
+        default: 60
+
+    trace_file:
+        description:
+            - Path of a file to which each request issued to the PSM is appended as a JSON line, with the
+            - verb, path, status, elapsed seconds, bytes sent and received, retries and seconds spent waiting
+        required: false
+
+    cache_dir:
+        description:
+            - Directory in which the objects read from the PSM are saved with their resource-version. Subsequent
+            - runs send the version in If-None-Match and reuse the saved object when it has not changed
+            - Without cache_dir, objects are only cached while the task runs
+        required: false
+
+    gzip_threshold:
+        description:
+            - Request bodies of at least this many bytes are sent gzip encoded (Content-Encoding gzip), e.g. 65536
+            - If the PSM rejects the encoding, the request is sent again uncompressed. The default, 0, disables compression
+        required: false
+        default: 0
+
+    transport:
+        description:
+            - Use 'http' to send requests with the Python standard library, or 'requests' to use the Requests library,
+            - e.g. to use the proxies configured in the environment. The default, 'http', does not import Requests
+        required: false
+        default: 'http'
+        choices: ['http', 'requests']
+
+
+author:
+    - Joel W. King (@joelwking)
+'''
+
+RETURN = '''
+buffer:
+    description:
+        - The staging buffer, or with state 'committed', the result of the commit
+    returned: always
+    type: dict
+
+rate_limit:
+    description:
+        - Statistics of the requests issued, the number of requests, retries, 429 responses (throttled), server
+        - and connection errors, seconds spent waiting (sleep_time) and the request rate when the module completed
+    returned: always
+    type: dict
+
+metrics:
+    description:
+        - Requests issued to the PSM aggregated by verb and path, the count, status codes, elapsed seconds (total,
+        - mean and max), bytes sent and received, retries and seconds spent waiting. Also the totals, and the seconds
+        - spent locally in each phase, 'encode' (JSON encoding of payloads) and 'rules' (rule processing)
+    returned: always
+    type: dict
+'''
+
+EXAMPLES = '''
+
+  tasks:
+    - name: Create a staging buffer for the rollout
+      staging_buffer:
+        hostname: psm.example.net
+        username: admin
+        password: '{{ password }}'
+        buffer_name: rollout
+
+    - name: Stage the apps
+      app:
+        hostname: psm.example.net
+        username: admin
+        password: '{{ password }}'
+        buffer: rollout
+        apps: '{{ adm_apps }}'
+
+    - name: Stage the policy
+      network_security_policy:
+        hostname: psm.example.net
+        username: admin
+        password: '{{ password }}'
+        buffer: rollout
+        policy_name: '{{ policy_name }}'
+        rules: '{{ pseudo_acl }}'
+
+    - name: Apply the apps and the policy in one commit
+      staging_buffer:
+        hostname: psm.example.net
+        username: admin
+        password: '{{ password }}'
+        buffer_name: rollout
+        state: committed
+
+'''
+#
+#  Ansible core import
+#
+from ansible.module_utils.basic import AnsibleModule
+#
+# Collection import
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
+
+
+def main():
+    """
+        Main logic
+    """
+    argument_spec = Pensando.pensando_argument_spec()
+    argument_spec.update(dict(
+            state=dict(required=False, default='present', choices=['present', 'query', 'committed', 'absent']),
+            buffer_name=dict(required=True)
+            ))
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        add_file_common_args=True,
+        supports_check_mode=False
+        )
+
+    psm = Pensando.pensando_client(module)
+    name = module.params.get('buffer_name')
+    tenant = module.params.get('tenant')
+
+    if module.params.get('state') == 'present':
+        buffer = psm.create_buffer(name, tenant=tenant)
+        if buffer.ok or buffer.status_code == Transport.codes.CONFLICT:
+            module.exit_json(changed=psm.changed, buffer=buffer.json(), **psm.results())
+
+    elif module.params.get('state') == 'query':
+        buffer = psm.query_buffer(name, tenant=tenant)
+        if buffer.ok:
+            module.exit_json(changed=False, buffer=buffer.json(), **psm.results())
+
+    elif module.params.get('state') == 'committed':
+        buffer = psm.commit_buffer(name, tenant=tenant)
+        if buffer.ok:
+            psm.delete_buffer(name, tenant=tenant)
+            module.exit_json(changed=True, buffer=buffer.json(), **psm.results())
+
+    elif module.params.get('state') == 'absent':
+        buffer = psm.delete_buffer(name, tenant=tenant)
+        if buffer.ok or buffer.status_code == Transport.codes.NOT_FOUND:
+            module.exit_json(changed=psm.changed, buffer=buffer.json(), **psm.results())
+
+    else:
+        module.fail_json(msg='Unknown state specified, must be "present", "query", "committed" or "absent"')
+
+    module.fail_json(msg='{}:{}'.format(buffer.status_code, buffer.text), **psm.results())
+
+
+if __name__ == '__main__':
+    main()
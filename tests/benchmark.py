@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Load benchmark of the Pensando class against the local PSM stand-in (tests/mock_psm.py), reports the
+#     throughput and latency of manage_policy (create, then append to the existing policy), manage_app,
+#     remove_dups and a rollout of apps and a policy staged in a buffer and committed once, for each size.
+#     The startup of a module is measured for each transport: a new Python process imports the Pensando class,
+#     logs in and issues the first query, as each Ansible task does.
+#     No PSM or Ansible controller is needed, the collection must be installed below an 'ansible_collections'
+#     directory, e.g. ansible_collections/joelwking/pensando/tests/benchmark.py,
+#     or PYTHONPATH set to the directory containing 'ansible_collections'
+#
+#     usage: ./benchmark.py --sizes 100 1000 10000 100000 --apps 200 --latency 0.002 --throttle 0.01
+#
+import os
+import sys
+import time
+import json
+import random
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COLLECTIONS = os.path.abspath(os.path.join(HERE, '..', '..', '..', '..'))            # directory containing ansible_collections
+sys.path.insert(0, HERE)
+sys.path.insert(0, COLLECTIONS)
+
+from mock_psm import MockPSM
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+
+PROTOCOLS = ('tcp', 'udp')
+
+STARTUP = '''
+import sys, time, json
+start = time.time()
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+imported = time.time()
+psm = Pensando.Pensando(scheme='http', hostname=sys.argv[1], username='admin', password=sys.argv[2], api_version='v1', transport=sys.argv[3])
+assert psm.login().ok
+assert psm.rate_limit('GET', '/configs/security/{}/apps').ok
+print(json.dumps(dict(imported=imported - start, first_request=time.time() - imported, requests='requests' in sys.modules)))
+'''
+
+
+def proto_ports(count):
+    """
+        Return a list of protocol, port pairs with duplicate and overlapping entries, as exported by Tetration
+    """
+    items = []
+    for _ in range(count):
+        port = random.randint(1, 65000)
+        if random.random() < 0.2:
+            items.append(dict(protocol=random.choice(PROTOCOLS), ports='{}-{}'.format(port, port + random.randint(1, 50))))
+        else:
+            items.append(dict(protocol=random.choice(PROTOCOLS), ports=str(port)))
+    return items
+
+
+def rules(count):
+    """
+        Return a list of rules between random /32 hosts
+    """
+    items = []
+    for _ in range(count):
+        items.append({'action': 'permit',
+                      'from-ip-addresses': ['10.{}.{}.{}/32'.format(*[random.randint(0, 255) for _ in range(3)])],
+                      'to-ip-addresses': ['192.168.{}.{}/32'.format(random.randint(0, 255), random.randint(0, 255))],
+                      'proto-ports': proto_ports(random.randint(1, 3))})
+    return items
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100.0))] if values else 0.0
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+def report(name, size, elapsed, items=None):
+    items = size if items is None else items
+    print('{:<28} {:>8} {:>10.3f} {:>12.1f}'.format(name, size, elapsed, items / elapsed if elapsed else 0.0))
+
+
+def bench_policy(psm, size, params):
+    """
+        Create a policy of 'size' rules, then append 'size' rules to the existing policy (GET, merge, PUT)
+    """
+    params = dict(params, policy_name='benchmark_{}'.format(size), rules=rules(size), operation='replace')
+    response, elapsed = timed(psm.manage_policy, params)
+    assert response.ok, '{}:{}'.format(response.status_code, response.text[:200])
+    report('manage_policy create', size, elapsed)
+
+    params.update(rules=rules(size), operation='append')
+    response, elapsed = timed(psm.manage_policy, params)
+    assert response.ok, '{}:{}'.format(response.status_code, response.text[:200])
+    report('manage_policy append', size, elapsed)
+
+    response = psm.rate_limit('DELETE', '/configs/security/{}/networksecuritypolicies/{}'.format('{}', params['policy_name']))
+    assert response.ok
+
+
+def bench_apps(psm, count, size, params):
+    """
+        Create 'count' apps, each with 'size' protocol, port pairs, then report the latency percentiles
+    """
+    latency = []
+    start = time.time()
+    for index in range(count):
+        response, elapsed = timed(psm.manage_app, dict(params, app_name='benchmark_{}_{}'.format(size, index), proto_ports=proto_ports(size)))
+        assert response.ok, '{}:{}'.format(response.status_code, response.text[:200])
+        latency.append(elapsed)
+    report('manage_app ({} apps)'.format(count), size, time.time() - start, items=count)
+    print('{:<28} p50={:.4f} p95={:.4f} p99={:.4f}'.format('', percentile(latency, 50), percentile(latency, 95), percentile(latency, 99)))
+    for index in range(count):
+        psm.rate_limit('DELETE', '/configs/security/{}/apps/{}'.format('{}', 'benchmark_{}_{}'.format(size, index)))
+
+
+def bench_staged(psm, count, size, params):
+    """
+        Stage 'count' apps and a policy of 'size' rules referencing them in a staging buffer, then commit once
+    """
+    start = time.time()
+    assert psm.create_buffer('benchmark').ok
+    psm.buffer = 'benchmark'
+    names = ['staged_{}_{}'.format(size, index) for index in range(count)]
+    for name in names:
+        response = psm.manage_app(dict(params, app_name=name, proto_ports=proto_ports(3)))
+        assert response.ok, '{}:{}'.format(response.status_code, response.text[:200])
+    policy = dict(params, policy_name='staged_{}'.format(size), rules=rules(size), operation='replace')
+    response = psm.manage_policy(policy)
+    assert response.ok, '{}:{}'.format(response.status_code, response.text[:200])
+    psm.buffer = None
+    response = psm.commit_buffer('benchmark')
+    assert response.ok, '{}:{}'.format(response.status_code, response.text[:200])
+    report('staged apps+policy commit', size, time.time() - start, items=count + size)
+
+    psm.buffer = 'benchmark'
+    psm.rate_limit('DELETE', '/configs/security/{}/networksecuritypolicies/{}'.format('{}', policy['policy_name']))
+    for name in names:
+        psm.rate_limit('DELETE', '/configs/security/{}/apps/{}'.format('{}', name))
+    psm.buffer = None
+    assert psm.commit_buffer('benchmark').ok
+    assert psm.delete_buffer('benchmark').ok
+
+
+def bench_startup(mock, transport, runs):
+    """
+        Start runs Python processes, each imports the Pensando class, logs in and queries the apps with the transport.
+        Report the median time of the process, the import and the login and first query.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([COLLECTIONS] + [path for path in [os.environ.get('PYTHONPATH')] if path]))
+    results = []
+    for _ in range(runs):
+        start = time.time()
+        output = subprocess.check_output([sys.executable, '-c', STARTUP, mock.hostname, mock.password, transport], env=env)
+        results.append(dict(json.loads(output.decode('utf-8')), process=time.time() - start))
+
+    print('{:<28} {:>8} {:>10.3f} {:>12.3f} {:>12.3f} {:>10}'.format(
+          'startup ' + transport, runs, percentile([item['process'] for item in results], 50),
+          percentile([item['imported'] for item in results], 50), percentile([item['first_request'] for item in results], 50),
+          'yes' if any(item['requests'] for item in results) else 'no'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Pensando class against a local PSM stand-in')
+    parser.add_argument('--sizes', default=[100, 1000, 10000, 100000], type=int, nargs='+', help='number of rules / protocol, port pairs')
+    parser.add_argument('--apps', default=100, type=int, help='number of apps created for each size')
+    parser.add_argument('--latency', default=0.0, type=float, help='seconds the PSM stand-in delays each request')
+    parser.add_argument('--throttle', default=0.0, type=float, help='fraction of requests which return 429')
+    parser.add_argument('--requests-per-second', default=None, type=float,
+                        help='client rate limit, by default requests are paced after the first 429, 0 disables pacing')
+    parser.add_argument('--startup-runs', default=10, type=int, help='processes started to measure the startup, 0 to skip')
+    parser.add_argument('--seed', default=1, type=int)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    mock = MockPSM(latency=args.latency, throttle=args.throttle, retry_after='0').start()
+    params = dict((key, value.get('default')) for key, value in Pensando.pensando_argument_spec().items())
+    params.update(hostname=mock.hostname, password=mock.password, requests_per_second=args.requests_per_second, attach_tenant=True)
+    psm = Pensando.Pensando(scheme='http', **Pensando.pensando_kwargs(params))
+    response = psm.login()
+    assert response.ok, '{}:{}'.format(response.status_code, response.text)
+
+    if args.startup_runs:
+        print('{:<28} {:>8} {:>10} {:>12} {:>12} {:>10}'.format('operation', 'runs', 'process', 'import', 'first call', 'requests'))
+        for transport in ('http', 'requests'):
+            bench_startup(mock, transport, args.startup_runs)
+        print('')
+
+    print('{:<28} {:>8} {:>10} {:>12}'.format('operation', 'size', 'seconds', 'items/s'))
+    for size in args.sizes:
+        pairs = proto_ports(size)
+        _, elapsed = timed(psm.remove_dups, pairs)
+        report('remove_dups', size, elapsed)
+        bench_policy(psm, size, params)
+        bench_apps(psm, args.apps, min(size, 1000), params)
+        bench_staged(psm, args.apps, size, params)
+
+    print(psm.results())
+    print('PSM stand-in requests: {}'.format(dict(mock.stats)))
+    psm.close()
+    mock.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Local stand-in for the Pensando Policy and Service Manager (PSM) API, implements the endpoints used by
+#     the Pensando class: login, networksecuritypolicies, apps, staging buffers and watch. Used by tests/benchmark.py, or run standalone
+#     and point the Pensando class (scheme='http') at it.
+#
+#     usage: ./mock_psm.py --port 8080 --latency 0.005 --throttle 0.05 --retry-after 1
+#
+import sys
+import copy
+import json
+import gzip
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import Counter
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+except ImportError:                                    # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+KINDS = {'networksecuritypolicies': 'NetworkSecurityPolicy', 'apps': 'App'}
+
+
+def status(code, message):
+    """
+        Return the body of an error response
+    """
+    return dict(kind='Status', code=code, message=[message], result=dict(Str=message))
+
+
+def selected(values, selector):
+    """
+        Return True if the values (a function of the key) match each term of the selector, e.g. 'env=prod,zone!=dmz'
+    """
+    for term in (selector or '').split(','):
+        if '!=' in term:
+            key, value = term.split('!=', 1)
+            if values(key.strip()) == value.strip():
+                return False
+        elif '=' in term:
+            key, value = term.split('=', 1)
+            if values(key.strip()) != value.strip():
+                return False
+    return True
+
+
+def field(item, path):
+    for key in path.split('.'):
+        item = item.get(key) if isinstance(item, dict) else None
+    return None if item is None else str(item)
+
+
+class Server(ThreadingHTTPServer):
+    """
+        A client which closes a keep-alive connection (e.g. a watch which is stopped) is not an error
+    """
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (IOError, OSError)):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+
+class MockPSM(object):
+    """
+        In memory PSM. The behaviour of the PSM which the modules rely on is reproduced:
+          - POST of an existing object returns 409 "already exists in cache"
+          - POST of a second policy returns 412 "exceeds max allowed polices 1"
+          - POST of an App without 'alg' or 'proto-ports' returns 400
+          - requests without a valid 'sid' cookie return 401
+          - GET of an object returns an ETag, the resource-version, and 304 when it matches If-None-Match
+          - PUT of an object with a stale meta.resource-version returns 409
+          - request bodies may be gzip encoded (Content-Encoding gzip), unless 'gzip' is False, they then return 415
+          - GET of a collection supports 'label-selector', 'field-selector', 'max-results' and 'from' (1 based)
+          - writes to /staging/<buffer>/configs/... are staged in the buffer, a commit applies them all or none
+          - GET /configs/security/<version>/watch/<kind>?resource-version=N streams the events after N, one JSON
+            object per line, until the client disconnects. Only the last max_events events are retained, a
+            watch from an older version returns 410
+        Optionally each request is delayed by 'latency' seconds, and a fraction ('throttle') of the
+        authenticated requests return 429 with a Retry-After header.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, throttle=0.0, retry_after='1', max_policies=1,
+                 username='admin', password='Pensando0$', max_events=1000, gzip=True):
+        self.latency = latency
+        self.gzip = gzip
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.max_policies = max_policies
+        self.max_events = max_events
+        self.username = username
+        self.password = password
+        #
+        self.objects = dict((kind, {}) for kind in KINDS)
+        self.buffers = {}                              # name -> list of staged (verb, kind, name, body)
+        self.sessions = set()
+        self.resource_version = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)  # notified when an event is added
+        self.events = []                               # (resource-version, kind, type, object), oldest first
+        self.compacted = 0                             # resource-version of the last event discarded
+        self.stopping = False
+        self.stats = Counter()
+        self.server = Server((host, port), Handler)
+        self.server.daemon_threads = True
+        self.server.psm = self
+        self.thread = None
+
+    @property
+    def hostname(self):
+        """
+            host:port of the server, used as the hostname of the Pensando class
+        """
+        return '{}:{}'.format(*self.server.server_address[:2])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self.stopping = True
+            self.changed.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_version(self):
+        self.resource_version += 1
+        return str(self.resource_version)
+
+    def store(self, kind, body, existing=None):
+        """
+            Save the object, setting the meta data returned by the PSM
+        """
+        name = body['meta']['name']
+        meta = body['meta']
+        meta.setdefault('tenant', 'default')
+        meta['uuid'] = existing['meta']['uuid'] if existing else str(uuid.uuid4())
+        meta['self-link'] = '/configs/security/v1/tenants/{}/{}/{}'.format(meta.get('tenant') or 'default', kind, name)
+        meta['resource-version'] = self.next_version()
+        meta['mod-time'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        meta['creation-time'] = existing['meta']['creation-time'] if existing else meta['mod-time']
+        body['kind'] = KINDS[kind]
+        self.objects[kind][name] = body
+        return body
+
+    def event(self, kind, kind_of_event, item):
+        """
+            Record an event for the watchers, the resource-version is that of the object (or of the delete)
+        """
+        self.events.append((int(self.resource_version), kind, kind_of_event, item))
+        if len(self.events) > self.max_events:
+            self.compacted = self.events.pop(0)[0]
+        self.changed.notify_all()
+
+    def write(self, verb, kind, name, body):
+        """
+            Apply a POST, PUT or DELETE of an object, return the status and the body of the response
+        """
+        code, result = self.apply(verb, kind, name, body)
+        if code == 200:
+            self.event(kind, dict(POST='Created', PUT='Updated', DELETE='Deleted')[verb], result)
+        return code, result
+
+    def apply(self, verb, kind, name, body):
+        objects = self.objects[kind]
+
+        if verb == 'DELETE':
+            if name not in objects:
+                return 404, status(404, 'object not found')
+            item = objects.pop(name)
+            item['meta'] = dict(item['meta'], **{'resource-version': self.next_version()})
+            return 200, item
+
+        if verb == 'POST':
+            name = body.get('meta', {}).get('name')
+            if name in objects:
+                return 409, status(409, 'already exists in cache')
+            if kind == 'networksecuritypolicies' and len(objects) >= self.max_policies:
+                return 412, status(412, 'exceeds max allowed polices {}'.format(self.max_policies))
+            if kind == 'apps' and not (body.get('spec', {}).get('alg') or body.get('spec', {}).get('proto-ports')):
+                return 400, status(400, "app doesn't have at least one of ProtoPorts and ALG")
+            return 200, self.store(kind, body)
+
+        if verb == 'PUT':
+            if name not in objects:
+                return 404, status(404, 'object not found')
+            version = body.get('meta', {}).get('resource-version')
+            if version and version != objects[name]['meta']['resource-version']:
+                return 409, status(409, 'resource version mismatch')
+            return 200, self.store(kind, body, existing=objects[name])
+
+        return 405, status(405, 'method not allowed')
+
+    def commit(self, name):
+        """
+            Apply the writes staged in the buffer in order, if any write fails none are applied
+        """
+        saved = copy.deepcopy(self.objects), self.resource_version, list(self.events), self.compacted
+        for verb, kind, key, body in self.buffers[name]:
+            code, result = self.write(verb, kind, key, copy.deepcopy(body))
+            if code != 200:
+                self.objects, self.resource_version, self.events, self.compacted = saved
+                return dict(kind='CommitAction', meta=dict(name=name), status=dict(status='FAILED', reason=result['message']))
+        self.buffers[name] = []
+        return dict(kind='CommitAction', meta=dict(name=name), status=dict(status='SUCCESS'))
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+        Request handler, the state is in the MockPSM object self.server.psm
+    """
+    protocol_version = 'HTTP/1.1'                      # keep-alive
+    disable_nagle_algorithm = True                     # headers and body are written separately
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def error(self, code, message):
+        self.reply(code, status(code, message))
+
+    def body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        if data and self.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data.decode('utf-8')) if data else {}
+
+    def route(self, path=None):
+        """
+            Return (kind, name) for /configs/security/<version>/[tenant(s)/<tenant>/]<kind>[/<name>]
+        """
+        parts = (path or self.path).split('?')[0].strip('/').split('/')
+        if len(parts) < 4 or parts[:2] != ['configs', 'security']:
+            return None, None
+        parts = parts[3:]
+        if parts[0] in ('tenant', 'tenants'):
+            parts = parts[2:]
+        if not parts or parts[0] not in KINDS:
+            return None, None
+        return parts[0], parts[1] if len(parts) > 1 else None
+
+    def handle_request(self, verb):
+        psm = self.server.psm
+        body = self.body()
+        if psm.latency:
+            time.sleep(psm.latency)
+
+        with psm.lock:
+            psm.stats[verb] += 1
+            if verb == 'POST' and self.path.rstrip('/').endswith('/login'):
+                if body.get('username') != psm.username or body.get('password') != psm.password:
+                    return self.error(401, 'authentication failed')
+                sid = uuid.uuid4().hex
+                psm.sessions.add(sid)
+                return self.reply(200, dict(kind='User', meta=dict(name=psm.username)), headers={'Set-Cookie': 'sid={}; Path=/; HttpOnly'.format(sid)})
+
+            cookie = self.headers.get('Cookie') or ''
+            sid = dict(item.strip().split('=', 1) for item in cookie.split(';') if '=' in item).get('sid')
+            if sid not in psm.sessions:
+                return self.error(401, 'unauthorized')
+
+            if self.headers.get('Content-Encoding') == 'gzip' and not psm.gzip:
+                return self.error(415, 'unsupported content encoding')
+
+            if psm.throttle and random.random() < psm.throttle:
+                psm.stats['throttled'] += 1
+                return self.reply(429, dict(kind='Status', code=429), headers={'Retry-After': psm.retry_after})
+
+            parts = self.path.split('?')[0].strip('/').split('/')
+            if parts[:2] == ['configs', 'staging']:
+                return self.handle_buffer(verb, parts[6:], body)
+            if parts[0] == 'staging' and len(parts) > 2:
+                return self.handle_staged(verb, parts[1], '/' + '/'.join(parts[2:]), body)
+
+            if parts[:2] == ['configs', 'security'] and len(parts) == 5 and parts[3] == 'watch' and parts[4] in KINDS:
+                return self.handle_watch(parts[4])
+
+            kind, name = self.route()
+            if kind is None:
+                return self.error(404, 'not found')
+            objects = psm.objects[kind]
+
+            if verb == 'GET' and name is None:
+                options = dict((key, values[0]) for key, values in parse_qs(self.path.partition('?')[2]).items())
+                items = [objects[key] for key in sorted(objects)]
+                items = [item for item in items if selected(lambda label: (item['meta'].get('labels') or {}).get(label), options.get('label-selector'))]
+                items = [item for item in items if selected(lambda path: field(item, path), options.get('field-selector'))]
+                start = int(options.get('from', 1)) - 1
+                items = items[start:start + int(options['max-results'])] if 'max-results' in options else items[start:]
+                return self.reply(200, dict(kind='{}List'.format(KINDS[kind]), items=items,
+                                            **{'list-meta': {'resource-version': str(psm.resource_version)}}))
+            if verb == 'GET':
+                if name not in objects:
+                    return self.error(404, 'object not found')
+                version = objects[name]['meta']['resource-version']
+                if self.headers.get('If-None-Match') == version:
+                    return self.reply(304, None, headers={'ETag': version})
+                return self.reply(200, objects[name], headers={'ETag': version})
+
+            code, result = psm.write(verb, kind, name, body)
+            return self.reply(code, result)
+
+    def handle_watch(self, kind):
+        """
+            Stream the events of the kind after 'resource-version', or without a version, the current objects as
+            'Created' followed by the new events. Called holding psm.lock, which is released while waiting.
+        """
+        psm = self.server.psm
+        options = dict((key, values[0]) for key, values in parse_qs(self.path.partition('?')[2]).items())
+        version = options.get('resource-version')
+        if version is not None and int(version) < psm.compacted:
+            return self.error(410, 'resource version too old')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        if version is None:
+            pending = [dict(type='Created', object=item) for item in psm.objects[kind].values()]
+            version = psm.resource_version
+        else:
+            pending = []
+        version = int(version)
+
+        try:
+            while not psm.stopping:
+                pending.extend(dict(type=kind_of_event, object=item) for number, name, kind_of_event, item in psm.events
+                               if number > version and name == kind)
+                version = int(psm.resource_version)
+                if pending:
+                    line = json.dumps(dict(result=dict(events=pending))).encode('utf-8') + b'\n'
+                    self.wfile.write('{:x}\r\n'.format(len(line)).encode('ascii') + line + b'\r\n')  # one chunk for each line
+                    self.wfile.flush()
+                    pending = []
+                psm.changed.wait(0.5)
+            self.wfile.write(b'0\r\n\r\n')
+        except (IOError, OSError):                        # the client disconnected
+            pass
+
+    def handle_buffer(self, verb, parts, body):
+        """
+            /configs/staging/<version>/tenant/<tenant>/buffers[/<name>[/commit|/clear]], parts follow 'buffers'
+        """
+        psm = self.server.psm
+        name = parts[0] if parts else body.get('meta', {}).get('name')
+        action = parts[1] if len(parts) > 1 else None
+
+        if verb == 'POST' and not parts:
+            if name in psm.buffers:
+                return self.error(409, 'already exists in cache')
+            psm.buffers[name] = []
+            return self.reply(200, dict(kind='Buffer', meta=dict(name=name), spec={}, status=dict(items=[])))
+        if name not in psm.buffers:
+            return self.error(404, 'object not found')
+        if verb == 'GET' and action is None:
+            items = [dict(method=verb, uri=kind, name=key) for verb, kind, key, body in psm.buffers[name]]
+            return self.reply(200, dict(kind='Buffer', meta=dict(name=name), spec={}, status=dict(items=items)))
+        if verb == 'DELETE' and action is None:
+            psm.buffers.pop(name)
+            return self.reply(200, dict(kind='Buffer', meta=dict(name=name)))
+        if verb == 'POST' and action == 'commit':
+            return self.reply(200, psm.commit(name))
+        if verb == 'POST' and action == 'clear':
+            psm.buffers[name] = []
+            return self.reply(200, dict(kind='ClearAction', meta=dict(name=name)))
+        return self.error(405, 'method not allowed')
+
+    def handle_staged(self, verb, buffer, path, body):
+        """
+            Stage a write of an object in the buffer, the object is returned as it would be written
+        """
+        psm = self.server.psm
+        kind, name = self.route(path)
+        if kind is None or buffer not in psm.buffers:
+            return self.error(404, 'not found')
+        if verb not in ('POST', 'PUT', 'DELETE'):
+            return self.error(405, 'method not allowed')
+        psm.buffers[buffer].append((verb, kind, name, body))
+        return self.reply(200, body)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Pensando PSM API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', default=8080, type=int)
+    parser.add_argument('--latency', default=0.0, type=float, help='seconds to delay each request')
+    parser.add_argument('--throttle', default=0.0, type=float, help='fraction of requests which return 429')
+    parser.add_argument('--retry-after', default='1', help='value of the Retry-After header of a 429, seconds or an HTTP-date')
+    args = parser.parse_args()
+
+    psm = MockPSM(host=args.host, port=args.port, latency=args.latency, throttle=args.throttle, retry_after=args.retry_after)
+    print('Mock PSM listening on http://{}'.format(psm.hostname))
+    try:
+        psm.server.serve_forever()
+    except KeyboardInterrupt:
+        psm.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     Fixtures shared by the unit tests, the HTTP level tests run the Pensando class against tests/mock_psm.py
+#
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mock_psm import MockPSM
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+import ansible_collections.joelwking.pensando.plugins.module_utils.ratelimit as Ratelimit
+
+
+@pytest.fixture
+def psm():
+    """
+        A MockPSM listening on a free port of localhost
+    """
+    server = MockPSM().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(psm):
+    """
+        Return a function which creates a Pensando object logged in to the MockPSM, keyword arguments are passed to Pensando
+    """
+    clients = []
+
+    def create(**kwargs):
+        kwargs.setdefault('limiter', Ratelimit.RateLimiter(backoff_base=0.0))
+        pensando = Pensando.Pensando(scheme='http', hostname=psm.hostname, username=psm.username, password=psm.password,
+                                     api_version='v1', **kwargs)
+        assert pensando.login().ok
+        clients.append(pensando)
+        return pensando
+
+    yield create
+    for pensando in clients:
+        pensando.close()
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import json
+
+from ansible.parsing.dataloader import DataLoader
+
+from ansible_collections.joelwking.pensando.plugins.lookup.adm import LookupModule
+
+
+def export(tmp_path, policy):
+    path = tmp_path / 'adm.json'
+    path.write_text(json.dumps({'adm': {'policy': policy, 'raw': {'default_policies': []}}}))
+    return str(path)
+
+
+def test_single_protocol_is_a_list(tmp_path):
+    """
+        Compaction leaves one entry, the lookup still returns a list, query() passes it to the playbook unchanged
+    """
+    path = export(tmp_path, [{'proto': 'tcp', 'ports': {'from': port, 'to': port}, 'confidence': 1.0, 'action': 'ALLOW'} for port in (443, 80)])
+    result = LookupModule(loader=DataLoader()).run([path], variables={}, section='proto_ports')
+    assert result == [{'protocol': 'tcp', 'ports': '80,443'}]
+
+
+def test_confidence(tmp_path):
+    path = export(tmp_path, [{'proto': 'tcp', 'ports': {'from': 80, 'to': 80}, 'confidence': 0.5, 'action': 'ALLOW'},
+                             {'proto': 'udp', 'ports': {'from': 53, 'to': 53}, 'confidence': 0.95, 'action': 'ALLOW'}])
+    assert LookupModule(loader=DataLoader()).run([path], variables={}, section='proto_ports', confidence=0.9) == [{'protocol': 'udp', 'ports': '53'}]
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+
+def rule(source, destination=('any',)):
+    return {'action': 'permit', 'from-ip-addresses': list(source), 'to-ip-addresses': list(destination),
+            'proto-ports': [{'protocol': 'tcp', 'ports': '443'}]}
+
+
+def test_hosts_collapse_to_prefix():
+    assert Rules.aggregate_addresses(['192.0.2.{}/32'.format(host) for host in range(256)]) == ['192.0.2.0/24']
+
+
+def test_adjacent_and_covered():
+    assert Rules.aggregate_addresses(['10.0.1.0/24', '10.0.0.0/24', '10.0.0.5', '10.0.2.0/23']) == ['10.0.0.0/22']
+
+
+def test_ipv4_and_ipv6_collapsed_separately():
+    assert Rules.aggregate_addresses(['2001:db8::/33', '10.0.0.0/9', '2001:db8:8000::/33', '10.128.0.0/9']) == ['10.0.0.0/8', '2001:db8::/32']
+
+
+def test_other_values_unchanged():
+    """
+        Ranges, prefixes with host bits set and names are returned once, after the prefixes
+    """
+    addresses = ['any', '10.0.0.1-10.0.0.9', '10.0.0.1/24', '192.0.2.0/24', 'any']
+    assert Rules.aggregate_addresses(addresses) == ['192.0.2.0/24', 'any', '10.0.0.1-10.0.0.9', '10.0.0.1/24']
+
+
+def test_identical_rules_dropped():
+    rules = [rule(['192.0.2.0/25', '192.0.2.128/25']), rule(['192.0.2.0/24']), rule(['198.51.100.7'], ['192.0.2.1', '192.0.2.0'])]
+    result, stats = Rules.aggregate_rules(rules)
+    assert result == [rule(['192.0.2.0/24']), rule(['198.51.100.7/32'], ['192.0.2.0/31'])]
+    assert stats['rules_before'] == 3 and stats['rules_after'] == 2
+    assert stats['addresses_before'] == 8 and stats['addresses_after'] == 4
+    assert stats['bytes_after'] < stats['bytes_before']
+    assert rules[0]['from-ip-addresses'] == ['192.0.2.0/25', '192.0.2.128/25']
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', policy_name='default', attach_tenant=True, operation='append')
+PATH = '/configs/security/v1/networksecuritypolicies/default'
+
+
+def rule(port):
+    return {'action': 'permit', 'from-ip-addresses': ['10.0.{}.0/24'.format(port)], 'to-ip-addresses': ['any'],
+            'proto-ports': [{'protocol': 'tcp', 'ports': str(port)}]}
+
+
+def ports(psm):
+    return [item['proto-ports'][0]['ports'] for item in psm.objects['networksecuritypolicies']['default']['spec']['rules']]
+
+
+def concurrent_update(psm, monkeypatch, times):
+    """
+        Before each of the first 'times' PUTs of the client, another client updates the policy
+    """
+    apply = psm.apply
+    updates = []
+
+    def update(verb, kind, name, body):
+        if verb == 'PUT' and len(updates) < times:
+            other = dict(psm.objects[kind][name], meta=dict(psm.objects[kind][name]['meta']))
+            other['spec'] = dict(other['spec'], rules=other['spec']['rules'] + [rule(1000 + len(updates))])
+            updates.append(apply('PUT', kind, name, other)[0])
+        return apply(verb, kind, name, body)
+
+    monkeypatch.setattr(psm, 'apply', update)
+    return updates
+
+
+def test_not_modified_is_served_from_cache(psm, client):
+    pensando = client()
+    assert pensando.manage_policy(dict(PARAMS, rules=[rule(80)])).ok
+    response = pensando.query_policy(policy_name='default')
+    assert response.status_code == 200 and response.json()['spec']['rules'] == [rule(80)]
+    assert pensando.cache.statistics()['hits'] == 1 and psm.stats['GET'] == 1
+
+
+def test_changed_object_is_read_again(psm, client):
+    pensando = client()
+    assert pensando.manage_policy(dict(PARAMS, rules=[rule(80)])).ok
+    psm.objects['networksecuritypolicies']['default']['meta']['resource-version'] = '99'
+    assert pensando.query_policy(policy_name='default').json()['meta']['resource-version'] == '99'
+    assert pensando.cache.get(PATH)['version'] == '99'
+
+
+def test_put_sends_resource_version(psm, client, monkeypatch):
+    """
+        A PUT of a policy updated by another client after it was read is rejected (409), the policy is read
+        again and the rules re-applied, neither update is lost
+    """
+    pensando = client()
+    assert pensando.manage_policy(dict(PARAMS, rules=[rule(80)])).ok
+    updates = concurrent_update(psm, monkeypatch, 2)
+    response = pensando.manage_policy(dict(PARAMS, rules=[rule(443)]))
+    assert response.ok and updates == [200, 200] and pensando.changed
+    assert ports(psm) == ['80', '1000', '1001', '443']
+
+
+def test_conflict_after_the_last_attempt(psm, client, monkeypatch):
+    """
+        When every attempt conflicts, the 409 is returned rather than the policy read after it
+    """
+    assert client().manage_policy(dict(PARAMS, rules=[rule(80)])).ok
+    pensando = client(rate_limit_retry=3)
+    concurrent_update(psm, monkeypatch, 3)
+    response = pensando.manage_policy(dict(PARAMS, rules=[rule(443)]))
+    assert response.status_code == 409 and not pensando.changed
+    assert '443' not in ports(psm)
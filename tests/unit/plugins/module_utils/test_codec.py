@@ -0,0 +1,60 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import gzip
+import json
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.codec as Codec
+
+PAYLOAD = {'meta': {'name': u'zürich'}, 'spec': {'rules': [{'action': 'permit', 'proto-ports': [{'protocol': 'tcp', 'ports': '80'}]}] * 50}}
+APP = dict(api_version='v1', tenant='default', namespace='default', app_name='WEB', proto_ports=[dict(protocol='tcp', ports='80')])
+
+
+def test_dumps_is_compact():
+    data = Codec.dumps(PAYLOAD)
+    assert isinstance(data, bytes) and b': ' not in data and b', ' not in data
+    assert Codec.loads(data) == PAYLOAD and Codec.loads(data.decode('utf-8')) == PAYLOAD
+
+
+def test_compress_threshold():
+    data = Codec.dumps(PAYLOAD)
+    assert Codec.compress(data, 0) is None and Codec.compress(data, len(data) + 1) is None
+    compressed = Codec.compress(data, len(data))
+    assert len(compressed) < len(data) and gzip.decompress(compressed) == data
+
+
+def test_response_parsed_once(monkeypatch):
+    response = Codec.Response(200, {}, content=json.dumps(PAYLOAD).encode('utf-8'))
+    calls = []
+    loads = Codec.loads
+    monkeypatch.setattr(Codec, 'loads', lambda data: calls.append(data) or loads(data))
+    assert response.json() is response.json() and len(calls) == 1
+    assert response.text == json.dumps(PAYLOAD) and response.ok
+
+
+def test_gzip_body(psm, client):
+    pensando = client(gzip_threshold=1)
+    assert pensando.manage_app(APP).ok
+    assert pensando.gzip_threshold == 1 and psm.objects['apps']['WEB']['spec']['proto-ports'] == APP['proto_ports']
+
+
+def test_gzip_rejected(psm, client):
+    """
+        The PSM rejects the encoding (415), the body is sent again uncompressed and compression is disabled
+    """
+    psm.gzip = False
+    pensando = client(gzip_threshold=1)
+    assert pensando.manage_app(APP).ok and 'WEB' in psm.objects['apps']
+    assert pensando.gzip_threshold is None and psm.stats['POST'] == 3                # login, the 415 and the POST
+    assert pensando.manage_app(dict(APP, app_name='DNS')).ok and psm.stats['POST'] == 4
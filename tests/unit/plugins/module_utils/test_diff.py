@@ -0,0 +1,66 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', policy_name='default', attach_tenant=True, operation='replace')
+
+
+def rule(port, action='permit'):
+    return {'action': action, 'from-ip-addresses': ['10.0.0.0/8', '192.0.2.0/24'], 'to-ip-addresses': ['any'],
+            'proto-ports': [{'protocol': 'tcp', 'ports': str(port)}, {'protocol': 'icmp'}]}
+
+
+def test_equivalent_rules_are_unchanged():
+    """
+        The order of addresses and proto-ports within a rule, and an empty ports value, are not significant
+    """
+    proposed = dict(rule(80), **{'from-ip-addresses': ['192.0.2.0/24', '10.0.0.0/8'],
+                                 'proto-ports': [{'protocol': 'icmp', 'ports': ''}, {'protocol': 'tcp', 'ports': '80'}]})
+    assert Rules.diff_rules([rule(80)], [proposed]) == dict(added=[], removed=[], reordered=False, changed=False)
+
+
+def test_added_and_removed():
+    diff = Rules.diff_rules([rule(22), rule(80)], [rule(80), rule(443)])
+    assert diff['added'] == [dict(index=1, rule=rule(443))] and diff['removed'] == [dict(index=0, rule=rule(22))]
+    assert not diff['reordered'] and diff['changed']
+
+
+def test_reordered():
+    diff = Rules.diff_rules([rule(22), rule(80)], [rule(80), rule(22)])
+    assert diff == dict(added=[], removed=[], reordered=True, changed=True)
+
+
+def test_duplicates_are_counted():
+    diff = Rules.diff_rules([rule(22)], [rule(22), rule(22)])
+    assert diff['added'] == [dict(index=1, rule=rule(22))]
+
+
+def test_unchanged_policy_is_not_put(psm, client):
+    pensando = client()
+    assert pensando.manage_policy(dict(PARAMS, rules=[rule(22), rule(80)])).ok
+    assert pensando.changed and psm.stats['POST'] == 2                     # login and the policy
+
+    pensando = client()
+    response = pensando.manage_policy(dict(PARAMS, rules=[rule(22), rule(80)]))
+    assert response.ok and not pensando.changed and psm.stats['PUT'] == 0
+    assert pensando.diff == dict(added=[], removed=[], reordered=False, changed=False)
+
+
+def test_reordered_policy_is_put(psm, client):
+    assert client().manage_policy(dict(PARAMS, rules=[rule(22), rule(80, action='deny')])).ok
+    pensando = client()
+    assert pensando.manage_policy(dict(PARAMS, rules=[rule(80, action='deny'), rule(22)])).ok
+    assert pensando.changed and pensando.diff['reordered'] and psm.stats['PUT'] == 1
+    assert [item['action'] for item in psm.objects['networksecuritypolicies']['default']['spec']['rules']] == ['deny', 'permit']
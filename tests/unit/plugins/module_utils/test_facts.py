@@ -0,0 +1,63 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import pytest
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.facts as Facts
+
+
+def facts():
+    apps = {'WEB': {'meta': {'name': 'WEB'}, 'spec': {'proto-ports': [dict(protocol='tcp', ports='80,443')]}}}
+    rules = [{'action': 'permit', 'apps': ['WEB']},
+             {'action': 'deny', 'proto-ports': [dict(protocol='tcp', ports='1-1024'), dict(protocol='icmp')]},
+             {'action': 'permit', 'proto-ports': [dict(protocol='udp', ports='53')]},
+             {'action': 'permit', 'proto-ports': [dict(protocol='tcp')]},
+             {'action': 'deny'}]
+    policies = {'P': {'meta': {'name': 'P'}, 'spec': {'rules': rules}}}
+    result = dict(networksecuritypolicies=policies, apps=apps)
+    result['rules_by_app'], result['rules_by_port'], result['port_intervals'] = Facts.index_rules(policies, apps)
+    return result
+
+
+def indexes(rules):
+    return [rule['index'] for rule in rules]
+
+
+def test_port_keys_split_ports():
+    proto_ports = [{'protocol': 'tcp', 'ports': '1,22,80,443,5660,8080'}, {'protocol': 'udp', 'ports': '53,123,137-138,161'}, {'protocol': 'icmp'}]
+    assert Facts.port_keys(proto_ports) == ['tcp/1', 'tcp/22', 'tcp/80', 'tcp/443', 'tcp/5660', 'tcp/8080',
+                                            'udp/53', 'udp/123', 'udp/137-138', 'udp/161', 'icmp']
+
+
+def test_exact_keys():
+    result = facts()
+    assert indexes(result['rules_by_app']['WEB']) == [0]
+    assert indexes(result['rules_by_port']['tcp/443']) == [0]
+    assert indexes(result['rules_by_port']['tcp/1-1024']) == [1]
+    assert 'tcp/23' not in result['rules_by_port']
+
+
+def test_rules_for_port_searches_ranges():
+    result = facts()
+    assert indexes(Facts.rules_for_port(result, 'tcp', 23)) == [1, 3, 4]
+    assert indexes(Facts.rules_for_port(result, 'tcp/443')) == [0, 1, 3, 4]
+    assert indexes(Facts.rules_for_port(result, 'tcp', '1000-1024')) == [1, 3, 4]
+    assert indexes(Facts.rules_for_port(result, 'tcp', '1000-2000')) == [3, 4]
+    assert indexes(Facts.rules_for_port(result, 'udp', 53)) == [2, 4]
+    assert indexes(Facts.rules_for_port(result, 'icmp')) == [1, 4]
+
+
+def test_rules_for_port_one_port():
+    with pytest.raises(ValueError):
+        Facts.rules_for_port(facts(), 'tcp', '80,443')
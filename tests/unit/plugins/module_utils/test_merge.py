@@ -0,0 +1,56 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', policy_name='default', attach_tenant=True, operation='append')
+
+
+def rule(ports, action='permit', source='10.0.0.0/8'):
+    return {'action': action, 'from-ip-addresses': [source], 'to-ip-addresses': ['any'],
+            'proto-ports': [{'protocol': 'tcp', 'ports': port} for port in ports.split()]}
+
+
+def test_duplicates_are_dropped():
+    assert Rules.merge_rules([rule('80')], [rule('80'), rule('80', source='192.0.2.0/24')]) == [rule('80'), rule('80', source='192.0.2.0/24')]
+
+
+def test_proto_ports_are_merged():
+    existing = [rule('80')]
+    assert Rules.merge_rules(existing, [rule('443 80'), rule('8080')]) == [rule('80 443 8080')]
+    assert existing == [rule('80')]
+
+
+def test_not_merged_across_other_action():
+    """
+        Moving the ports before a deny would change which rule matches first
+    """
+    existing = [rule('80'), rule('443', action='deny', source='0.0.0.0/0')]
+    assert Rules.merge_rules(existing, [rule('443')]) == existing + [rule('443')]
+
+
+def test_existing_rules_are_not_merged():
+    assert Rules.merge_rules([rule('80'), rule('443')], []) == [rule('80'), rule('443')]
+
+
+def test_append_twice_is_unchanged(psm, client):
+    """
+        Re-running an append does not grow the policy, the second run skips the PUT
+    """
+    assert client().manage_policy(dict(PARAMS, operation='replace', rules=[rule('22')])).ok
+    assert client().manage_policy(dict(PARAMS, rules=[rule('80'), rule('443', source='192.0.2.0/24')])).ok
+    pensando = client()
+    assert pensando.manage_policy(dict(PARAMS, rules=[rule('80'), rule('443', source='192.0.2.0/24')])).ok
+    assert not pensando.changed and psm.stats['PUT'] == 1
+    assert psm.objects['networksecuritypolicies']['default']['spec']['rules'] == [rule('22 80'), rule('443', source='192.0.2.0/24')]
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import time
+
+import pytest
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.mirror as Mirror
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
+
+
+class ClosedStream(object):
+    """
+        A watch which the PSM closes after the lines
+    """
+    status_code = 200
+    ok = True
+
+    def __init__(self, *lines):
+        self.lines = lines
+
+    def iter_lines(self, chunk_size=None):
+        return iter(self.lines)
+
+    def close(self):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_backoff_after_clean_close(client, tmp_path, monkeypatch):
+    """
+        A watch which is closed without events is opened again after a backoff which increases
+    """
+    psm = client()
+    attempts = []
+    monkeypatch.setattr(psm.limiter, 'backoff', lambda attempt, retry_after=None: attempts.append(attempt) or 0.0)
+    monkeypatch.setattr(psm, 'watch', lambda kind, resource_version=None: ClosedStream(b''))
+    mirror = Mirror.Mirror(psm, str(tmp_path / 'mirror.json'), kinds=('apps',)).start()
+    assert wait_for(lambda: len(attempts) >= 3)
+    mirror.stop(timeout=5)
+    assert attempts[:3] == [0, 1, 2]
+
+
+def test_event_resets_backoff(client, tmp_path, monkeypatch):
+    psm = client()
+    attempts = []
+    event = b'{"result": {"events": [{"type": "Created", "object": {"meta": {"name": "WEB", "resource-version": "7"}}}]}}'
+    monkeypatch.setattr(psm.limiter, 'backoff', lambda attempt, retry_after=None: attempts.append(attempt) or 0.0)
+    monkeypatch.setattr(psm, 'watch', lambda kind, resource_version=None: ClosedStream(event))
+    mirror = Mirror.Mirror(psm, str(tmp_path / 'mirror.json'), kinds=('apps',)).start()
+    assert wait_for(lambda: len(attempts) >= 3)
+    mirror.stop(timeout=5)
+    assert set(attempts) == set([0]) and mirror.get('apps', 'WEB')
+
+
+@pytest.mark.parametrize('line', [b'[1, 2]', b'{"result": 3}'])
+def test_unexpected_watch_result(line):
+    with pytest.raises(Transport.TransportError):
+        Mirror.watch_events(line)
+
+
+def test_parse_error(client, tmp_path, monkeypatch):
+    """
+        A line which is not JSON is retried after a backoff, it does not stop the watch
+    """
+    psm = client()
+    attempts = []
+    monkeypatch.setattr(psm.limiter, 'backoff', lambda attempt, retry_after=None: attempts.append(attempt) or 0.0)
+    monkeypatch.setattr(psm, 'watch', lambda kind, resource_version=None: ClosedStream(b'{"result'))
+    mirror = Mirror.Mirror(psm, str(tmp_path / 'mirror.json'), kinds=('apps',)).start()
+    assert wait_for(lambda: len(attempts) >= 2)
+    mirror.stop(timeout=5)
+    assert all(thread.is_alive() is False for thread in mirror.threads)
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import asyncio
+
+from ansible_collections.joelwking.pensando.plugins.module_utils.pensando_async import AsyncPensando
+
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', policy_name='default', attach_tenant=True, operation='append')
+
+
+def rule(port):
+    return {'action': 'permit', 'from-ip-addresses': ['10.0.{}.0/24'.format(port)], 'to-ip-addresses': ['any'],
+            'proto-ports': [{'protocol': 'tcp', 'ports': str(port)}]}
+
+
+def test_concurrent_manage_policy(psm, client):
+    """
+        Concurrent appends to one policy each keep their own diff, the rules of every call are in the policy
+    """
+    pensando = client(rate_limit_retry=8)                # each of the 4 concurrent calls may conflict with the others
+    assert pensando.manage_policy(dict(PARAMS, operation='replace', rules=[rule(22)])).ok
+    async_psm = AsyncPensando(max_concurrency=4, client=pensando)
+
+    async def main():
+        return await asyncio.gather(*[async_psm.manage_policy(dict(PARAMS, rules=[rule(port)])) for port in range(80, 88)])
+
+    responses = asyncio.run(main())
+    async_psm.close()
+    assert all(response.ok for response in responses) and async_psm.changed
+    rules = psm.objects['networksecuritypolicies']['default']['spec']['rules']
+    assert sorted(int(item['proto-ports'][0]['ports']) for item in rules) == [22] + list(range(80, 88))
+    assert len(async_psm.calls) == 8 and all(call['method'] == 'manage_policy' and call['changed'] for call in async_psm.calls)
+    assert all(len(call['diff']['added']) == 1 for call in async_psm.calls)
+    assert sorted(call['diff']['added'][0]['rule']['proto-ports'][0]['ports'] for call in async_psm.calls) == [str(port) for port in range(80, 88)]
+    assert pensando.diff['added'] == [dict(index=0, rule=rule(22))]                # the calls do not overwrite the Pensando object
+
+
+def test_session_is_shared(psm, client):
+    """
+        A login and a gzip downgrade by one call are seen by the Pensando object and later calls
+    """
+    pensando = client(gzip_threshold=1)
+    async_psm = AsyncPensando(max_concurrency=2, client=pensando)
+    psm.sessions.clear()
+    psm.gzip = False
+
+    async def main():
+        await async_psm.run('login')
+        return await async_psm.manage_app(dict(PARAMS, app_name='WEB', proto_ports=[dict(protocol='tcp', ports='80')]))
+
+    assert asyncio.run(main()).ok
+    async_psm.close()
+    assert pensando.cookie['sid'] in psm.sessions and async_psm.cookie is pensando.cookie
+    assert pensando.gzip_threshold is None and psm.stats['POST'] == 4           # two logins, the gzip POST (415) and the POST
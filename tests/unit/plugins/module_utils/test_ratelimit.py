@@ -0,0 +1,125 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import datetime
+
+import pytest
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.codec as Codec
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+import ansible_collections.joelwking.pensando.plugins.module_utils.ratelimit as Ratelimit
+import ansible_collections.joelwking.pensando.plugins.module_utils.transport as Transport
+
+
+class ScriptedTransport(object):
+    """
+        Return the responses in turn, an exception in the script is raised, the requests are recorded
+    """
+    def __init__(self, *script):
+        self.script = list(script)
+        self.requests = []
+
+    def request(self, verb, url, **kwargs):
+        self.requests.append((verb, url))
+        result = self.script.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        pass
+
+
+def response(status_code, headers=None):
+    return Codec.Response(status_code, headers or {}, '{}')
+
+
+def client(*script):
+    limiter = Ratelimit.RateLimiter(backoff_base=0.0)
+    return Pensando.Pensando(api_version='v1', hostname='psm', scheme='http', limiter=limiter, transport=ScriptedTransport(*script))
+
+
+def test_retry_after_seconds():
+    assert Ratelimit.parse_retry_after('3') == 3.0
+    assert Ratelimit.parse_retry_after(' 0 ') == 0.0
+    assert Ratelimit.parse_retry_after('-5') == 0.0
+
+
+def test_retry_after_date():
+    now = datetime.datetime(2015, 10, 21, 7, 27, 50, tzinfo=datetime.timezone.utc)
+    assert Ratelimit.parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=now) == 10.0
+    assert Ratelimit.parse_retry_after('Wed, 21 Oct 2015 07:27:00 GMT', now=now) == 0.0
+
+
+@pytest.mark.parametrize('value', [None, '', 'soon', '1.5'])
+def test_retry_after_invalid(value):
+    assert Ratelimit.parse_retry_after(value) is None
+
+
+def test_not_paced_until_throttled():
+    limiter = Ratelimit.RateLimiter()
+    assert limiter.acquire() == 0.0 and limiter.rate == 0.0
+    limiter.throttled()
+    assert limiter.rate == limiter.max_rate * limiter.decrease
+    limiter.throttled()
+    assert limiter.rate == limiter.max_rate * limiter.decrease ** 2
+    limiter.success()
+    assert limiter.rate == pytest.approx(limiter.max_rate * limiter.decrease ** 2 + limiter.increase)
+
+
+def test_zero_rate_is_never_paced():
+    limiter = Ratelimit.RateLimiter(rate=0)
+    limiter.throttled()
+    assert limiter.rate == 0.0 and limiter.statistics()['throttled'] == 1
+
+
+def test_rate_bounds():
+    limiter = Ratelimit.RateLimiter(rate=1.0, min_rate=0.5, max_rate=1.05)
+    for _ in range(5):
+        limiter.throttled()
+    assert limiter.rate == 0.5
+    for _ in range(20):
+        limiter.success()
+    assert limiter.rate == 1.05
+
+
+def test_backoff():
+    limiter = Ratelimit.RateLimiter(backoff_base=1.0, backoff_max=4.0)
+    assert limiter.backoff(0, retry_after=60) == 4.0
+    assert all(0 <= limiter.backoff(attempt) <= min(4.0, 2 ** attempt) for attempt in range(6))
+    assert limiter.statistics()['retries'] == 7
+
+
+def test_throttled_post_is_retried():
+    psm = client(response(429, {'Retry-After': '0'}), response(200))
+    assert psm.rate_limit('POST', '/configs/security/{}/apps', data='{}').status_code == 200
+    assert len(psm.transport.requests) == 2
+
+
+@pytest.mark.parametrize('verb', ['GET', 'PUT', 'DELETE'])
+def test_idempotent_retried_after_errors(verb):
+    psm = client(response(503), Transport.TransportError('reset'), response(200))
+    assert psm.rate_limit(verb, '/configs/security/{}/apps/web').status_code == 200
+    stats = psm.limiter.statistics()
+    assert len(psm.transport.requests) == 3 and stats['server_errors'] == 1 and stats['connection_errors'] == 1
+
+
+@pytest.mark.parametrize('error', [response(503), Transport.TransportError('reset')])
+def test_post_not_retried_after_errors(error):
+    """
+        The PSM may have created the object before the error, the POST is not sent again
+    """
+    psm = client(error, response(200))
+    assert not psm.rate_limit('POST', '/configs/security/{}/apps', data='{}').ok
+    assert len(psm.transport.requests) == 1
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', max_workers=4)
+WEB = dict(app_name='WEB', proto_ports=[dict(protocol='tcp', ports='80')])
+DNS = dict(app_name='DNS', proto_ports=[dict(protocol='udp', ports='53')])
+
+
+def app(name, ports, protocol='tcp'):
+    return dict(meta=dict(name=name, tenant='default'), spec={'proto-ports': [dict(protocol=protocol, ports=ports)]})
+
+
+def policy(*apps):
+    return dict(meta=dict(name='default', tenant='default'), spec=dict(rules=[dict(action='permit', apps=list(apps),
+                                                                                   **{'from-ip-addresses': ['any'], 'to-ip-addresses': ['any']})]))
+
+
+def reconcile(psm, client, *apps):
+    pensando = client()
+    query, results = pensando.reconcile_apps(dict(PARAMS, apps=list(apps)))
+    assert query is None
+    return pensando, dict((result['app_name'], result) for result in results)
+
+
+def test_create_and_delete(psm, client):
+    psm.store('apps', app('OLD', '22'))
+    psm.store('apps', app('WEB', '80'))
+    pensando, results = reconcile(psm, client, WEB, DNS)
+    assert results['DNS']['status'] == 'created' and results['WEB']['status'] == 'unchanged' and results['OLD']['status'] == 'deleted'
+    assert sorted(psm.objects['apps']) == ['DNS', 'WEB'] and pensando.changed
+
+
+def test_unchanged_hashed_name(psm, client):
+    """
+        WEB_<hash> is the app WEB, it is neither created nor deleted
+    """
+    pensando, results = reconcile(psm, client, dict(WEB, proto_ports=[dict(protocol='tcp', ports='8080')]))
+    name = results[list(results)[0]]['app_name']
+    pensando, results = reconcile(psm, client, dict(WEB, proto_ports=[dict(protocol='tcp', ports='8080')]))
+    assert results == {name: dict(app_name=name, changed=False, status='unchanged')} and not pensando.changed
+
+
+def test_replace_unreferenced(psm, client):
+    """
+        The replacement is created before the old app is deleted
+    """
+    psm.store('apps', app('WEB', '8080'))
+    pensando, results = reconcile(psm, client, WEB)
+    (name, result), = results.items()
+    assert result['status'] == 'replaced' and name.startswith('WEB_') and len(name) == 12
+    assert list(psm.objects['apps']) == [name]
+    assert [event[2] for event in psm.events] == ['Created', 'Deleted']
+
+
+def test_replace_referenced_repoints_rules(psm, client):
+    psm.store('apps', app('WEB', '8080'))
+    psm.store('apps', app('DNS', '53', protocol='udp'))
+    psm.store('networksecuritypolicies', policy('WEB', 'DNS'))
+    pensando, results = reconcile(psm, client, WEB, DNS)
+    name = [key for key in results if key.startswith('WEB_')][0]
+    assert psm.objects['networksecuritypolicies']['default']['spec']['rules'][0]['apps'] == [name, 'DNS']
+    assert sorted(psm.objects['apps']) == ['DNS', name]
+    assert [(event[1], event[2]) for event in psm.events] == [('apps', 'Created'), ('networksecuritypolicies', 'Updated'), ('apps', 'Deleted')]
+
+
+def test_failed_create_keeps_old_app(psm, client, monkeypatch):
+    """
+        The create fails, the old app and the rules referencing it are kept
+    """
+    psm.store('apps', app('WEB', '8080'))
+    psm.store('networksecuritypolicies', policy('WEB'))
+    apply = psm.apply
+    monkeypatch.setattr(psm, 'apply', lambda verb, kind, name, body: (500, dict(code=500)) if verb == 'POST' else apply(verb, kind, name, body))
+    query, results = client().reconcile_apps(dict(PARAMS, apps=[WEB]))
+    assert query is None and [result['status'] for result in results] == ['failed']
+    assert list(psm.objects['apps']) == ['WEB'] and psm.stats['DELETE'] == psm.stats['PUT'] == 0
+    assert psm.objects['networksecuritypolicies']['default']['spec']['rules'][0]['apps'] == ['WEB']
@@ -0,0 +1,89 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import ansible_collections.joelwking.pensando.plugins.module_utils.rules as Rules
+
+
+def rule(source, destination, ports=None, protocol='tcp', action='permit', apps=None):
+    item = {'action': action, 'from-ip-addresses': [source], 'to-ip-addresses': [destination]}
+    if apps:
+        item['apps'] = apps
+    elif ports is not None:
+        item['proto-ports'] = [dict(protocol=protocol, ports=ports)]
+    return item
+
+
+def covered(rules):
+    return [(item['index'], item['covered_by'], item['type']) for item in Rules.shadowed_rules(rules)]
+
+
+def test_port_range_covers_port():
+    rules = [rule('10.0.0.0/8', '192.168.0.0/16', '1-1024'),
+             rule('10.1.0.0/16', '192.168.1.1/32', '443', action='deny'),
+             rule('10.1.0.0/16', '192.168.1.1/32', '8443')]
+    assert covered(rules) == [(1, 0, 'shadowed')]
+
+
+def test_every_port_must_be_covered():
+    rules = [rule('10.0.0.0/24', '192.168.0.0/24', '80'),
+             rule('10.0.0.0/24', '192.168.0.0/24', '443'),
+             rule('10.0.0.1/32', '192.168.0.1/32', '80,443'),
+             rule('10.0.0.1/32', '192.168.0.1/32', '80-81')]
+    assert covered(rules) == []
+
+
+def test_protocol_without_ports_and_apps():
+    rules = [rule('10.0.0.0/24', '192.168.0.0/24', '', protocol='icmp'),
+             rule('10.0.0.1/32', '192.168.0.0/24', '', protocol='icmp'),
+             rule('10.0.0.0/24', '192.168.0.0/24', apps=['WEB', 'DNS']),
+             rule('10.0.0.1/32', '192.168.0.1/32', apps=['DNS']),
+             rule('10.0.0.1/32', '192.168.0.1/32', apps=['DNS', 'NTP'])]
+    assert covered(rules) == [(1, 0, 'redundant'), (3, 2, 'redundant')]
+
+
+def test_wide_rules_are_found():
+    wide = {'action': 'deny',
+            'from-ip-addresses': ['10.0.{}.0/24'.format(index) for index in range(10)],
+            'to-ip-addresses': ['192.168.{}.0/24'.format(index) for index in range(10)],
+            'proto-ports': [dict(protocol='udp', ports='1-65535')]}
+    rules = [wide, rule('10.0.9.9/32', '192.168.9.9/32', '53', protocol='udp')]
+    assert covered(rules) == [(1, 0, 'shadowed')]
+
+
+def test_rules_differing_by_port_scale_linearly(monkeypatch):
+    """
+        Rules with the same networks and a port each are not compared with every earlier rule
+    """
+    calls = []
+    covers = Rules._covers
+
+    def counted(outer, inner):
+        calls.append(1)
+        return covers(outer, inner)
+
+    monkeypatch.setattr(Rules, '_covers', counted)
+    for size in (2000, 8000):
+        del calls[:]
+        rules = [rule('10.0.0.0/24', '192.168.0.0/24', str(1 + index)) for index in range(size)]
+        rules.append(rule('10.0.0.1/32', '192.168.0.1/32', str(size // 2)))
+        assert covered(rules) == [(size, size // 2 - 1, 'redundant')]
+        assert len(calls) <= 2
+
+
+def test_compact_no_ports_covers_protocol():
+    """
+        An entry without ports allows every port of the protocol, the ported entries of the protocol are dropped
+    """
+    proto_ports = [{'protocol': 'tcp', 'ports': '80'}, {'protocol': 'TCP'}, {'protocol': 'tcp', 'ports': 'http'}, {'protocol': 'udp', 'ports': '53,54'}]
+    assert Rules.compact_proto_ports(proto_ports) == [{'protocol': 'tcp'}, {'protocol': 'udp', 'ports': '53-54'}]
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import os
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.snapshot as Snapshot
+
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', policy_name='default', attach_tenant=True, operation='replace')
+
+
+def rule(index):
+    return {'action': 'permit', 'from-ip-addresses': ['10.{}.{}.0/24'.format(index // 256, index % 256)], 'to-ip-addresses': ['any'],
+            'proto-ports': [{'protocol': 'tcp', 'ports': '443'}]}
+
+
+def policy(rules, version='1'):
+    return {'meta': {'name': 'default', 'resource-version': version}, 'spec': {'attach-tenant': True, 'rules': rules}}
+
+
+def blocks(directory):
+    return sum(len(files) for _, _, files in os.walk(os.path.join(str(directory), 'blocks')))
+
+
+def test_blocks_depend_on_content():
+    """
+        The boundaries follow the rules, inserting a rule only changes the block which contains it
+    """
+    rules = [rule(index) for index in range(1000)]
+    before = Snapshot.split_blocks(rules)
+    after = Snapshot.split_blocks(rules[:500] + [rule(5000)] + rules[500:])
+    assert [item for block in before for item in block] == rules and 10 < len(before) < 100
+    assert len(after) == len(before)
+    assert len([block for block in after if block not in before]) == 1
+
+
+def test_save_and_load(tmp_path):
+    store = Snapshot.SnapshotStore(str(tmp_path), host='psm')
+    rules = [rule(index) for index in range(300)]
+    first = store.save(policy(rules), source='seen')
+    assert store.save(policy(rules, version='2')) == first                       # identical to the latest, not saved again
+    stored = blocks(tmp_path)
+    second = store.save(policy(rules[:150] + [rule(5000)] + rules[150:], version='3'))
+    assert blocks(tmp_path) == stored + 1
+
+    assert [item['id'] for item in store.list('default')] == [first, second]
+    assert store.find('default', '-2') == first and store.find('default', second[:20]) == second and store.find('default', '5') is None
+    snapshot = store.load('default', first)
+    assert snapshot['rules'] == rules and snapshot['source'] == 'seen' and snapshot['resource-version'] == '1'
+
+    diff = store.diff('default', '-2', '-1')
+    assert diff['added'] == [dict(index=150, rule=rule(5000))] and diff['removed'] == [] and not diff['attach_tenant_changed']
+    assert store.load('default', 'nope') is None and store.diff('default', 'nope') is None
+
+
+def test_restore(psm, client, tmp_path):
+    """
+        The policy is restored with one PUT, restoring it again is unchanged
+    """
+    store = Snapshot.SnapshotStore(str(tmp_path), host=psm.hostname)
+    pensando = client(snapshots=store)
+    rules = [rule(index) for index in range(100)]
+    assert pensando.manage_policy(dict(PARAMS, rules=rules)).ok
+    assert pensando.manage_policy(dict(PARAMS, rules=rules[10:])).ok
+    assert len(store.list('default')) == 2
+
+    pensando = client(snapshots=store)
+    response = pensando.restore_policy(dict(PARAMS, snapshot='-2'))
+    assert response.ok and pensando.changed and psm.stats['PUT'] == 2
+    assert psm.objects['networksecuritypolicies']['default']['spec']['rules'] == rules
+    assert [item['index'] for item in pensando.diff['added']] == list(range(10))
+
+    pensando = client(snapshots=store)
+    assert pensando.restore_policy(dict(PARAMS, snapshot='-1')).ok and not pensando.changed and psm.stats['PUT'] == 2
+    assert pensando.restore_policy(dict(PARAMS, snapshot='nope')).status_code == 404
+
+
+def test_restore_deleted_policy(psm, client, tmp_path):
+    store = Snapshot.SnapshotStore(str(tmp_path), host=psm.hostname)
+    assert client(snapshots=store).manage_policy(dict(PARAMS, rules=[rule(1)])).ok
+    psm.objects['networksecuritypolicies'].clear()
+    pensando = client(snapshots=store)
+    assert pensando.restore_policy(dict(PARAMS, snapshot='-1')).ok and pensando.changed
+    assert psm.objects['networksecuritypolicies']['default']['spec']['rules'] == [rule(1)]
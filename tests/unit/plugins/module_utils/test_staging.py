@@ -0,0 +1,55 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import pytest
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.pensando as Pensando
+
+PARAMS = dict(api_version='v1', tenant='default', namespace='default', policy_name='default', attach_tenant=True, operation='append')
+PATH = '/configs/security/v1/networksecuritypolicies/default'
+RULE = {'action': 'permit', 'from-ip-addresses': ['10.0.0.0/8'], 'to-ip-addresses': ['any'], 'proto-ports': [{'protocol': 'tcp', 'ports': '443'}]}
+
+
+@pytest.mark.parametrize('verb, url, expected', [
+    ('POST', '/configs/security/{}/apps', '/staging/b1/configs/security/{}/apps'),
+    ('PUT', '/configs/security/v1/tenants/default/networksecuritypolicies/p', '/staging/b1/configs/security/v1/tenants/default/networksecuritypolicies/p'),
+    ('DELETE', '/configs/security/{}/apps/WEB', '/staging/b1/configs/security/{}/apps/WEB'),
+    ('GET', '/configs/security/{}/apps', '/configs/security/{}/apps'),
+    ('POST', '/configs/staging/{}/tenant/default/buffers/b1/commit', '/configs/staging/{}/tenant/default/buffers/b1/commit'),
+    ('POST', '/{}/login', '/{}/login'),
+])
+def test_staged_url(verb, url, expected):
+    assert Pensando.Pensando(api_version='v1', hostname='psm', buffer='b1').staged(verb, url) == expected
+
+
+def test_no_buffer():
+    assert Pensando.Pensando(api_version='v1', hostname='psm').staged('POST', '/configs/security/{}/apps') == '/configs/security/{}/apps'
+
+
+def test_staged_policy_is_not_cached(psm, client):
+    """
+        The staged PUT is applied when the buffer is committed, the policy read before it is removed from the cache
+    """
+    writer = client()
+    assert writer.manage_policy(dict(PARAMS, rules=[dict(RULE, **{'proto-ports': [{'protocol': 'tcp', 'ports': '80'}]})])).ok
+    assert writer.create_buffer('b1').ok
+
+    staged = client(buffer='b1', cache=writer.cache)
+    assert staged.manage_policy(dict(PARAMS, rules=[RULE])).ok
+    assert writer.cache.get(PATH) is None and len(psm.buffers['b1']) == 1
+    assert len(psm.objects['networksecuritypolicies']['default']['spec']['rules']) == 1
+
+    assert writer.commit_buffer('b1').ok
+    rules = writer.query_policy(policy_name='default').json()['spec']['rules']
+    assert [rule['proto-ports'] for rule in rules] == [[{'protocol': 'tcp', 'ports': '80'}, {'protocol': 'tcp', 'ports': '443'}]]
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import io
+import json
+import random
+
+import pytest
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.tetration as Tetration
+
+DOCUMENT = {'adm': {'name': u'zürich ✓', 'score': -2500.0, 'raw': {'default_policies': []},
+                    'policy': [{'proto': 'tcp', 'ports': {'from': 443, 'to': 443}, 'confidence': 0.95, 'site': u'zürich'},
+                               -2500.0, 1e-07, -12.5E+3, 0, True, None, u'日本', 17, [1.5, -0.25], {'a': 3.25}]}}
+
+
+def stream(document, chunk_size, path=('adm', 'policy')):
+    data = json.dumps(document, ensure_ascii=False, indent=1).encode('utf-8')
+    return list(Tetration.iter_json_array(io.BytesIO(data), list(path), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', range(1, 33))
+def test_small_chunks(chunk_size):
+    """
+        Multi-byte characters and numbers which are split between chunks are decoded
+    """
+    assert stream(DOCUMENT, chunk_size) == DOCUMENT['adm']['policy']
+
+
+@pytest.mark.parametrize('chunk_size', [9, 10, 11])
+def test_character_split_between_chunks(chunk_size):
+    document = {'adm': {'policy': [u'zürich', u'zürich']}}
+    assert stream(document, chunk_size) == [u'zürich', u'zürich']
+
+
+def test_random_documents():
+    random.seed(7)
+    for _ in range(200):
+        items = [random.choice([random.uniform(-1e4, 1e4), random.randint(-10 ** 6, 10 ** 6), round(random.uniform(-5000, 5000), 1),
+                                u'éè' * random.randint(0, 3), {'x': random.random()}]) for _ in range(random.randint(0, 20))]
+        document = {'skip': [random.random() for _ in range(5)], 'adm': {'before': u'ü', 'policy': items}}
+        assert stream(document, random.randint(1, 16)) == items
+
+
+def test_truncated_character():
+    data = json.dumps({'adm': {'policy': [u'ü']}}, ensure_ascii=False).encode('utf-8')
+    with pytest.raises(ValueError):
+        list(Tetration.iter_json_array(io.BytesIO(data[:data.index(b'\xc3') + 1]), ['adm', 'policy'], chunk_size=4))
+
+
+RAW = {'default_policies': [{'action': 'DROP', 'l4_params': [{'proto': 1, 'confidence': 0.81},
+                                                             {'proto': 6, 'port': [443, 443], 'confidence': 1.0}]},
+                            {'action': 'ALLOW', 'l4_params': [{'proto': 1, 'confidence': 0.9}]}]}
+
+
+def test_rules_default_as_playbook():
+    """
+        ICMP is skipped, a policy of only ICMP has no rule, and every rule is a permit
+    """
+    rules = Tetration.adm_rules(RAW)
+    assert [rule['action'] for rule in rules] == ['permit']
+    assert rules[0]['proto-ports'] == [{'protocol': 'tcp', 'ports': '443'}]
+
+
+def test_rules_include_icmp_map_actions():
+    rules = Tetration.adm_rules(RAW, include_icmp=True, map_actions=True)
+    assert [rule['action'] for rule in rules] == ['deny', 'permit']
+    assert {'protocol': 'icmp'} in rules[0]['proto-ports'] and rules[1]['proto-ports'] == [{'protocol': 'icmp'}]
+
+
+def test_stream_single_protocol():
+    data = json.dumps({'adm': {'policy': [{'proto': 'tcp', 'ports': {'from': 80, 'to': 80}, 'action': 'ALLOW'}], 'raw': RAW}}).encode('utf-8')
+    assert Tetration.stream_proto_ports(io.BytesIO(data)) == [{'protocol': 'tcp', 'ports': '80'}]
+    assert [rule['action'] for rule in Tetration.stream_rules(io.BytesIO(data), map_actions=True)] == ['deny']
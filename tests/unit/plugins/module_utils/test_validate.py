@@ -0,0 +1,68 @@
+#!/usr/bin/python
+#
+#     Copyright (c) 2020 World Wide Technology, LLC
+#     All rights reserved.
+#
+#     author: Joel W. King  @joelwking
+#
+#     linter: flake8
+#         [flake8]
+#         max-line-length = 160
+#         ignore = E402
+#
+#     usage: python -m pytest tests/unit, with PYTHONPATH set to the directory containing 'ansible_collections'
+#
+import pytest
+
+import ansible_collections.joelwking.pensando.plugins.module_utils.validate as Validate
+
+RULE = {'action': 'permit', 'from-ip-addresses': ['10.0.0.0/8'], 'to-ip-addresses': ['any'], 'proto-ports': [{'protocol': 'tcp', 'ports': '80'}]}
+
+
+@pytest.mark.parametrize('address, valid', [('any', True), ('192.0.2.1', True), ('2001:db8::/32', True), ('192.0.2.1-192.0.2.9', True),
+                                            ('192.0.2.9-192.0.2.1', False), ('192.0.2.1-2001:db8::1', False), ('10.0.0.1/24', False),
+                                            ('10.0.0.256', False), ('web', False)])
+def test_address(address, valid):
+    assert Validate.validate_address(address) is valid
+
+
+def test_valid_rules():
+    assert Validate.validate_rules(None) == [] and Validate.validate_rules([RULE, dict(RULE, action='DENY', apps=['WEB'])]) == []
+
+
+@pytest.mark.parametrize('rule, error', [
+    (dict(RULE, action='allow'), 'rules[0]: action must be one of permit, deny, reject, not allow'),
+    (dict(RULE, **{'from-ip-addresses': []}), 'rules[0]: one of from-ip-addresses, from-workload-groups, from-ipcollections is required'),
+    (dict(RULE, **{'to-ip-addresses': ['any', '10.0.0.300']}), 'rules[0].to-ip-addresses[1]: invalid address 10.0.0.300'),
+    (dict(RULE, **{'proto-ports': [{'protocol': 'icmp', 'ports': '8'}]}), 'rules[0].proto-ports[0]: ports are not allowed for protocol icmp'),
+    (dict(RULE, **{'proto-ports': [{'protocol': 'tcp', 'ports': '80,http'}]}), 'rules[0].proto-ports[0]: invalid ports http'),
+    (dict(RULE, **{'proto-ports': [{'protocol': 'sctp'}]}), 'rules[0].proto-ports[0]: unknown protocol sctp'),
+    (dict(RULE, **{'proto-ports': [{'ports': '80'}]}), 'rules[0].proto-ports[0]: protocol is required'),
+    (dict(RULE, **{'proto-ports': [{'protocol': 'tcp', 'port': '80'}]}), 'rules[0].proto-ports[0]: unexpected keys port'),
+    (dict(RULE, **{'proto-ports': {'protocol': 'tcp'}}), 'rules[0].proto-ports: must be a list'),
+    (dict(RULE, apps='WEB'), 'rules[0].apps: must be a list of app names'),
+])
+def test_rule_error(rule, error):
+    assert Validate.validate_rules([rule]) == [error]
+
+
+def test_every_error_is_returned():
+    """
+        Each rule is checked, the location of each error is the index of the rule
+    """
+    errors = Validate.validate_rules([RULE, dict(RULE, action=None, **{'to-ip-addresses': ['web']}), 'permit'])
+    assert errors == ['rules[1]: action must be one of permit, deny, reject, not None', 'rules[1].to-ip-addresses[0]: invalid address web',
+                      'rules[2]: must be a dictionary']
+    assert Validate.validate_rules({'action': 'permit'}) == ['rules: must be a list']
+
+
+@pytest.mark.parametrize('spec, errors', [
+    ({'proto-ports': [{'protocol': 'udp', 'ports': '53'}]}, []),
+    ({'alg': {'type': 'DNS'}}, []),
+    ({}, ['app: at least one of alg and proto_ports is required']),
+    ({'alg': {'type': 'http'}}, ['app.alg: type must be one of icmp, dns, ftp, sunrpc, msrpc, tftp, rtsp, not http']),
+    ({'alg': 'dns'}, ['app.alg: must be a dictionary']),
+    ({'proto-ports': [{'protocol': 'icmp', 'ports': '0'}]}, ['app.proto_ports[0]: ports are not allowed for protocol icmp']),
+])
+def test_app(spec, errors):
+    assert Validate.validate_app(spec) == errors